@@ -0,0 +1,427 @@
+"""Benchmark das rotas da API (threads, conexões, auth, webhooks, anexos e eventos) sobre dados sintéticos.
+
+Para cada tamanho de dados gera (ou reaproveita) um banco com benchmarks.seed
+e mede cada cenário: percentis de latência, vazão e consultas SQL por
+requisição. O resultado é salvo em JSON; com --compare mostra a variação em
+relação a uma execução anterior.
+
+    python -m benchmarks.run --sizes small,medium --output results.json
+    python -m benchmarks.run --sizes small --compare results.json
+
+Requisições passam pelo app WSGI em processo (test client), sem rede, para
+medir o custo do backend e do banco. Com PostgreSQL use um banco por tamanho
+(o placeholder {size} em --database-url é substituído).
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from src.models.user import db, User
+from src.models.ids import new_id
+from src.models.thread import Thread, Message, Connection
+from benchmarks.seed import generate
+
+DEFAULT_DATABASE_URL = 'sqlite:////tmp/pingoo-bench-{size}.db'
+
+class QueryCounter:
+    """Conta as consultas SQL executadas por cada thread"""
+    
+    def __init__(self):
+        self._local = threading.local()
+    
+    def __call__(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+    
+    def reset(self):
+        self._local.count = 0
+    
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+class Scenario:
+    """Uma requisição medida; `prepare(i)` pode gerar dados por iteração (fora da medição).
+    
+    Com content_type o corpo vai como bytes (webhooks assinados, upload bruto);
+    com stream a medição vai até o primeiro bloco da resposta e a fecha (SSE).
+    """
+    
+    def __init__(self, name, method, path, json_body=None, headers=None, prepare=None, expect=(200,),
+                 content_type=None, stream=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.json_body = json_body
+        self.headers = headers
+        self.prepare = prepare
+        self.expect = expect
+        self.content_type = content_type
+        self.stream = stream
+    
+    def request(self, client, iteration):
+        path, body, headers = self.path, self.json_body, self.headers
+        if self.prepare:
+            path, body, headers = self.prepare(iteration)
+        if self.stream:
+            def call():
+                response = client.open(path, method=self.method, headers=headers)
+                next(iter(response.response), None)
+                response.close()
+                return response
+            return call
+        if self.content_type:
+            return lambda: client.open(path, method=self.method, data=body, headers=headers,
+                                       content_type=self.content_type, buffered=True)
+        return lambda: client.open(path, method=self.method, json=body, headers=headers, buffered=True)
+
+def build_scenarios(app, user_id, token):
+    """Cenários para as rotas de todos os blueprints da API"""
+    from src.services.auth import issue_token
+    
+    auth = {'Authorization': f'Bearer {token}'}
+    
+    with app.app_context():
+        threads = db.session.query(Thread.id, Thread.message_count).filter(Thread.user_id == user_id)\
+                    .order_by(Thread.message_count.desc()).all()
+        connection = db.session.query(Connection.id, Connection.type, Connection.webhook_secret)\
+                       .filter(Connection.user_id == user_id).order_by(Connection.type).first()
+    connection_id = connection.id
+    largest = threads[0].id
+    typical = threads[len(threads) // 2].id
+    small_threads = [thread.id for thread in threads[-50:]]
+    
+    client = app.test_client()
+    first_page = client.get('/api/threads', headers=auth).get_json()
+    history = client.get(f'/api/threads/{largest}/messages', headers=auth).get_json()
+    
+    def etag_of(path):
+        return client.get(path, headers=auth).headers.get('ETag')
+    
+    def send_otp(iteration):
+        return '/api/auth/send-otp', {'phone': f'+5521{iteration:09d}'}, None
+    
+    def verify_otp(iteration):
+        from src.services.otp_store import get_otp_store
+        phone = f'+5531{iteration:09d}'
+        client.post('/api/auth/send-otp', json={'phone': phone})
+        with app.app_context():
+            code = get_otp_store(app).get(phone)['code']
+        return '/api/auth/verify-otp', {'phone': phone, 'code': code}, None
+    
+    def rotate(paths):
+        return lambda iteration: (paths[iteration % len(paths)], None, auth)
+    
+    def new_user():
+        """Usuário sem dados (criar/remover conexões); retorna o cabeçalho de autenticação"""
+        with app.app_context():
+            user = User(id=new_id(), phone=f'+{uuid.uuid4().int % 10 ** 15:015d}', name='Benchmark')
+            db.session.add(user)
+            db.session.commit()
+            return user.id, {'Authorization': f'Bearer {issue_token(user.id)}'}
+    
+    def create_connection(iteration):
+        _, headers = new_user()
+        return '/api/connections', {'type': 'WA', 'token': f'benchmark-token-{iteration}'}, headers
+    
+    def delete_connection(iteration):
+        new_user_id, headers = new_user()
+        with app.app_context():
+            connection_id = new_id()
+            db.session.add(Connection(id=connection_id, user_id=new_user_id, type='WA', status='ACTIVE',
+                                      token_ref='encrypted_benchmark'))
+            db.session.commit()
+        return f'/api/connections/{connection_id}', None, headers
+    
+    thread_ids = [thread.id for thread in threads]
+    
+    def delete_draft(iteration):
+        path = f'/api/threads/{thread_ids[iteration % len(thread_ids)]}/draft'
+        client.post(path, json={'content': f'rascunho {iteration}'}, headers=auth)
+        return path, None, auth
+    
+    def bulk_archive(iteration):
+        # Alterna arquivar e reabrir para que cada requisição de fato altere as threads
+        if iteration % 2:
+            return '/api/threads/bulk', {'action': 'status', 'status': 'OPEN', 'ids': small_threads}, auth
+        return '/api/threads/bulk', {'action': 'archive', 'ids': small_threads}, auth
+    
+    def bulk_delete(iteration):
+        ids = [new_id() for _ in range(10)]
+        with app.app_context():
+            for thread_id in ids:
+                db.session.add(Thread(id=thread_id, user_id=user_id, channel='whatsapp',
+                                      external_thread_id=f'bench-{thread_id}', contact_name='Benchmark',
+                                      contact_handle=f'bench-{thread_id}', message_count=5))
+                db.session.add_all([
+                    Message(id=new_id(), thread_id=thread_id, channel='whatsapp', direction='IN',
+                            body=f'mensagem {n}', sent_at=datetime.utcnow())
+                    for n in range(5)
+                ])
+            db.session.commit()
+        return '/api/threads/bulk', {'action': 'delete', 'ids': ids}, auth
+    
+    def webhook(iteration):
+        # Lote de 10 mensagens assinado com o segredo da conexão; metade em threads já recebidas
+        body = json.dumps({'messages': [
+            {'id': f'bench-{uuid.uuid4().hex}', 'thread_id': f'bench-contact-{(iteration * 10 + n) % 50}',
+             'body': f'mensagem {iteration}-{n}', 'timestamp': int(time.time())}
+            for n in range(10)
+        ]}).encode()
+        signature = 'sha256=' + hmac.new(connection.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        return f'/api/webhooks/{connection.type}/{connection_id}', body, {'X-Webhook-Signature': signature}
+    
+    def upload_media(iteration):
+        # Conteúdo distinto por iteração: sem deduplicação o upload é sempre gravado
+        return '/api/media?filename=benchmark.bin', uuid.uuid4().bytes * 4096, auth
+    
+    media_id = client.post('/api/media?filename=benchmark.bin', data=os.urandom(256 * 1024), headers=auth,
+                           content_type='application/octet-stream').get_json()['media']['id']
+    
+    def events_ticket(iteration):
+        ticket = client.post('/api/auth/ticket', headers=auth).get_json()['ticket']
+        return f'/api/events?ticket={ticket}', None, None
+    
+    scenarios = [
+        # threads_bp
+        Scenario('threads.list', 'GET', '/api/threads', headers=auth),
+        Scenario('threads.list_page2', 'GET', f'/api/threads?before={first_page["next_cursor"]}', headers=auth),
+        Scenario('threads.list_channel', 'GET', '/api/threads?channel=whatsapp&status=OPEN', headers=auth),
+        Scenario('threads.list_search', 'GET', '/api/threads?search=entrega', headers=auth),
+        Scenario('threads.list_not_modified', 'GET', '/api/threads',
+                 headers={**auth, 'If-None-Match': etag_of('/api/threads')}, expect=(304,)),
+        Scenario('threads.messages_largest', 'GET', f'/api/threads/{largest}/messages', headers=auth),
+        Scenario('threads.messages_typical', 'GET', f'/api/threads/{typical}/messages', headers=auth),
+        Scenario('threads.messages_history', 'GET',
+                 f'/api/threads/{largest}/messages?before={history["next_cursor"]}', headers=auth),
+        Scenario('threads.send_message', 'POST', None, prepare=lambda i: (
+            f'/api/threads/{small_threads[i % len(small_threads)]}/messages', {'body': f'benchmark {i}'}, auth
+        ), expect=(201,)),
+        Scenario('threads.update_status', 'PUT', None, prepare=lambda i: (
+            f'/api/threads/{small_threads[i % len(small_threads)]}/status',
+            {'status': ['OPEN', 'DONE'][i % 2]}, auth
+        )),
+        Scenario('threads.mark_read', 'POST', None, prepare=rotate(
+            [f'/api/threads/{thread_id}/read' for thread_id in small_threads])),
+        Scenario('threads.bulk_status', 'POST', '/api/threads/bulk', headers=auth,
+                 json_body={'action': 'status', 'status': 'OPEN', 'ids': small_threads}),
+        Scenario('threads.draft_save', 'POST', None, prepare=lambda i: (
+            f'/api/threads/{typical}/draft', {'content': f'rascunho {i}'}, auth
+        )),
+        Scenario('threads.draft_get', 'GET', f'/api/threads/{typical}/draft', headers=auth),
+        Scenario('threads.draft_delete', 'DELETE', None, prepare=delete_draft),
+        Scenario('threads.bulk_archive', 'POST', None, prepare=bulk_archive),
+        Scenario('threads.bulk_delete', 'POST', None, prepare=bulk_delete),
+        Scenario('search.threads', 'GET', '/api/search?q=pedido', headers=auth),
+        # connections_bp
+        Scenario('connections.list', 'GET', '/api/connections', headers=auth),
+        Scenario('connections.test', 'POST', f'/api/connections/{connection_id}/test', headers=auth),
+        Scenario('connections.create', 'POST', None, prepare=create_connection, expect=(201,)),
+        Scenario('connections.delete', 'DELETE', None, prepare=delete_connection),
+        # webhooks_bp (ingestão assíncrona: mede a validação e a gravação no spool)
+        Scenario('webhooks.receive', 'POST', None, prepare=webhook, content_type='application/json',
+                 expect=(202,)),
+        # media_bp
+        Scenario('media.upload', 'POST', None, prepare=upload_media, content_type='application/octet-stream',
+                 expect=(201,)),
+        Scenario('media.download', 'GET', f'/api/media/{media_id}', headers=auth),
+        # events_bp: conexão do EventSource até o primeiro bloco (retry:)
+        Scenario('events.connect', 'GET', None, prepare=events_ticket, stream=True),
+        # auth_bp
+        Scenario('auth.me', 'GET', '/api/auth/me', headers=auth),
+        Scenario('auth.send_otp', 'POST', None, prepare=send_otp),
+        Scenario('auth.verify_otp', 'POST', None, prepare=verify_otp),
+    ]
+    return scenarios
+
+def run_scenario(app, scenario, counter, iterations, warmup, concurrency):
+    client = app.test_client()
+    for iteration in range(warmup):
+        scenario.request(client, 10_000_000 + iteration)()
+    
+    calls = [scenario.request(client, iteration) for iteration in range(iterations)]
+    latencies = []
+    queries = []
+    statuses = {}
+    lock = threading.Lock()
+    
+    def measure(call):
+        counter.reset()
+        started = time.perf_counter()
+        response = call()
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            queries.append(counter.count)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(measure, calls))
+    else:
+        for call in calls:
+            measure(call)
+    wall = time.perf_counter() - started
+    
+    return {
+        'name': scenario.name,
+        'method': scenario.method,
+        'iterations': iterations,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'unexpected_status': sum(count for code, count in statuses.items() if code not in scenario.expect),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 3),
+            'p90': round(percentile(latencies, 0.90), 3),
+            'p99': round(percentile(latencies, 0.99), 3),
+            'max': round(max(latencies), 3),
+            'mean': round(statistics.fmean(latencies), 3),
+        },
+        'throughput_rps': round(iterations / wall, 1),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+    }
+
+def prepare_database(app, size, seed, reseed):
+    from src.models.migrations import upgrade_database
+    
+    with app.app_context():
+        if reseed:
+            db.drop_all()
+            db.session.execute(db.text('DROP TABLE IF EXISTS schema_migrations'))
+            db.session.commit()
+        upgrade_database()
+        user = User.query.filter(User.phone.like(f'+5511900{seed:03d}%')).order_by(User.phone).first()
+        if user is None:
+            print(f'[{size}] gerando dados (semente {seed})...')
+            user_id = generate(size, seed)['users'][0]
+        else:
+            user_id = user.id
+        return user_id
+
+def run_size(args, size):
+    from src.main import create_app
+    from src.services.auth import issue_token
+    
+    url = args.database_url.format(size=size)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': url,
+        'RATE_LIMIT_ENABLED': False,
+        'RESPONSE_CACHE': args.response_cache,
+        'OTP_RATE_LIMIT': 10 ** 9,
+        'MOCK_CHANNEL_LATENCY': 0,
+        'INGEST_SPOOL_DIR': os.path.join(tempfile.gettempdir(), f'pingoo-bench-{size}-ingest'),
+        'MEDIA_DIR': os.path.join(tempfile.gettempdir(), f'pingoo-bench-{size}-media'),
+    })
+    user_id = prepare_database(app, size, args.seed, args.reseed)
+    with app.app_context():
+        token = issue_token(user_id)
+        counter = QueryCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        dialect = db.engine.dialect.name
+    
+    scenarios = build_scenarios(app, user_id, token)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if any(name in scenario.name for name in args.only)]
+    
+    results = []
+    for scenario in scenarios:
+        result = run_scenario(app, scenario, counter, args.iterations, args.warmup, args.concurrency)
+        results.append(result)
+        print(f'[{size}] {result["name"]:<30} p50 {result["latency_ms"]["p50"]:>8.2f}ms  '
+              f'p99 {result["latency_ms"]["p99"]:>8.2f}ms  {result["throughput_rps"]:>8.1f} req/s  '
+              f'{result["queries_per_request"]:>5.1f} q/req'
+              + (f'  ({result["unexpected_status"]} status inesperados)' if result['unexpected_status'] else ''))
+    
+    from src.main import shutdown_app
+    shutdown_app(app)
+    return {'size': size, 'dialect': dialect, 'results': results}
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def compare(current, baseline_path, threshold):
+    """Imprime a variação de p50 e de consultas em relação a um resultado salvo"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(run['size'], result['name']): result
+                for run in baseline['runs'] for result in run['results']}
+    
+    print(f'\nComparação com {baseline_path} ({baseline["meta"].get("revision")}):')
+    for run in current['runs']:
+        for result in run['results']:
+            before = previous.get((run['size'], result['name']))
+            if not before:
+                continue
+            old, new = before['latency_ms']['p50'], result['latency_ms']['p50']
+            change = (new - old) / old * 100 if old else 0
+            queries = result['queries_per_request'] - before['queries_per_request']
+            flag = '  <-- mais lento' if change > threshold else ''
+            print(f'[{run["size"]}] {result["name"]:<30} p50 {old:>8.2f} -> {new:>8.2f}ms '
+                  f'({change:+.1f}%)  consultas {queries:+.1f}{flag}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das rotas da API')
+    parser.add_argument('--sizes', default='small', help='Tamanhos separados por vírgula (small, medium, large)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--response-cache', default='none', choices=['none', 'memory'],
+                        help='Cache de respostas por ETag (padrão: desligado, mede o caminho do banco)')
+    parser.add_argument('--only', type=lambda value: value.split(','), help='Filtra cenários pelo nome')
+    parser.add_argument('--reseed', action='store_true', help='Recria o banco antes de gerar os dados')
+    parser.add_argument('--output', help='Arquivo JSON com os resultados')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparação')
+    parser.add_argument('--regression-threshold', type=float, default=10.0,
+                        help='Variação de p50 (%%) marcada como regressão na comparação')
+    args = parser.parse_args(argv)
+    
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'response_cache': args.response_cache,
+            'regression_threshold': args.regression_threshold,
+        },
+        'runs': [run_size(args, size) for size in args.sizes.split(',')],
+    }
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResultados salvos em {args.output}')
+    if args.compare:
+        compare(report, args.compare, args.regression_threshold)
+
+if __name__ == '__main__':
+    main()
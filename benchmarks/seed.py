@@ -0,0 +1,166 @@
+"""Gerador de caixas de entrada sintéticas para benchmarks.
+
+Cria usuários com conexões WA/TG/IG e milhares de threads com número de
+mensagens bem desigual (poucas threads concentram a maior parte, até
+`max_messages` em uma única thread). Mesma semente, mesmos dados: ids,
+textos e horários são derivados do gerador pseudoaleatório.
+
+    python -m benchmarks.seed --size medium --database-url sqlite:////tmp/bench.db
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.user import db, User
+from src.models.thread import Thread, Message, Connection, PREVIEW_LENGTH
+
+# Tamanhos de dados: usuários, threads por usuário, mensagens na maior thread
+SIZES = {
+    'small': {'users': 2, 'threads': 200, 'max_messages': 2000},
+    'medium': {'users': 3, 'threads': 2000, 'max_messages': 20000},
+    'large': {'users': 3, 'threads': 5000, 'max_messages': 100000},
+}
+
+CHANNELS = [('WA', 'whatsapp'), ('TG', 'telegram'), ('IG', 'instagram')]
+CHANNEL_WEIGHTS = [0.6, 0.25, 0.15]
+
+# Base fixa dos horários (dados reproduzíveis)
+BASE_TIME = datetime(2025, 1, 1)
+
+INSERT_BATCH = 5000
+
+FIRST_NAMES = ['Ana', 'João', 'Maria', 'Pedro', 'Lucas', 'Julia', 'Carla', 'Rafael', 'Beatriz', 'Paulo']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Costa', 'Pereira', 'Lima', 'Almeida', 'Ferreira']
+WORDS = ['olá', 'pedido', 'entrega', 'amanhã', 'obrigado', 'preço', 'produto', 'pagamento',
+         'pix', 'frete', 'tamanho', 'cor', 'estoque', 'troca', 'prazo', 'endereço', 'horário']
+
+def seeded_id(rng, when):
+    """Id no formato UUIDv7 (ordenado por `when`) com bits aleatórios da semente"""
+    millis = int((when - datetime(1970, 1, 1)).total_seconds() * 1000)
+    value = (millis & 0xFFFFFFFFFFFF) << 80 | 0x7 << 76 | rng.getrandbits(12) << 64 \
+        | 0x2 << 62 | rng.getrandbits(62)
+    return str(uuid.UUID(int=value))
+
+def message_counts(rng, threads, max_messages):
+    """Distribuição tipo Zipf: a thread de posição k recebe ~max_messages / k^1.1"""
+    counts = [max(1, int(max_messages / (rank + 1) ** 1.1)) for rank in range(threads)]
+    rng.shuffle(counts)
+    return counts
+
+def generate(size='small', seed=42, users=None, threads=None, max_messages=None, log=print):
+    """Popula o banco do app atual (requer app context). Retorna um resumo do que foi criado"""
+    spec = dict(SIZES[size])
+    spec.update({key: value for key, value in
+                 (('users', users), ('threads', threads), ('max_messages', max_messages)) if value})
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    summary = {'size': size, 'seed': seed, 'users': [], 'threads': 0, 'messages': 0}
+    
+    for user_index in range(spec['users']):
+        user_id = seeded_id(rng, BASE_TIME)
+        db.session.add(User(id=user_id, phone=f'+5511900{seed:03d}{user_index:03d}', plan='PRO',
+                            name=f'Benchmark {user_index}', created_at=BASE_TIME))
+        for connection_type, _ in CHANNELS:
+            db.session.add(Connection(id=seeded_id(rng, BASE_TIME), user_id=user_id, type=connection_type,
+                                      status='ACTIVE', token_ref=f'bench_{connection_type}',
+                                      connection_metadata={}, created_at=BASE_TIME))
+        db.session.commit()
+        
+        thread_rows = []
+        message_rows = []
+        counts = message_counts(rng, spec['threads'], spec['max_messages'])
+        for thread_index, count in enumerate(counts):
+            _, channel = rng.choices(CHANNELS, CHANNEL_WEIGHTS)[0]
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            started_at = BASE_TIME + timedelta(minutes=rng.randrange(0, 60 * 24 * 300))
+            thread_id = seeded_id(rng, started_at)
+            
+            sent_at = started_at
+            unread = 0
+            last = None
+            for _ in range(count):
+                sent_at += timedelta(seconds=rng.randrange(5, 3600))
+                direction = 'IN' if rng.random() < 0.55 else 'OUT'
+                status = rng.choice(['DELIVERED', 'READ']) if direction == 'IN' else \
+                    rng.choice(['SENT', 'DELIVERED', 'READ'])
+                last = {
+                    'id': seeded_id(rng, sent_at),
+                    'thread_id': thread_id,
+                    'channel': channel,
+                    'direction': direction,
+                    'body': ' '.join(rng.choices(WORDS, k=rng.randrange(2, 15))),
+                    'media_url': None,
+                    'sent_at': sent_at,
+                    'status': status,
+                    'created_at': sent_at
+                }
+                unread = unread + 1 if direction == 'IN' and status != 'READ' else unread
+                message_rows.append(last)
+            
+            thread_rows.append({
+                'id': thread_id,
+                'user_id': user_id,
+                'channel': channel,
+                'external_thread_id': f'bench_{seed}_{user_index}_{thread_index}',
+                'contact_name': f'{first_name} {last_name}',
+                'contact_handle': f'@{first_name.lower()}{thread_index}',
+                'last_message_at': sent_at,
+                'status': rng.choices(['NEW', 'OPEN', 'DONE'], [0.3, 0.3, 0.4])[0],
+                'last_message_id': last['id'],
+                'last_message_preview': last['body'][:PREVIEW_LENGTH],
+                'unread_in_count': unread,
+                'message_count': count,
+                'created_at': started_at,
+                'updated_at': sent_at
+            })
+            
+            if len(message_rows) >= INSERT_BATCH:
+                flush(thread_rows, message_rows)
+                summary['messages'] += len(message_rows)
+                thread_rows, message_rows = [], []
+        
+        flush(thread_rows, message_rows)
+        summary['messages'] += len(message_rows)
+        summary['threads'] += spec['threads']
+        summary['users'].append(user_id)
+        log(f'usuário {user_index + 1}/{spec["users"]}: {spec["threads"]} threads '
+            f'({time.perf_counter() - started:.1f}s)')
+    
+    summary['largest_thread_messages'] = spec['max_messages']
+    return summary
+
+def flush(thread_rows, message_rows):
+    # Threads antes das mensagens (chave estrangeira)
+    if thread_rows:
+        db.session.execute(db.insert(Thread), thread_rows)
+    for start in range(0, len(message_rows), INSERT_BATCH):
+        db.session.execute(db.insert(Message), message_rows[start:start + INSERT_BATCH])
+    db.session.commit()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera dados sintéticos para benchmarks')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', default=None, help='Padrão: DATABASE_URL do ambiente')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--threads', type=int, help='Threads por usuário')
+    parser.add_argument('--max-messages', type=int, help='Mensagens na maior thread')
+    args = parser.parse_args(argv)
+    
+    from src.main import create_app
+    from src.models.migrations import upgrade_database
+    
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url} if args.database_url else None)
+    with app.app_context():
+        upgrade_database()
+        summary = generate(args.size, args.seed, args.users, args.threads, args.max_messages)
+    print(f'{summary["threads"]} threads e {summary["messages"]} mensagens criadas')
+
+if __name__ == '__main__':
+    main()
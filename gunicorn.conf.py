@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import tempfile
+from gunicorn.glogging import Logger
+
+# Configuração do gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# gthread: cada worker atende várias requisições em threads. Streams SSE abertos
+# prendem uma thread cada e são limitados por SSE_MAX_STREAMS (um quarto das threads)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recicla workers periodicamente (contém vazamentos de memória)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Sem preload: pools de conexão e threads de fundo são criados em cada worker
+preload_app = False
+
+# Métricas de todos os workers somadas em /metrics (um arquivo por processo)
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'pingoo-metrics'))
+
+# Credenciais em query string (?ticket=, ?token=) não vão para o access log
+CREDENTIAL_PARAMS = re.compile(r'(?<=[?&])(ticket|token)=[^&\s]*')
+
+class RedactingLogger(Logger):
+    def atoms(self, resp, req, environ, request_time):
+        atoms = super().atoms(resp, req, environ, request_time)
+        for key in ('r', 'q'):
+            if atoms.get(key):
+                atoms[key] = CREDENTIAL_PARAMS.sub(r'\1=[redacted]', atoms[key])
+        return atoms
+
+logger_class = RedactingLogger
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+def on_starting(server):
+    # Contadores de uma execução anterior não entram na soma
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+def post_worker_init(worker):
+    # No SIGTERM, avisa o app antes do gunicorn aguardar as requisições em andamento
+    from src.main import begin_shutdown, start_background_services
+    
+    timings = worker.wsgi.extensions.get('boot_timings', [])
+    worker.log.info('App pronto em %.1fms (%s)',
+                    sum(ms for _, ms in timings),
+                    ', '.join(f'{name} {ms:.1f}ms' for name, ms in timings))
+    
+    previous = signal.getsignal(signal.SIGTERM)
+    
+    def handle_term(signum, frame):
+        begin_shutdown(worker.wsgi)
+        if callable(previous):
+            previous(signum, frame)
+    
+    signal.signal(signal.SIGTERM, handle_term)
+    
+    # Retoma jobs e envios pendentes sem esperar por uma nova requisição
+    start_background_services(worker.wsgi)
+
+def worker_exit(server, worker):
+    from src.main import shutdown_app
+    
+    app = getattr(worker, 'wsgi', None)
+    if app is not None:
+        shutdown_app(app)
@@ -0,0 +1,160 @@
+import os
+
+DATABASE_DIR = os.path.join(os.path.dirname(__file__), 'database')
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def env_float(name, default):
+    return float(os.environ.get(name, default))
+
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+def database_url():
+    """DATABASE_URL normalizada (Render/Heroku usam o prefixo postgres://)"""
+    url = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(DATABASE_DIR, 'app.db')}"
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(url):
+    """Opções do engine SQLAlchemy (pool de conexões) conforme o banco"""
+    if not url.startswith('postgresql'):
+        return {'pool_pre_ping': True}
+    
+    options = {
+        'pool_size': env_int('DB_POOL_SIZE', 10),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+        'connect_args': {
+            'connect_timeout': env_int('DB_CONNECT_TIMEOUT', 5),
+            'application_name': os.environ.get('DB_APPLICATION_NAME', 'pingoo-play-api')
+        }
+    }
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT_MS', 15000)
+    if statement_timeout:
+        options['connect_args']['options'] = f'-c statement_timeout={statement_timeout}'
+    return options
+
+def database_binds():
+    """Bind 'replica' (leituras) quando DATABASE_REPLICA_URL está definida"""
+    url = os.environ.get('DATABASE_REPLICA_URL')
+    if not url:
+        return {}
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return {'replica': {'url': url, **engine_options(url)}}
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+    # Validade dos tokens de acesso (segundos)
+    TOKEN_MAX_AGE = env_int('TOKEN_MAX_AGE', 7 * 24 * 3600)
+    
+    # Banco de dados e pool de conexões
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Réplica de leitura: GETs vão para ela, salvo logo após uma escrita do
+    # usuário (REPLICA_STICKY_SECONDS) ou com atraso acima de REPLICA_MAX_LAG
+    SQLALCHEMY_BINDS = database_binds()
+    REPLICA_STICKY_SECONDS = env_float('REPLICA_STICKY_SECONDS', 5)
+    REPLICA_MAX_LAG = env_float('REPLICA_MAX_LAG', 2.0)
+    REPLICA_LAG_CHECK_INTERVAL = env_float('REPLICA_LAG_CHECK_INTERVAL', 5.0)
+    
+    # Número de proxies à frente do app (Render) para X-Forwarded-For/Proto
+    PROXY_FIX_HOPS = env_int('PROXY_FIX_HOPS', 1)
+    
+    # Streams SSE abertos por worker; cada um prende uma thread do gthread, então
+    # fica bem abaixo de GUNICORN_THREADS para a API REST continuar respondendo
+    SSE_MAX_STREAMS = env_int('SSE_MAX_STREAMS', max(1, env_int('GUNICORN_THREADS', 16) // 4))
+    
+    # Tempo real: 'memory' (um único processo) ou 'redis' (pub/sub entre workers;
+    # obrigatório com mais de um worker)
+    EVENT_BUS = os.environ.get('EVENT_BUS', 'memory')
+    # Redis compartilhado entre workers; 'memory://' usa um substituto em processo (só testes)
+    REDIS_URL = os.environ.get('REDIS_URL')
+    
+    # Códigos OTP: 'memory' (por worker) ou 'redis' (compartilhado entre workers)
+    OTP_STORE = os.environ.get('OTP_STORE', 'memory')
+    OTP_RATE_LIMIT = env_int('OTP_RATE_LIMIT', 3)
+    OTP_RATE_WINDOW = env_int('OTP_RATE_WINDOW', 600)
+    
+    # Limite de requisições (token bucket) por grupo de rotas: 'capacidade/segundos',
+    # por usuário do token ou por IP. 'memory' (por worker) ou 'redis' (compartilhado)
+    RATE_LIMIT_ENABLED = env_bool('RATE_LIMIT_ENABLED', True)
+    RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')
+    RATE_LIMITS = {
+        'otp': os.environ.get('RATE_LIMIT_OTP', '10/60'),
+        'read': os.environ.get('RATE_LIMIT_READ', '300/60'),
+        'write': os.environ.get('RATE_LIMIT_WRITE', '600/60'),
+    }
+    
+    # Fila de envio e canal simulado (testes de carga offline)
+    OUTBOUND_WORKERS = env_int('OUTBOUND_WORKERS', 4)
+    OUTBOUND_CHANNEL_CONCURRENCY = env_int('OUTBOUND_CHANNEL_CONCURRENCY', 2)
+    OUTBOUND_MAX_ATTEMPTS = env_int('OUTBOUND_MAX_ATTEMPTS', 5)
+    # Recuperação periódica da fila no banco e lease de um envio em andamento (SENDING)
+    OUTBOUND_RECOVER_INTERVAL = env_float('OUTBOUND_RECOVER_INTERVAL', 30)
+    OUTBOUND_CLAIM_TIMEOUT = env_int('OUTBOUND_CLAIM_TIMEOUT', 300)
+    MOCK_CHANNEL_LATENCY = env_float('MOCK_CHANNEL_LATENCY', 0)
+    MOCK_CHANNEL_FAILURE_RATE = env_float('MOCK_CHANNEL_FAILURE_RATE', 0)
+    MOCK_CHANNEL_RATE_LIMIT = env_int('MOCK_CHANNEL_RATE_LIMIT', 0)
+    
+    # Ingestão de webhooks: 'async' grava no spool e persiste em lote; 'sync' persiste na requisição.
+    # O spool guarda payloads já confirmados: em produção fica no disco persistente (render.yaml)
+    INGEST_MODE = os.environ.get('INGEST_MODE', 'async')
+    INGEST_SPOOL_DIR = os.environ.get('INGEST_SPOOL_DIR', os.path.join(DATABASE_DIR, 'ingest'))
+    INGEST_BATCH_SIZE = env_int('INGEST_BATCH_SIZE', 1000)
+    
+    # Cache de respostas GET indexado pelo ETag: 'memory', 'redis' ou 'none'
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE', 'memory')
+    RESPONSE_CACHE_MAX_BYTES = env_int('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    RESPONSE_CACHE_TTL = env_int('RESPONSE_CACHE_TTL', 300)
+    
+    # Retenção na tabela quente de mensagens, em dias, por plano (flask archive-messages)
+    ARCHIVE_RETENTION_DAYS = {
+        'TRIAL': env_int('ARCHIVE_DAYS_TRIAL', 30),
+        'BASIC': env_int('ARCHIVE_DAYS_BASIC', 180),
+        'PRO': env_int('ARCHIVE_DAYS_PRO', 365),
+    }
+    
+    # Partições mensais de messages (PostgreSQL): meses futuros mantidos criados e
+    # intervalo, em segundos, da verificação periódica feita em cada worker
+    PARTITION_MONTHS_AHEAD = env_int('PARTITION_MONTHS_AHEAD', 3)
+    PARTITION_CHECK_INTERVAL = env_float('PARTITION_CHECK_INTERVAL', 3600)
+    
+    # Anexos: object store endereçado por conteúdo ('local', em MEDIA_DIR) e
+    # miniaturas geradas sob demanda (Pillow) limitadas em disco. O padrão fica
+    # dentro do projeto, que é efêmero no Render: em produção MEDIA_DIR aponta
+    # para o disco persistente (render.yaml)
+    MEDIA_STORE = os.environ.get('MEDIA_STORE', 'local')
+    MEDIA_DIR = os.environ.get('MEDIA_DIR', os.path.join(DATABASE_DIR, 'media'))
+    MEDIA_MAX_BYTES = env_int('MEDIA_MAX_BYTES', 100 * 1024 * 1024)
+    MEDIA_THUMBNAIL_CACHE_BYTES = env_int('MEDIA_THUMBNAIL_CACHE_BYTES', 256 * 1024 * 1024)
+    
+    # Rascunhos: intervalo máximo (s) entre salvamentos agrupados no banco
+    DRAFT_FLUSH_INTERVAL = env_float('DRAFT_FLUSH_INTERVAL', 2.0)
+    
+    # Remoção de conexões: acima deste número de mensagens vira job em segundo plano
+    CONNECTION_DELETE_SYNC_LIMIT = env_int('CONNECTION_DELETE_SYNC_LIMIT', 5000)
+    
+    # Métricas em /metrics: exige METRICS_TOKEN (Bearer) salvo com METRICS_PUBLIC=true.
+    # Com METRICS_DIR (definido pelo gunicorn.conf.py) somam todos os workers da instância;
+    # consultas acima de SLOW_QUERY_MS vão para o log
+    METRICS_ENABLED = env_bool('METRICS_ENABLED', True)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_PUBLIC = env_bool('METRICS_PUBLIC', False)
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_WRITE_INTERVAL = env_float('METRICS_WRITE_INTERVAL', 5.0)
+    METRICS_SERVER_TIMING = env_bool('METRICS_SERVER_TIMING', False)
+    SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 200)
+    
+    # Frontend: comprime (gzip/brotli) na primeira requisição o que o build não comprimiu
+    STATIC_PRECOMPRESS = env_bool('STATIC_PRECOMPRESS', True)
+    
+    # Tempo máximo para concluir trabalhos em andamento ao encerrar o worker
+    SHUTDOWN_TIMEOUT = env_int('SHUTDOWN_TIMEOUT', 20)
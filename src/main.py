@@ -1,49 +1,242 @@
+import click
+import importlib
+import logging
 import os
 import sys
-# DON\'T CHANGE THIS !!!
+import threading
+import time
+# DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
-from src.models.thread import Thread, Message, Draft, Connection
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.threads import threads_bp
-from src.routes.connections import connections_bp
+from werkzeug.middleware.proxy_fix import ProxyFix
+from src.config import Config, DATABASE_DIR, engine_options
+from src.services.json_provider import FastJSONProvider
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), \'static\'))
-app.config[\'SECRET_KEY\'] = \'asdf#FGSgvasgf$5$WGT\'
-
-# Mova a importação do \'db\' para cá
+# Mova a importação do 'db' para cá
 from src.models.user import db
 
-# Configurar CORS para permitir requisições do frontend
-CORS(app, origins=[
-    \'http://localhost:5173\', 
-    \'http://localhost:3000\',
-    \'https://*.vercel.app\',
-    \'https://*.netlify.app\',
-    \'https://pingooplay.com\',
-    \'https://app.pingooplay.com\'
-] )
-
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix=\'/api\')
-app.register_blueprint(auth_bp, url_prefix=\'/api/auth\')
-app.register_blueprint(threads_bp, url_prefix=\'/api\')
-app.register_blueprint(connections_bp, url_prefix=\'/api\')
-
-# Configuração do banco de dados
-# Configuração do banco de dados (será definida no bloco if __name__ == \'__main__\':)
-app.config[\'SQLALCHEMY_TRACK_MODIFICATIONS\'] = False
-db.init_app(app)
-
-with app.app_context():
-    db.create_all()
-
-@app.route(\'/\', defaults={\'path\': \'\'}) 
-@app.route(\'/<path:path>\')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return \
+# Blueprints: (módulo, atributo, prefixo). Importados só dentro de create_app,
+# para que importar src.main (hooks do gunicorn, CLI) não carregue as rotas
+BLUEPRINTS = [
+    ('src.routes.user', 'user_bp', '/api'),
+    ('src.routes.auth', 'auth_bp', '/api/auth'),
+    ('src.routes.threads', 'threads_bp', '/api'),
+    ('src.routes.connections', 'connections_bp', '/api'),
+    ('src.routes.search', 'search_bp', '/api'),
+    ('src.routes.events', 'events_bp', '/api'),
+    ('src.routes.webhooks', 'webhooks_bp', '/api'),
+    ('src.routes.jobs', 'jobs_bp', '/api'),
+    ('src.routes.media', 'media_bp', '/api'),
+]
+
+logger = logging.getLogger(__name__)
+
+class BootTimer:
+    """Mede as etapas de inicialização do app"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.steps = []
+    
+    def mark(self, name):
+        now = time.perf_counter()
+        self.steps.append((name, (now - self.last) * 1000))
+        self.last = now
+    
+    def report(self):
+        total = (time.perf_counter() - self.started) * 1000
+        breakdown = ', '.join(f'{name} {ms:.1f}ms' for name, ms in self.steps)
+        return total, breakdown
+
+def create_app(config=None):
+    """Cria e configura a aplicação (usado pelo gunicorn via wsgi.py e pelo CLI do Flask).
+    
+    Não acessa o banco: o esquema é aplicado explicitamente com `flask db-upgrade`.
+    """
+    timer = BootTimer()
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.json = FastJSONProvider(app)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'])
+    
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:///'):
+        os.makedirs(DATABASE_DIR, exist_ok=True)
+    
+    # Atrás do proxy do Render: IP e esquema reais do cliente
+    if app.config['PROXY_FIX_HOPS']:
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+    
+    # Sinalizado no início do encerramento do worker (streams SSE terminam)
+    app.extensions['shutdown_event'] = threading.Event()
+    
+    # Stores compartilhados entre workers não podem cair silenciosamente para memória local
+    from src.services.redis_store import check_redis_settings
+    check_redis_settings(app)
+    timer.mark('config')
+    
+    # Configurar CORS para permitir requisições do frontend
+    CORS(app, origins=[
+        'http://localhost:5173', 
+        'http://localhost:3000',
+        'https://*.vercel.app',
+        'https://*.netlify.app',
+        'https://pingooplay.com',
+        'https://app.pingooplay.com'
+    ], expose_headers=['X-Replica-Sticky'])
+    
+    timer.mark('cors')
+    
+    # Registrar blueprints
+    for module_name, attribute, url_prefix in BLUEPRINTS:
+        blueprint = getattr(importlib.import_module(module_name), attribute)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+        timer.mark(module_name.rsplit('.', 1)[-1])
+    
+    # Limite de requisições por usuário/IP (depende das rotas de auth)
+    from src.services.rate_limit import init_rate_limiting
+    init_rate_limiting(app)
+    timer.mark('rate_limit')
+    
+    # Configuração do banco de dados (o engine só conecta na primeira consulta)
+    db.init_app(app)
+    timer.mark('db')
+    
+    # Métricas por endpoint, log de consultas lentas e /metrics
+    from src.services.metrics import init_metrics
+    init_metrics(app)
+    timer.mark('metrics')
+    
+    # Leituras na réplica (quando DATABASE_REPLICA_URL está configurada)
+    from src.services.replica import init_replica_routing
+    init_replica_routing(app)
+    timer.mark('replica')
+    
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Aplica as migrações pendentes do banco de dados"""
+        from src.models.migrations import upgrade_database
+        
+        from src.models.partitions import ensure_message_partitions
+        
+        applied = upgrade_database()
+        print(f'{len(applied)} migração(ões) aplicada(s)')
+        ensure_message_partitions(db.engine, app.config['PARTITION_MONTHS_AHEAD'])
+    
+    @app.cli.command('message-partitions')
+    @click.option('--convert', is_flag=True, help='Converte messages em tabela particionada por mês (PostgreSQL)')
+    @click.option('--ahead', type=int, default=None, help='Meses futuros com partição criada (padrão: PARTITION_MONTHS_AHEAD)')
+    @click.option('--detach-before', type=click.DateTime(formats=['%Y-%m']), default=None,
+                  help='Desanexa partições anteriores a este mês (AAAA-MM)')
+    @click.option('--drop', is_flag=True, help='Remove as partições desanexadas')
+    def message_partitions_command(convert, ahead, detach_before, drop):
+        """Mantém as partições mensais da tabela messages"""
+        from src.models.partitions import convert_messages_table, ensure_message_partitions, detach_partitions_before
+        
+        if db.engine.dialect.name != 'postgresql':
+            print('Particionamento disponível apenas no PostgreSQL')
+            return
+        if ahead is None:
+            ahead = app.config['PARTITION_MONTHS_AHEAD']
+        if convert and convert_messages_table(db.engine, ahead):
+            print('Tabela messages convertida em particionada')
+        print(f'Partições garantidas: {", ".join(ensure_message_partitions(db.engine, ahead)) or "nenhuma"}')
+        if detach_before:
+            detached = detach_partitions_before(db.engine, detach_before, drop)
+            print(f'Partições desanexadas: {", ".join(detached) or "nenhuma"}')
+    
+    @app.cli.command('archive-messages')
+    @click.option('--batch-size', default=1000, show_default=True, help='Mensagens por transação')
+    @click.option('--max-batches', type=int, default=None, help='Limite de lotes nesta execução')
+    def archive_messages_command(batch_size, max_batches):
+        """Move mensagens fora do prazo de retenção do plano para o armazenamento frio"""
+        from src.services.archive import archive_messages
+        
+        totals = archive_messages(batch_size=batch_size, max_batches=max_batches)
+        for plan, count in totals.items():
+            print(f'{plan}: {count} mensagem(ns) arquivada(s)')
+    
+    @app.cli.command('compress-static')
+    def compress_static_command():
+        """Gera as versões .gz/.br dos arquivos do frontend (etapa de build)"""
+        from src.services.static_assets import precompress
+        
+        created = precompress(app.static_folder) if app.static_folder and os.path.isdir(app.static_folder) else []
+        print(f'{len(created)} arquivo(s) comprimido(s)')
+    
+    # Frontend (SPA): arquivos do manifesto em memória; demais rotas recebem index.html
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        from src.services.static_assets import get_static_assets
+        
+        assets = get_static_assets()
+        if app.debug:
+            assets.reload()
+        return assets.serve(path)
+    
+    total, breakdown = timer.report()
+    app.extensions['boot_timings'] = timer.steps
+    logger.info('App inicializado em %.1fms (%s)', total, breakdown)
+    
+    return app
+
+def start_background_services(app):
+    """Inicia no worker os serviços que retomam trabalho deixado por execuções anteriores"""
+    from src.services.ingestion import get_ingestion_worker
+    from src.services.jobs import get_job_runner
+    from src.services.outbound import get_outbound_queue
+    from src.services.partition_maintenance import get_partition_maintainer
+    
+    # Jobs PENDING (interrompidos no encerramento) e RUNNING sem heartbeat (worker morto)
+    get_job_runner(app).start()
+    # Envios QUEUED vencidos e SENDING com lease expirado, recuperados periodicamente
+    get_outbound_queue(app).start()
+    # Payloads de webhook já aceitos (202) que ficaram no spool
+    if app.config.get('INGEST_MODE', 'async') == 'async':
+        get_ingestion_worker(app).start()
+    # Partições futuras de messages criadas antes de o mês chegar (só PostgreSQL)
+    with app.app_context():
+        partitioned = db.engine.dialect.name == 'postgresql'
+    if partitioned:
+        get_partition_maintainer(app).start()
+
+def begin_shutdown(app):
+    """Sinaliza o encerramento: streams abertos terminam e clientes reconectam em outro worker"""
+    app.extensions['shutdown_event'].set()
+
+def shutdown_app(app):
+    """Encerramento gracioso: conclui trabalhos em andamento e fecha o pool de conexões"""
+    begin_shutdown(app)
+    timeout = app.config['SHUTDOWN_TIMEOUT']
+    
+    for name in ('outbound_queue', 'ingestion_worker', 'job_runner', 'partition_maintainer', 'draft_buffer',
+                 'metrics_snapshots'):
+        service = app.extensions.get(name)
+        if service is not None:
+            service.stop(timeout)
+    
+    with app.app_context():
+        db.engine.dispose()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    app = create_app()
+    
+    # Servidor de desenvolvimento: aplica as migrações na subida
+    from src.models.migrations import upgrade_database
+    with app.app_context():
+        upgrade_database()
+    start_background_services(app)
+    
+    try:
+        app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False, threaded=True)
+    finally:
+        shutdown_app(app)
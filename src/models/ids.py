@@ -0,0 +1,37 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+def uuid7():
+    """UUID versão 7 (RFC 9562): timestamp em ms nos 48 bits iniciais, seguido de bits aleatórios.
+    
+    Ids gerados em sequência são crescentes (inclusive no mesmo milissegundo,
+    via contador de 12 bits), então inserções caem no fim do índice da chave
+    primária em vez de em páginas aleatórias da B-tree.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Contador esgotado no milissegundo: avança o relógio lógico
+                _last_ms += 1
+                _counter = 0
+        timestamp, counter = _last_ms, _counter
+    
+    rand_b = int.from_bytes(os.urandom(8), 'big') & 0x3FFFFFFFFFFFFFFF
+    value = (timestamp & 0xFFFFFFFFFFFF) << 80 | 0x7 << 76 | counter << 64 | 0x2 << 62 | rand_b
+    return uuid.UUID(int=value)
+
+def new_id():
+    """Id (str) para as chaves primárias dos modelos"""
+    return str(uuid7())
@@ -0,0 +1,36 @@
+from datetime import datetime
+from src.models.user import db
+from src.models.ids import new_id
+
+class Job(db.Model):
+    """Tarefa em segundo plano (ex.: remoção de uma conexão com muitas mensagens)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Runner: busca pendentes e em execução sem heartbeat recente
+        db.Index('ix_jobs_status_updated', 'status', 'updated_at'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=new_id)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    type = db.Column(db.String(50), nullable=False)  # 'delete_connection'
+    params = db.Column(db.JSON)
+    status = db.Column(db.String(20), default='PENDING')  # 'PENDING', 'RUNNING', 'DONE', 'FAILED'
+    total = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
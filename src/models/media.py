@@ -0,0 +1,34 @@
+from datetime import datetime
+from src.models.user import db
+from src.models.ids import new_id
+
+class Media(db.Model):
+    """Anexo enviado por um usuário; o conteúdo fica no object store, indexado pelo sha256"""
+    __tablename__ = 'media'
+    __table_args__ = (
+        # Deduplicação: o mesmo arquivo enviado de novo pelo usuário reaproveita o registro
+        db.Index('ix_media_user_sha256', 'user_id', 'sha256'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=new_id)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    content_type = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    filename = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def url(self):
+        return f'/api/media/{self.id}'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'content_type': self.content_type,
+            'size': self.size,
+            'filename': self.filename,
+            'sha256': self.sha256,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,260 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from src.models.user import db
+from src.models.partitions import is_partitioned, create_partitioned_index
+
+# Migrações registradas em ordem de versão: (versão, nome, função)
+MIGRATIONS = []
+
+# Chave do advisory lock que serializa migrações entre workers (PostgreSQL)
+MIGRATION_LOCK_KEY = 7203114
+
+def migration(version, name):
+    """Registra uma função como migração de esquema"""
+    def decorator(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return decorator
+
+def is_postgresql(bind):
+    return bind.dialect.name == 'postgresql'
+
+def add_column(bind, table, column, ddl):
+    """Adiciona uma coluna caso ainda não exista"""
+    columns = {col['name'] for col in inspect(bind).get_columns(table)}
+    if column not in columns:
+        with bind.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+def create_index(bind, name, table, columns, unique=False, using=None):
+    """Cria um índice sem bloquear escritas na tabela.
+    
+    No PostgreSQL usa CREATE INDEX CONCURRENTLY fora de transação; um índice
+    inválido deixado por uma tentativa interrompida é removido e recriado.
+    """
+    unique_sql = 'UNIQUE ' if unique else ''
+    using_sql = f'USING {using} ' if using else ''
+    columns_sql = ', '.join(columns)
+    
+    if is_postgresql(bind):
+        with bind.connect() as conn:
+            partitioned = is_partitioned(conn, table)
+        if partitioned:
+            return create_partitioned_index(bind, name, table, columns, unique, using)
+        
+        with bind.connect() as conn:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            invalid = conn.execute(text(
+                'SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                'WHERE c.relname = :name AND NOT i.indisvalid'
+            ), {'name': name}).first()
+            if invalid:
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+            conn.execute(text(
+                f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {using_sql}({columns_sql})'
+            ))
+    else:
+        with bind.begin() as conn:
+            conn.execute(text(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns_sql})'))
+
+def delete_duplicates(bind, table, key_columns):
+    """Mantém apenas a linha mais recente (updated_at, id) para cada chave"""
+    same_key = ' AND '.join(f'newer.{col} = {table}.{col}' for col in key_columns)
+    with bind.begin() as conn:
+        conn.execute(text(
+            f'DELETE FROM {table} WHERE EXISTS ('
+            f'SELECT 1 FROM {table} newer WHERE {same_key} AND ('
+            f'newer.updated_at > {table}.updated_at OR '
+            f'(newer.updated_at = {table}.updated_at AND newer.id > {table}.id)))'
+        ))
+
+@migration(1, 'initial_schema')
+def initial_schema(bind):
+    # Em bancos novos cria o esquema atual completo; em bancos existentes
+    # cria apenas as tabelas que faltam e as migrações seguintes completam
+    db.metadata.create_all(bind)
+
+@migration(2, 'thread_counters')
+def thread_counters(bind):
+    from src.models.thread import Thread
+    
+    add_column(bind, 'threads', 'last_message_id', 'VARCHAR(36)')
+    add_column(bind, 'threads', 'last_message_preview', 'VARCHAR(255)')
+    add_column(bind, 'threads', 'unread_in_count', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(bind, 'threads', 'message_count', 'INTEGER NOT NULL DEFAULT 0')
+    
+    Thread.refresh_counters()
+    db.session.commit()
+
+@migration(3, 'hot_path_indexes')
+def hot_path_indexes(bind):
+    create_index(bind, 'ix_threads_user_last_message', 'threads', ['user_id', 'last_message_at', 'id'])
+    create_index(bind, 'ix_threads_user_channel_status', 'threads',
+                 ['user_id', 'channel', 'status', 'last_message_at'])
+    create_index(bind, 'ix_messages_thread_sent', 'messages', ['thread_id', 'sent_at', 'id'])
+    
+    delete_duplicates(bind, 'drafts', ['thread_id'])
+    create_index(bind, 'uq_drafts_thread_id', 'drafts', ['thread_id'], unique=True)
+    
+    delete_duplicates(bind, 'connections', ['user_id', 'type'])
+    create_index(bind, 'uq_connections_user_type', 'connections', ['user_id', 'type'], unique=True)
+
+@migration(4, 'full_text_search')
+def full_text_search(bind):
+    from src.services.search import THREAD_DOCUMENT_SQL, MESSAGE_DOCUMENT_SQL
+    
+    if is_postgresql(bind):
+        # Índices de expressão: mantidos pelo próprio PostgreSQL a cada escrita
+        create_index(bind, 'ix_threads_contact_fts', 'threads', [THREAD_DOCUMENT_SQL], using='gin')
+        create_index(bind, 'ix_messages_body_fts', 'messages', [MESSAGE_DOCUMENT_SQL], using='gin')
+        return
+    
+    if bind.dialect.name != 'sqlite':
+        return
+    
+    # SQLite: tabelas FTS5 de conteúdo externo sincronizadas por triggers
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS threads_fts USING fts5("
+        "contact_name, contact_handle, content='threads', content_rowid='rowid')",
+        "CREATE TRIGGER IF NOT EXISTS threads_fts_ai AFTER INSERT ON threads BEGIN "
+        "INSERT INTO threads_fts(rowid, contact_name, contact_handle) "
+        "VALUES (new.rowid, new.contact_name, new.contact_handle); END",
+        "CREATE TRIGGER IF NOT EXISTS threads_fts_ad AFTER DELETE ON threads BEGIN "
+        "INSERT INTO threads_fts(threads_fts, rowid, contact_name, contact_handle) "
+        "VALUES ('delete', old.rowid, old.contact_name, old.contact_handle); END",
+        "CREATE TRIGGER IF NOT EXISTS threads_fts_au AFTER UPDATE OF contact_name, contact_handle ON threads BEGIN "
+        "INSERT INTO threads_fts(threads_fts, rowid, contact_name, contact_handle) "
+        "VALUES ('delete', old.rowid, old.contact_name, old.contact_handle); "
+        "INSERT INTO threads_fts(rowid, contact_name, contact_handle) "
+        "VALUES (new.rowid, new.contact_name, new.contact_handle); END",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+        "body, content='messages', content_rowid='rowid')",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, body) VALUES (new.rowid, new.body); END",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, body) VALUES ('delete', old.rowid, old.body); END",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF body ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, body) VALUES ('delete', old.rowid, old.body); "
+        "INSERT INTO messages_fts(rowid, body) VALUES (new.rowid, new.body); END",
+        # Indexa o conteúdo já existente
+        "INSERT INTO threads_fts(threads_fts) VALUES ('rebuild')",
+        "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+    ]
+    with bind.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+@migration(5, 'outbound_delivery')
+def outbound_delivery(bind):
+    add_column(bind, 'messages', 'external_message_id', 'VARCHAR(255)')
+
+@migration(6, 'inbound_ingestion')
+def inbound_ingestion(bind):
+    create_index(bind, 'uq_threads_user_channel_external', 'threads',
+                 ['user_id', 'channel', 'external_thread_id'], unique=True)
+    create_index(bind, 'uq_messages_thread_external', 'messages',
+                 ['thread_id', 'external_message_id'], unique=True)
+
+@migration(7, 'conditional_reads')
+def conditional_reads(bind):
+    create_index(bind, 'ix_threads_user_updated', 'threads', ['user_id', 'updated_at'])
+
+@migration(8, 'background_jobs')
+def background_jobs(bind):
+    from src.models.job import Job
+    
+    Job.__table__.create(bind, checkfirst=True)
+
+@migration(9, 'message_archive')
+def message_archive(bind):
+    from src.models.thread import MessageArchive
+    
+    MessageArchive.__table__.create(bind, checkfirst=True)
+    create_index(bind, 'ix_messages_sent_at', 'messages', ['sent_at'])
+
+@migration(10, 'media')
+def media(bind):
+    from src.models.media import Media
+    
+    Media.__table__.create(bind, checkfirst=True)
+
+@migration(11, 'outbound_lease')
+def outbound_lease(bind):
+    add_column(bind, 'messages', 'attempts', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(bind, 'messages', 'next_attempt_at', 'TIMESTAMP')
+    add_column(bind, 'messages', 'claimed_at', 'TIMESTAMP')
+    create_index(bind, 'ix_messages_status_next_attempt', 'messages', ['status', 'next_attempt_at'])
+
+@migration(12, 'connection_webhook_secret')
+def connection_webhook_secret(bind):
+    import json
+    from src.models.thread import new_webhook_secret
+    
+    add_column(bind, 'connections', 'webhook_secret', 'VARCHAR(64)')
+    # Toda conexão passa a ter segredo (reaproveita o que estava em connection_metadata)
+    with bind.begin() as conn:
+        rows = conn.execute(text(
+            'SELECT id, connection_metadata FROM connections WHERE webhook_secret IS NULL'
+        )).all()
+        for connection_id, metadata in rows:
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            secret = (metadata or {}).get('webhook_secret') or new_webhook_secret()
+            conn.execute(text('UPDATE connections SET webhook_secret = :secret WHERE id = :id'),
+                         {'secret': secret, 'id': connection_id})
+
+@migration(13, 'draft_tombstone')
+def draft_tombstone(bind):
+    add_column(bind, 'threads', 'draft_deleted_at', 'TIMESTAMP')
+
+def ensure_migrations_table(bind):
+    with bind.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, '
+            'name VARCHAR(255) NOT NULL, '
+            'applied_at TIMESTAMP NOT NULL)'
+        ))
+
+def applied_versions(bind):
+    with bind.connect() as conn:
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+def upgrade_database():
+    """Aplica, em ordem, as migrações ainda não registradas em schema_migrations.
+    
+    Deve ser chamada dentro de um app context. Retorna as versões aplicadas.
+    """
+    bind = db.engine
+    ensure_migrations_table(bind)
+    
+    pending = [m for m in MIGRATIONS if m[0] not in applied_versions(bind)]
+    if not pending:
+        return []
+    
+    lock_conn = None
+    if is_postgresql(bind):
+        # Outro worker pode estar migrando ao mesmo tempo
+        lock_conn = bind.connect().execution_options(isolation_level='AUTOCOMMIT')
+        lock_conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+    
+    applied = []
+    try:
+        done = applied_versions(bind)
+        for version, name, func in MIGRATIONS:
+            if version in done:
+                continue
+            func(bind)
+            with bind.begin() as conn:
+                conn.execute(
+                    text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)'),
+                    {'v': version, 'n': name, 't': datetime.utcnow()}
+                )
+            applied.append(version)
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            lock_conn.close()
+    
+    return applied
@@ -0,0 +1,194 @@
+from datetime import date, datetime
+from sqlalchemy import text
+
+# Particionamento mensal de messages por sent_at (somente PostgreSQL).
+# Partições: messages_pAAAA_MM, mais messages_default para datas sem partição.
+PARTITIONED_TABLE = 'messages'
+DEFAULT_PARTITION = 'messages_default'
+
+# Índices da tabela particionada. Índices únicos precisam incluir a chave
+# de partição, por isso a idempotência por id do provedor inclui sent_at.
+MESSAGE_INDEXES = [
+    ('ix_messages_thread_sent', ['thread_id', 'sent_at', 'id'], False),
+    ('uq_messages_thread_external', ['thread_id', 'external_message_id', 'sent_at'], True),
+    ('ix_messages_sent_at', ['sent_at'], False),
+    ('ix_messages_status_next_attempt', ['status', 'next_attempt_at'], False),
+]
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def next_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+def partition_name(month):
+    return f'{PARTITIONED_TABLE}_p{month.year:04d}_{month.month:02d}'
+
+def is_partitioned(conn, table=PARTITIONED_TABLE):
+    return conn.execute(text(
+        'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+        'WHERE c.relname = :table'
+    ), {'table': table}).first() is not None
+
+def list_partitions(conn, table=PARTITIONED_TABLE):
+    """Partições (nome) anexadas à tabela"""
+    return conn.execute(text(
+        'SELECT c.relname FROM pg_inherits i '
+        'JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent '
+        'WHERE p.relname = :table ORDER BY c.relname'
+    ), {'table': table}).scalars().all()
+
+def create_month_partition(conn, month, table=PARTITIONED_TABLE):
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {table} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    ))
+
+def partition_exists(conn, month):
+    return conn.execute(text('SELECT to_regclass(:name)'), {'name': partition_name(month)}).scalar() is not None
+
+def attach_month_partition(conn, month, table=PARTITIONED_TABLE):
+    """Cria a partição de month levando para ela as linhas do mês que estão na default.
+    
+    Com linhas do mês em messages_default, CREATE TABLE ... PARTITION OF
+    falha; por isso a partição é criada à parte, recebe as linhas (DELETE
+    da default na mesma transação) e só então é anexada. A default fica
+    bloqueada até o commit, e o ATTACH cria os índices e a chave
+    estrangeira da tabela pai.
+    """
+    name = partition_name(month)
+    bounds = {'start': month, 'end': next_month(month)}
+    conn.execute(text(f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE'))
+    conn.execute(text(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)'))
+    conn.execute(text(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE sent_at >= :start AND sent_at < :end RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved'
+    ), bounds)
+    conn.execute(text(
+        f'ALTER TABLE {table} ATTACH PARTITION {name} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    ))
+
+def ensure_message_partitions(bind, months_ahead=3, today=None):
+    """Cria as partições do mês atual e dos próximos `months_ahead` meses.
+    
+    Roda a cada deploy (flask db-upgrade), periodicamente nos workers
+    (PartitionMaintainer) e com `flask message-partitions`. Linhas que já
+    caíram em messages_default são movidas para a partição nova. Sem
+    tabela particionada não faz nada. Retorna os nomes das partições verificadas.
+    """
+    if bind.dialect.name != 'postgresql':
+        return []
+    
+    month = month_start(today or datetime.utcnow())
+    names = []
+    with bind.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        # Vários workers podem rodar a manutenção ao mesmo tempo
+        conn.execute(text('SELECT pg_advisory_xact_lock(hashtext(:key))'), {'key': f'{PARTITIONED_TABLE}_partitions'})
+        for _ in range(months_ahead + 1):
+            if not partition_exists(conn, month):
+                attach_month_partition(conn, month)
+            names.append(partition_name(month))
+            month = next_month(month)
+    return names
+
+def create_partitioned_index(bind, name, table, columns, unique=False, using=None):
+    """Cria um índice em tabela particionada sem travar escritas.
+    
+    CREATE INDEX CONCURRENTLY não é aceito na tabela pai: cria-se o índice
+    apenas no pai (ON ONLY, inválido), cada partição ganha o seu índice de
+    forma concorrente e é anexada; com todas anexadas o índice pai fica válido.
+    """
+    unique_sql = 'UNIQUE ' if unique else ''
+    using_sql = f'USING {using} ' if using else ''
+    columns_sql = ', '.join(columns)
+    
+    with bind.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        conn.execute(text(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON ONLY {table} {using_sql}({columns_sql})'))
+        for partition in list_partitions(conn, table):
+            partition_index = f'{partition}_{name}'[:63]
+            conn.execute(text(
+                f'CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {partition_index} '
+                f'ON {partition} {using_sql}({columns_sql})'
+            ))
+            attached = conn.execute(text(
+                'SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                'WHERE c.relname = :child'
+            ), {'child': partition_index}).first()
+            if not attached:
+                conn.execute(text(f'ALTER INDEX {name} ATTACH PARTITION {partition_index}'))
+
+def convert_messages_table(bind, months_ahead=3):
+    """Converte messages em tabela particionada por mês de sent_at.
+    
+    Operação de manutenção, em uma única transação: escritas em messages
+    ficam bloqueadas durante a cópia (leituras continuam). Chave primária
+    passa a ser (id, sent_at).
+    """
+    from src.services.search import MESSAGE_DOCUMENT_SQL
+    
+    with bind.begin() as conn:
+        if is_partitioned(conn):
+            return False
+        
+        conn.execute(text(f'LOCK TABLE {PARTITIONED_TABLE} IN EXCLUSIVE MODE'))
+        conn.execute(text(
+            f'UPDATE {PARTITIONED_TABLE} SET sent_at = COALESCE(created_at, now()) WHERE sent_at IS NULL'
+        ))
+        conn.execute(text(
+            f'CREATE TABLE messages_partitioned (LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (sent_at)'
+        ))
+        conn.execute(text('ALTER TABLE messages_partitioned ALTER COLUMN sent_at SET NOT NULL'))
+        
+        oldest, newest = conn.execute(text(f'SELECT min(sent_at), max(sent_at) FROM {PARTITIONED_TABLE}')).one()
+        month = month_start(oldest or datetime.utcnow())
+        last = month_start(max(newest or datetime.utcnow(), datetime.utcnow()))
+        for _ in range(months_ahead):
+            last = next_month(last)
+        while month <= last:
+            create_month_partition(conn, month, 'messages_partitioned')
+            month = next_month(month)
+        conn.execute(text(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF messages_partitioned DEFAULT'))
+        
+        conn.execute(text(f'INSERT INTO messages_partitioned SELECT * FROM {PARTITIONED_TABLE}'))
+        conn.execute(text(f'DROP TABLE {PARTITIONED_TABLE}'))
+        conn.execute(text(f'ALTER TABLE messages_partitioned RENAME TO {PARTITIONED_TABLE}'))
+        
+        conn.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} ADD PRIMARY KEY (id, sent_at)'))
+        conn.execute(text(
+            f'ALTER TABLE {PARTITIONED_TABLE} ADD FOREIGN KEY (thread_id) REFERENCES threads (id)'
+        ))
+        for name, columns, unique in MESSAGE_INDEXES:
+            unique_sql = 'UNIQUE ' if unique else ''
+            conn.execute(text(f'CREATE {unique_sql}INDEX {name} ON {PARTITIONED_TABLE} ({", ".join(columns)})'))
+        conn.execute(text(
+            f'CREATE INDEX ix_messages_body_fts ON {PARTITIONED_TABLE} USING gin ({MESSAGE_DOCUMENT_SQL})'
+        ))
+    return True
+
+def detach_partitions_before(bind, before, drop=False):
+    """Desanexa (e opcionalmente remove) as partições mensais anteriores ao mês de `before`.
+    
+    Use depois de `flask archive-messages`: partições antigas ficam vazias e
+    saem da tabela sem DELETE. Retorna os nomes afetados.
+    """
+    if bind.dialect.name != 'postgresql':
+        return []
+    
+    limit = partition_name(month_start(before))
+    affected = []
+    with bind.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        for name in list_partitions(conn):
+            if name == DEFAULT_PARTITION or name >= limit:
+                continue
+            conn.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name}'))
+            if drop:
+                conn.execute(text(f'DROP TABLE {name}'))
+            affected.append(name)
+    return affected
@@ -0,0 +1,21 @@
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+# Chave do bind da réplica de leitura em SQLALCHEMY_BINDS
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """Sessão que envia leituras à réplica quando a requisição permite.
+    
+    Com info['use_replica'] (definido por requisição em services.replica),
+    consultas vão ao engine da réplica; flush e INSERT/UPDATE/DELETE sempre
+    vão ao primário.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing \
+                and not isinstance(clause, UpdateBase):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -1,25 +1,152 @@
 from flask_sqlalchemy import SQLAlchemy
+import secrets
 from datetime import datetime
+from sqlalchemy import inspect
 from src.models.user import db
+from src.models.ids import new_id
+
+# Tamanho máximo do trecho da última mensagem guardado na thread
+PREVIEW_LENGTH = 255
+
+def projected_columns(model, *extra):
+    """Colunas serializadas do modelo (mais `extra`), para consultar linhas em vez de objetos ORM.
+    
+    row._asdict() das linhas resultantes tem o mesmo esquema de to_dict(), com
+    datas ainda como datetime (o provider JSON as serializa em ISO 8601).
+    """
+    return [getattr(model, name) for name in model.SERIALIZED_FIELDS] + list(extra)
 
 class Thread(db.Model):
     __tablename__ = 'threads'
+    __table_args__ = (
+        # Caixa de entrada: filtro por usuário (e canal/status) ordenado por última mensagem
+        db.Index('ix_threads_user_last_message', 'user_id', 'last_message_at', 'id'),
+        db.Index('ix_threads_user_channel_status', 'user_id', 'channel', 'status', 'last_message_at'),
+        # Upsert de threads recebidas pelo webhook
+        db.Index('uq_threads_user_channel_external', 'user_id', 'channel', 'external_thread_id', unique=True),
+        # Versão do inbox (ETag): max(updated_at) por usuário
+        db.Index('ix_threads_user_updated', 'user_id', 'updated_at'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(db.String(36), primary_key=True, default=new_id)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     channel = db.Column(db.String(20), nullable=False)  # 'whatsapp', 'telegram', 'instagram'
     external_thread_id = db.Column(db.String(255), nullable=False)
     contact_name = db.Column(db.String(255), nullable=False)
     contact_handle = db.Column(db.String(255), nullable=False)
     last_message_at = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='NEW')  # 'NEW', 'OPEN', 'DONE'
+    status = db.Column(db.String(20), default='NEW')  # 'NEW', 'OPEN', 'DONE', 'ARCHIVED'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Contadores desnormalizados (mantidos a cada nova mensagem)
+    last_message_id = db.Column(db.String(36))
+    last_message_preview = db.Column(db.String(PREVIEW_LENGTH))
+    unread_in_count = db.Column(db.Integer, default=0, nullable=False)
+    message_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Última remoção do rascunho: vale para os buffers de todos os workers
+    draft_deleted_at = db.Column(db.DateTime)
+    
     # Relacionamentos
     messages = db.relationship('Message', backref='thread', lazy=True, cascade='all, delete-orphan')
     drafts = db.relationship('Draft', backref='thread', lazy=True, cascade='all, delete-orphan')
     
+    def register_message(self, message):
+        """Atualiza os contadores da thread com uma nova mensagem (na mesma transação)"""
+        if message.sent_at is None:
+            message.sent_at = datetime.utcnow()
+        
+        if not self.last_message_id or self.last_message_at is None or message.sent_at >= self.last_message_at:
+            self.last_message_id = message.id
+            self.last_message_preview = message.body[:PREVIEW_LENGTH]
+            self.last_message_at = message.sent_at
+        
+        is_unread = message.direction == 'IN' and message.status != 'READ'
+        
+        if inspect(self).persistent:
+            # Incremento no próprio UPDATE para não perder envios concorrentes
+            self.message_count = Thread.message_count + 1
+            if is_unread:
+                self.unread_in_count = Thread.unread_in_count + 1
+        else:
+            self.message_count = (self.message_count or 0) + 1
+            if is_unread:
+                self.unread_in_count = (self.unread_in_count or 0) + 1
+    
+    @classmethod
+    def touch(cls, thread_ids):
+        """Atualiza updated_at das threads (mudanças que só afetam as mensagens)"""
+        thread_ids = list(set(thread_ids))
+        if thread_ids:
+            db.session.execute(
+                db.update(cls).where(cls.id.in_(thread_ids)).values(updated_at=datetime.utcnow())
+                  .execution_options(synchronize_session=False)
+            )
+    
+    @classmethod
+    def delete_many(cls, thread_ids):
+        """Remove as threads com suas mensagens e rascunhos, sem carregar objetos.
+        
+        Não faz commit; o chamador controla a transação (e o tamanho dos lotes).
+        Retorna o número de threads removidas.
+        """
+        thread_ids = list(thread_ids)
+        if not thread_ids:
+            return 0
+        for model in (Message, MessageArchive, Draft):
+            db.session.execute(
+                db.delete(model).where(model.thread_id.in_(thread_ids))
+                  .execution_options(synchronize_session=False)
+            )
+        return db.session.execute(
+            db.delete(cls).where(cls.id.in_(thread_ids)).execution_options(synchronize_session=False)
+        ).rowcount
+    
+    @classmethod
+    def delete_messages(cls, thread_ids, limit):
+        """Remove até `limit` mensagens das threads (lote limitado por linhas, não por threads).
+        
+        Threads longas podem ter centenas de milhares de mensagens: o chamador
+        repete até retornar 0, com commit entre os lotes. Retorna quantas removeu.
+        """
+        message_ids = db.select(Message.id).where(Message.thread_id.in_(list(thread_ids))).limit(limit)
+        return db.session.execute(
+            db.delete(Message).where(Message.id.in_(message_ids)).execution_options(synchronize_session=False)
+        ).rowcount
+    
+    @classmethod
+    def refresh_counters(cls, thread_ids=None):
+        """Recalcula os contadores a partir da tabela de mensagens (backfill/reparo)"""
+        last_message = db.select(Message).where(Message.thread_id == cls.id)\
+                         .order_by(Message.sent_at.desc(), Message.id.desc()).limit(1).correlate(cls)
+        
+        statement = db.update(cls).values(
+            last_message_id=last_message.with_only_columns(Message.id).scalar_subquery(),
+            last_message_preview=last_message.with_only_columns(
+                db.func.substr(Message.body, 1, PREVIEW_LENGTH)
+            ).scalar_subquery(),
+            last_message_at=db.func.coalesce(
+                db.select(db.func.max(Message.sent_at))
+                  .where(Message.thread_id == cls.id).correlate(cls).scalar_subquery(),
+                cls.last_message_at
+            ),
+            message_count=db.select(db.func.count(Message.id))
+                            .where(Message.thread_id == cls.id).correlate(cls).scalar_subquery(),
+            unread_in_count=db.select(db.func.count(Message.id))
+                              .where(Message.thread_id == cls.id,
+                                     Message.direction == 'IN',
+                                     Message.status != 'READ').correlate(cls).scalar_subquery()
+        )
+        if thread_ids is not None:
+            statement = statement.where(cls.id.in_(thread_ids))
+        
+        return db.session.execute(statement.execution_options(synchronize_session=False)).rowcount
+    
+    # Campos de to_dict(), na mesma ordem (consultas projetadas)
+    SERIALIZED_FIELDS = ('id', 'user_id', 'channel', 'external_thread_id', 'contact_name',
+                         'contact_handle', 'last_message_at', 'status', 'created_at', 'updated_at')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -36,17 +163,38 @@ class Thread(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Histórico da thread ordenado por envio
+        db.Index('ix_messages_thread_sent', 'thread_id', 'sent_at', 'id'),
+        # Idempotência por id do provedor
+        db.Index('uq_messages_thread_external', 'thread_id', 'external_message_id', unique=True),
+        # Arquivamento: mensagens mais antigas que o prazo de retenção
+        db.Index('ix_messages_sent_at', 'sent_at'),
+        # Fila de envio: QUEUED vencidas e SENDING com lease expirado
+        db.Index('ix_messages_status_next_attempt', 'status', 'next_attempt_at'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(db.String(36), primary_key=True, default=new_id)
     thread_id = db.Column(db.String(36), db.ForeignKey('threads.id'), nullable=False)
     channel = db.Column(db.String(20), nullable=False)
     direction = db.Column(db.String(10), nullable=False)  # 'IN', 'OUT'
     body = db.Column(db.Text, nullable=False)
     media_url = db.Column(db.String(500))
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='SENT')  # 'SENT', 'DELIVERED', 'READ', 'FAILED'
+    status = db.Column(db.String(20), default='SENT')  # 'QUEUED', 'SENDING', 'SENT', 'DELIVERED', 'READ', 'FAILED'
+    external_message_id = db.Column(db.String(255))  # Id da mensagem no provedor do canal
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Fila de envio (OUT): tentativas feitas, próxima tentativa após o backoff e
+    # início do lease de quem está enviando (SENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime)
+    claimed_at = db.Column(db.DateTime)
+    
+    # Campos de to_dict(), na mesma ordem (consultas projetadas)
+    SERIALIZED_FIELDS = ('id', 'thread_id', 'channel', 'direction', 'body', 'media_url',
+                         'sent_at', 'status', 'created_at')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -60,10 +208,31 @@ class Message(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class MessageArchive(db.Model):
+    """Mensagens antigas de uma thread, em um bloco comprimido (armazenamento frio)"""
+    __tablename__ = 'message_archives'
+    __table_args__ = (
+        # Paginação do histórico: blocos da thread pela chave (sent_at, id) das pontas
+        db.Index('ix_message_archives_thread_last', 'thread_id', 'last_sent_at', 'last_id'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=new_id)
+    thread_id = db.Column(db.String(36), db.ForeignKey('threads.id'), nullable=False)
+    first_sent_at = db.Column(db.DateTime, nullable=False)
+    first_id = db.Column(db.String(36), nullable=False)
+    last_sent_at = db.Column(db.DateTime, nullable=False)
+    last_id = db.Column(db.String(36), nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)  # JSON (campos de Message.to_dict) com zlib
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Draft(db.Model):
     __tablename__ = 'drafts'
+    __table_args__ = (
+        db.Index('uq_drafts_thread_id', 'thread_id', unique=True),
+    )
     
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(db.String(36), primary_key=True, default=new_id)
     thread_id = db.Column(db.String(36), db.ForeignKey('threads.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -76,14 +245,21 @@ class Draft(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+def new_webhook_secret():
+    return secrets.token_hex(32)
+
 class Connection(db.Model):
     __tablename__ = 'connections'
+    __table_args__ = (
+        db.Index('uq_connections_user_type', 'user_id', 'type', unique=True),
+    )
     
-    id = db.Column(db.String(36), primary_key=True)
+    id = db.Column(db.String(36), primary_key=True, default=new_id)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     type = db.Column(db.String(20), nullable=False)  # 'WA', 'TG', 'IG'
-    status = db.Column(db.String(20), default='ACTIVE')  # 'ACTIVE', 'INACTIVE', 'ERROR'
+    status = db.Column(db.String(20), default='ACTIVE')  # 'ACTIVE', 'INACTIVE', 'ERROR', 'DELETING'
     token_ref = db.Column(db.String(255))  # Referência para token criptografado
+    webhook_secret = db.Column(db.String(64), default=new_webhook_secret)  # HMAC dos webhooks do provedor
     connection_metadata = db.Column(db.JSON)  # Dados específicos da conexão
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -94,6 +270,8 @@ class Connection(db.Model):
             'user_id': self.user_id,
             'type': self.type,
             'status': self.status,
+            'webhook_url': f'/api/webhooks/{self.type}/{self.id}',
+            'webhook_secret': self.webhook_secret,
             'connection_metadata': self.connection_metadata,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -1,15 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g, current_app
 from src.models.user import db, User
+from src.models.ids import new_id
 from src.models.thread import Thread, Message, Connection
-import uuid
+from src.services.auth import login_required, issue_token, issue_ticket, DEFAULT_TOKEN_MAX_AGE, DEFAULT_TICKET_MAX_AGE
+from src.services.otp_store import get_otp_store
 import random
 import string
 from datetime import datetime, timedelta
 
 auth_bp = Blueprint('auth', __name__)
 
-# Simulação de armazenamento temporário para códigos OTP
-otp_storage = {}
+# Validade do código OTP (segundos)
+OTP_TTL = 120
 
 def generate_otp():
     """Gera um código OTP de 6 dígitos"""
@@ -36,15 +38,28 @@ def send_otp():
         if not phone:
             return jsonify({'error': 'Número de telefone é obrigatório'}), 400
         
+        otp_store = get_otp_store()
+        
+        # Limita envios por telefone
+        allowed, retry_after = otp_store.hit(
+            f'send:{phone}',
+            current_app.config.get('OTP_RATE_LIMIT', 3),
+            current_app.config.get('OTP_RATE_WINDOW', 600)
+        )
+        if not allowed:
+            response = jsonify({'error': 'Muitas solicitações de código. Tente novamente mais tarde'})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+        
         # Gera código OTP
         otp_code = generate_otp()
         
-        # Armazena temporariamente (em produção, usar Redis)
-        otp_storage[phone] = {
+        # Armazena temporariamente (expira sozinho após OTP_TTL)
+        otp_store.save(phone, {
             'code': otp_code,
-            'expires_at': datetime.utcnow() + timedelta(minutes=2),
+            'expires_at': (datetime.utcnow() + timedelta(seconds=OTP_TTL)).isoformat(),
             'method': method
-        }
+        }, OTP_TTL)
         
         # Envia OTP
         if method == 'whatsapp':
@@ -55,7 +70,7 @@ def send_otp():
         if success:
             return jsonify({
                 'message': f'Código enviado via {method}',
-                'expires_in': 120  # 2 minutos
+                'expires_in': OTP_TTL
             }), 200
         else:
             return jsonify({'error': 'Falha ao enviar código'}), 500
@@ -74,23 +89,19 @@ def verify_otp():
         if not phone or not code:
             return jsonify({'error': 'Telefone e código são obrigatórios'}), 400
         
-        # Verifica se existe OTP para este telefone
-        if phone not in otp_storage:
-            return jsonify({'error': 'Código não encontrado ou expirado'}), 400
-        
-        otp_data = otp_storage[phone]
+        otp_store = get_otp_store()
         
-        # Verifica se o código expirou
-        if datetime.utcnow() > otp_data['expires_at']:
-            del otp_storage[phone]
-            return jsonify({'error': 'Código expirado'}), 400
+        # Verifica se existe OTP (não expirado) para este telefone
+        otp_data = otp_store.get(phone)
+        if not otp_data:
+            return jsonify({'error': 'Código não encontrado ou expirado'}), 400
         
         # Verifica se o código está correto
         if otp_data['code'] != code:
             return jsonify({'error': 'Código inválido'}), 400
         
         # Remove o código usado
-        del otp_storage[phone]
+        otp_store.delete(phone)
         
         # Busca ou cria usuário
         user = User.query.filter_by(phone=phone).first()
@@ -98,7 +109,7 @@ def verify_otp():
         
         if not user:
             # Cria novo usuário
-            user_id = str(uuid.uuid4())
+            user_id = new_id()
             trial_ends_at = datetime.utcnow() + timedelta(days=30)
             
             user = User(
@@ -116,36 +127,25 @@ def verify_otp():
             'message': 'Autenticação realizada com sucesso',
             'user': user.to_dict(),
             'is_first_login': is_first_login,
-            'token': f'mock_token_{user.id}'  # Em produção, usar JWT
+            'token': issue_token(user.id),
+            'expires_in': current_app.config.get('TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE)
         }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@auth_bp.route('/ticket', methods=['POST'])
+@login_required
+def create_ticket():
+    """Ticket de curta duração para URLs sem cabeçalho (EventSource, <img> de anexos)"""
+    return jsonify({
+        'ticket': issue_ticket(g.user_id),
+        'expires_in': current_app.config.get('TICKET_MAX_AGE', DEFAULT_TICKET_MAX_AGE)
+    }), 200
+
 @auth_bp.route('/me', methods=['GET'])
+@login_required
 def get_current_user():
-    """Retorna dados do usuário atual (mock)"""
-    try:
-        # Em produção, extrair do token JWT
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        
-        # Mock: extrair user_id do token
-        if token.startswith('mock_token_'):
-            user_id = token.replace('mock_token_', '')
-            user = User.query.get(user_id)
-            
-            if user:
-                return jsonify({'user': user.to_dict()}), 200
-            else:
-                return jsonify({'error': 'Usuário não encontrado'}), 404
-        else:
-            return jsonify({'error': 'Token inválido'}), 401
-            
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
+    """Retorna dados do usuário atual"""
+    return jsonify({'user': g.user}), 200
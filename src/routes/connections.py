@@ -1,53 +1,48 @@
-from flask import Blueprint, request, jsonify
-from src.models.user import db, User
+from flask import Blueprint, current_app, request, jsonify, g
+from src.models.user import db
+from src.models.ids import new_id
 from src.models.thread import Connection, Thread, Message
-import uuid
+from src.models.job import Job
+from src.services.events import publish_event
+from src.services.auth import login_required
+from src.services.http_cache import conditional_json, make_etag
+from src.services.jobs import create_job, get_job_runner, job_handler
 from datetime import datetime
 
 connections_bp = Blueprint('connections', __name__)
 
-def get_user_from_token(token):
-    """Extrai usuário do token (mock)"""
-    if token and token.startswith('mock_token_'):
-        user_id = token.replace('mock_token_', '')
-        return User.query.get(user_id)
-    return None
+# Threads removidas por lote ao apagar os dados de uma conexão, e mensagens por
+# comando (cada lote fica abaixo do statement timeout e renova o heartbeat do job)
+CONNECTION_DELETE_BATCH = 500
+CONNECTION_DELETE_MESSAGE_BATCH = 5000
 
 @connections_bp.route('/connections', methods=['GET'])
+@login_required
 def get_connections():
     """Lista todas as conexões do usuário"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
+        user_id = g.user_id
         
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
+        count, updated_at = db.session.query(
+            db.func.count(Connection.id), db.func.max(Connection.updated_at)
+        ).filter(Connection.user_id == user_id).one()
+        etag = make_etag('connections', user_id, count, updated_at)
         
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        def build():
+            connections = Connection.query.filter_by(user_id=user_id).all()
+            return {'connections': [conn.to_dict() for conn in connections]}
         
-        connections = Connection.query.filter_by(user_id=user.id).all()
-        connections_data = [conn.to_dict() for conn in connections]
-        
-        return jsonify({'connections': connections_data}), 200
+        return conditional_json(etag, build)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @connections_bp.route('/connections', methods=['POST'])
+@login_required
 def create_connection():
     """Cria uma nova conexão com canal"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        user_id = g.user_id
         
         data = request.get_json()
         connection_type = data.get('type')  # 'WA', 'TG', 'IG'
@@ -62,7 +57,7 @@ def create_connection():
         
         # Verifica se já existe conexão deste tipo
         existing = Connection.query.filter_by(
-            user_id=user.id, 
+            user_id=user_id, 
             type=connection_type
         ).first()
         
@@ -74,10 +69,10 @@ def create_connection():
             return jsonify({'error': 'Token inválido'}), 400
         
         # Cria nova conexão
-        connection_id = str(uuid.uuid4())
+        connection_id = new_id()
         connection = Connection(
             id=connection_id,
-            user_id=user.id,
+            user_id=user_id,
             type=connection_type,
             status='ACTIVE',
             token_ref=f'encrypted_{token_data}',  # Em produção, criptografar
@@ -88,7 +83,7 @@ def create_connection():
         db.session.commit()
         
         # Simula criação de threads de exemplo
-        create_sample_threads(user.id, connection_type)
+        create_sample_threads(user_id, connection_type)
         
         return jsonify({
             'message': 'Conexão criada com sucesso',
@@ -100,64 +95,74 @@ def create_connection():
         return jsonify({'error': str(e)}), 500
 
 @connections_bp.route('/connections/<connection_id>', methods=['DELETE'])
+@login_required
 def delete_connection(connection_id):
     """Remove uma conexão"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        user_id = g.user_id
         
         connection = Connection.query.filter_by(
             id=connection_id, 
-            user_id=user.id
+            user_id=user_id
         ).first()
         
         if not connection:
             return jsonify({'error': 'Conexão não encontrada'}), 404
         
-        # Remove threads relacionadas
-        Thread.query.filter_by(
-            user_id=user.id,
-            channel=get_channel_name(connection.type)
-        ).delete()
+        # Só bloqueia se há job ativo: depois de um job FAILED a remoção pode ser repetida
+        if connection.status == 'DELETING':
+            active_job = active_delete_job(connection)
+            if active_job:
+                return jsonify({'error': 'Remoção já em andamento', 'job': active_job.to_dict()}), 409
         
-        db.session.delete(connection)
+        thread_count, message_count = db.session.query(
+            db.func.count(Thread.id), db.func.coalesce(db.func.sum(Thread.message_count), 0)
+        ).filter(Thread.user_id == user_id, Thread.channel == get_channel_name(connection.type)).one()
+        
+        # Contas pequenas: remove tudo na própria requisição
+        if message_count <= current_app.config['CONNECTION_DELETE_SYNC_LIMIT']:
+            delete_connection_data(connection)
+            db.session.commit()
+            return jsonify({'message': 'Conexão removida com sucesso'}), 200
+        
+        # Contas grandes: remove em segundo plano; o andamento fica em /api/jobs/<id>
+        connection.status = 'DELETING'
+        job = create_job(user_id, 'delete_connection', {'connection_id': connection.id}, total=thread_count)
         db.session.commit()
+        get_job_runner().notify()
         
-        return jsonify({'message': 'Conexão removida com sucesso'}), 200
+        return jsonify({
+            'message': 'Remoção da conexão em andamento',
+            'job': job.to_dict()
+        }), 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @connections_bp.route('/connections/<connection_id>/test', methods=['POST'])
+@login_required
 def test_connection(connection_id):
     """Testa uma conexão existente"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        user_id = g.user_id
         
         connection = Connection.query.filter_by(
             id=connection_id, 
-            user_id=user.id
+            user_id=user_id
         ).first()
         
         if not connection:
             return jsonify({'error': 'Conexão não encontrada'}), 404
         
+        # Uma conexão em remoção não volta a ACTIVE (webhooks voltariam a ser aceitos)
+        if connection.status == 'DELETING':
+            active_job = active_delete_job(connection)
+            return jsonify({
+                'error': 'Conexão em remoção',
+                'job': active_job.to_dict() if active_job else None
+            }), 409
+        
         # Simula teste da conexão
         test_result = test_channel_connection(connection.type, connection.token_ref)
         
@@ -207,6 +212,44 @@ def test_channel_connection(connection_type, token_ref):
         'timestamp': datetime.utcnow().isoformat()
     }
 
+def delete_connection_data(connection, progress=None):
+    """Remove as threads do canal da conexão (com mensagens e rascunhos) e a conexão, em lotes.
+    
+    Sem `progress`, tudo fica na transação do chamador; com `progress` (job em
+    segundo plano) cada lote de mensagens e de threads é confirmado separadamente.
+    """
+    channel = get_channel_name(connection.type)
+    while True:
+        thread_ids = db.session.execute(
+            db.select(Thread.id)
+              .where(Thread.user_id == connection.user_id, Thread.channel == channel)
+              .limit(CONNECTION_DELETE_BATCH)
+        ).scalars().all()
+        if not thread_ids:
+            break
+        while Thread.delete_messages(thread_ids, CONNECTION_DELETE_MESSAGE_BATCH):
+            if progress:
+                progress(0)
+        Thread.delete_many(thread_ids)
+        if progress:
+            progress(len(thread_ids))
+    
+    db.session.delete(connection)
+
+def active_delete_job(connection):
+    """Job de remoção pendente ou em execução da conexão, se houver"""
+    jobs = Job.query.filter(
+        Job.user_id == connection.user_id, Job.type == 'delete_connection',
+        Job.status.in_(('PENDING', 'RUNNING'))
+    )
+    return next((job for job in jobs if (job.params or {}).get('connection_id') == connection.id), None)
+
+@job_handler('delete_connection')
+def delete_connection_job(job, progress):
+    connection = Connection.query.filter_by(id=job.params['connection_id'], user_id=job.user_id).first()
+    if connection:
+        delete_connection_data(connection, progress)
+
 def get_channel_name(connection_type):
     """Converte tipo de conexão para nome do canal"""
     mapping = {
@@ -245,8 +288,9 @@ def create_sample_threads(user_id, connection_type):
     }
     
     if channel in sample_data:
+        created = []
         for sample in sample_data[channel]:
-            thread_id = str(uuid.uuid4())
+            thread_id = new_id()
             thread = Thread(
                 id=thread_id,
                 user_id=user_id,
@@ -259,7 +303,7 @@ def create_sample_threads(user_id, connection_type):
             db.session.add(thread)
             
             # Adiciona mensagem de exemplo
-            message_id = str(uuid.uuid4())
+            message_id = new_id()
             message = Message(
                 id=message_id,
                 thread_id=thread_id,
@@ -269,6 +313,14 @@ def create_sample_threads(user_id, connection_type):
                 status='READ'
             )
             db.session.add(message)
+            thread.register_message(message)
+            created.append((thread, message))
         
         db.session.commit()
+        
+        for thread, message in created:
+            publish_event(user_id, 'message-created', {
+                'thread': thread.to_dict(),
+                'message': message.to_dict()
+            })
 
@@ -0,0 +1,66 @@
+import json
+import threading
+from flask import Blueprint, jsonify, Response, g, current_app
+from src.services.events import get_event_bus
+from src.services.auth import login_required
+
+events_bp = Blueprint('events', __name__)
+
+# Intervalo entre comentários de keepalive (mantém proxies com a conexão aberta)
+HEARTBEAT_INTERVAL = 15
+
+def stream_slots(app):
+    """Vagas de stream do worker: cada stream ocupa uma thread do gthread enquanto aberto"""
+    slots = app.extensions.get('sse_slots')
+    if slots is None:
+        slots = app.extensions.setdefault('sse_slots', threading.BoundedSemaphore(app.config['SSE_MAX_STREAMS']))
+    return slots
+
+def format_sse(event):
+    """Serializa um evento no formato text/event-stream"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+@events_bp.route('/events', methods=['GET'])
+# EventSource não envia cabeçalhos: aceita também ?ticket= (POST /api/auth/ticket)
+@login_required(allow_ticket=True)
+def stream_events():
+    """Stream (Server-Sent Events) de novas mensagens e atualizações de threads e rascunhos"""
+    try:
+        user_id = g.user_id
+        
+        # Acima do limite o stream é recusado (o EventSource tenta de novo) para
+        # sempre sobrar threads para a API REST
+        slots = stream_slots(current_app)
+        if not slots.acquire(blocking=False):
+            response = jsonify({'error': 'Limite de conexões em tempo real atingido'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        
+        try:
+            # Assina antes de responder para não perder eventos publicados no meio tempo
+            subscription = get_event_bus().subscribe(user_id)
+        except Exception:
+            slots.release()
+            raise
+        
+        # No encerramento do worker o stream termina e o EventSource reconecta
+        shutdown_event = current_app.extensions['shutdown_event']
+        
+        def generate():
+            yield 'retry: 3000\n\n'
+            while not shutdown_event.is_set():
+                event = subscription.get(timeout=HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_sse(event)
+        
+        response = Response(generate(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.call_on_close(subscription.close)
+        response.call_on_close(slots.release)
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,19 @@
+from flask import Blueprint, jsonify, g
+from src.models.job import Job
+from src.services.auth import login_required
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Consulta o andamento de um job em segundo plano"""
+    try:
+        job = Job.query.filter_by(id=job_id, user_id=g.user_id).first()
+        if not job:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        return jsonify({'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
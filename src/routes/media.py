@@ -0,0 +1,116 @@
+from flask import Blueprint, request, jsonify, g, send_file, current_app
+from src.models.user import db
+from src.models.media import Media
+from src.services.auth import login_required
+from src.services.media import (
+    get_media_store, get_thumbnail_cache, MediaTooLarge, ThumbnailUnavailable, THUMBNAIL_SIZES
+)
+
+media_bp = Blueprint('media', __name__)
+
+# Tipos exibidos inline; os demais são servidos como download (evita HTML/SVG no domínio da API)
+INLINE_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp', 'audio/', 'video/', 'application/pdf')
+
+# O conteúdo de um anexo nunca muda: o cliente pode guardá-lo indefinidamente
+MEDIA_MAX_AGE = 365 * 24 * 3600
+
+def serve_media_file(path, mimetype, etag, download_name=None):
+    """send_file com Range, ETag e cache longo (wsgi.file_wrapper/sendfile quando disponível)"""
+    response = send_file(
+        path, mimetype=mimetype, conditional=True, etag=etag, max_age=MEDIA_MAX_AGE,
+        as_attachment=not mimetype.startswith(INLINE_TYPES), download_name=download_name
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+@media_bp.route('/media', methods=['POST'])
+@login_required
+def upload_media():
+    """Recebe um anexo (multipart no campo 'file' ou o corpo bruto) e grava no object store"""
+    try:
+        user_id = g.user_id
+        max_bytes = current_app.config['MEDIA_MAX_BYTES']
+        if request.content_length and request.content_length > max_bytes:
+            return jsonify({'error': f'Arquivo maior que o limite de {max_bytes} bytes'}), 413
+        
+        # Multipart é gravado pelo Werkzeug em arquivo temporário; o corpo bruto é lido direto do socket
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if not upload:
+                return jsonify({'error': 'Arquivo é obrigatório'}), 400
+            stream, content_type, filename = upload.stream, upload.mimetype, upload.filename
+        else:
+            stream, content_type, filename = request.stream, request.mimetype, request.args.get('filename')
+        
+        sha256, size = get_media_store().put(stream, max_bytes)
+        if not size:
+            return jsonify({'error': 'Arquivo vazio'}), 400
+        
+        content_type = content_type or 'application/octet-stream'
+        media = Media.query.filter_by(user_id=user_id, sha256=sha256, content_type=content_type).first()
+        if media:
+            return jsonify({'media': media.to_dict()}), 200
+        
+        media = Media(user_id=user_id, sha256=sha256, content_type=content_type,
+                      size=size, filename=(filename or '')[:255] or None)
+        db.session.add(media)
+        db.session.commit()
+        
+        return jsonify({'media': media.to_dict()}), 201
+        
+    except MediaTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@media_bp.route('/media/<media_id>', methods=['GET'])
+@login_required(allow_ticket=True)
+def download_media(media_id):
+    """Serve um anexo do usuário (aceita Range e If-None-Match)"""
+    try:
+        media = Media.query.filter_by(id=media_id, user_id=g.user_id).first()
+        if not media:
+            return jsonify({'error': 'Anexo não encontrado'}), 404
+        
+        return serve_media_file(get_media_store().path(media.sha256), media.content_type,
+                                media.sha256, media.filename)
+        
+    except FileNotFoundError:
+        return jsonify({'error': 'Conteúdo do anexo não encontrado'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@media_bp.route('/media/<media_id>/thumbnail', methods=['GET'])
+@login_required(allow_ticket=True)
+def media_thumbnail(media_id):
+    """Miniatura JPEG de um anexo de imagem, gerada na primeira solicitação"""
+    try:
+        size = request.args.get('size', 256, type=int)
+        if size not in THUMBNAIL_SIZES:
+            return jsonify({'error': f'size deve ser um de {list(THUMBNAIL_SIZES)}'}), 400
+        
+        media = Media.query.filter_by(id=media_id, user_id=g.user_id).first()
+        if not media:
+            return jsonify({'error': 'Anexo não encontrado'}), 404
+        if not media.content_type.startswith('image/'):
+            return jsonify({'error': 'Anexo não é uma imagem'}), 415
+        
+        etag = f'{media.sha256}-{size}'
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        path = get_thumbnail_cache().get(media.sha256, size)
+        return serve_media_file(path, 'image/jpeg', etag)
+        
+    except ThumbnailUnavailable as e:
+        return jsonify({'error': str(e)}), 415
+    except FileNotFoundError:
+        return jsonify({'error': 'Conteúdo do anexo não encontrado'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,34 @@
+from flask import Blueprint, request, jsonify, g
+from src.services.search import search_threads
+from src.services.auth import login_required
+
+search_bp = Blueprint('search', __name__)
+
+MAX_SEARCH_RESULTS = 50
+
+@search_bp.route('/search', methods=['GET'])
+@login_required
+def search():
+    """Busca threads por contato e conteúdo das mensagens, ordenadas por relevância"""
+    try:
+        user_id = g.user_id
+        
+        term = (request.args.get('q') or '').strip()
+        if not term:
+            return jsonify({'error': 'Termo de busca é obrigatório'}), 400
+        
+        limit = request.args.get('limit', 20, type=int)
+        limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+        
+        results = []
+        for thread, rank, matches in search_threads(user_id, term, limit):
+            results.append({
+                'thread': thread.to_dict(),
+                'rank': rank,
+                'matches': matches
+            })
+        
+        return jsonify({'query': term, 'results': results}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,163 +1,269 @@
-from flask import Blueprint, request, jsonify
-from src.models.user import db, User
-from src.models.thread import Thread, Message, Draft, Connection
-import uuid
+from flask import Blueprint, request, jsonify, g
+from src.models.user import db
+from src.models.ids import new_id
+from src.models.thread import Thread, Message, Draft, Connection, projected_columns
+from src.models.media import Media
+from src.services.search import matching_thread_ids
+from src.services.events import publish_event
+from src.services.outbound import get_outbound_queue
+from src.services.auth import login_required
+from src.services.http_cache import conditional_json, make_etag
+from src.services.archive import with_archived, sort_key
+from src.services.drafts import get_draft_buffer, serialize_draft
+import json
+import base64
 from datetime import datetime
 
 threads_bp = Blueprint('threads', __name__)
 
-def get_user_from_token(token):
-    """Extrai usuário do token (mock)"""
-    if token and token.startswith('mock_token_'):
-        user_id = token.replace('mock_token_', '')
-        return User.query.get(user_id)
-    return None
+# Status de thread; arquivadas só aparecem na listagem quando filtradas explicitamente
+THREAD_STATUSES = ['NEW', 'OPEN', 'DONE', 'ARCHIVED']
+
+# Operações em lote
+MAX_BULK_IDS = 1000
+BULK_DELETE_CHUNK = 500
+
+# Paginação por cursor (keyset)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(timestamp, row_id):
+    """Codifica a chave (timestamp, id) de uma linha em um cursor opaco"""
+    payload = json.dumps([timestamp.isoformat() if timestamp else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decodifica um cursor gerado por encode_cursor (ValueError se inválido)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), str(row_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+def get_page_args():
+    """Lê limit/before/after da query string"""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    before = decode_cursor(request.args.get('before'))
+    after = decode_cursor(request.args.get('after'))
+    if before and after:
+        raise ValueError('Use apenas before ou after')
+    return limit, before, after
+
+def thread_filters(user_id, channel=None, status=None, search=None):
+    """Critérios das threads do usuário (listagem e operações em lote)"""
+    criteria = [Thread.user_id == user_id]
+    
+    if channel:
+        criteria.append(Thread.channel == channel)
+    
+    if status:
+        criteria.append(Thread.status == status)
+    else:
+        criteria.append(Thread.status != 'ARCHIVED')
+    
+    if search:
+        criteria.append(Thread.id.in_(matching_thread_ids(user_id, search)))
+    
+    return criteria
+
+def paginate_keyset(query, columns, limit, before=None, after=None):
+    """Busca uma página da consulta pela chave composta (timestamp, id).
+    
+    Com `after` percorre a chave em ordem crescente a partir do cursor; caso
+    contrário, em ordem decrescente (a partir de `before`, se informado).
+    Retorna as linhas na ordem em que foram percorridas e se há mais linhas
+    nessa direção.
+    """
+    key = db.tuple_(*columns)
+    if after:
+        query = query.filter(key > after).order_by(*[column.asc() for column in columns])
+    else:
+        if before:
+            query = query.filter(key < before)
+        query = query.order_by(*[column.desc() for column in columns])
+    
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
 
 @threads_bp.route('/threads', methods=['GET'])
+@login_required
 def get_threads():
     """Lista todas as threads do usuário"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        user_id = g.user_id
         
         # Filtros
         channel = request.args.get('channel')  # 'whatsapp', 'telegram', 'instagram'
-        status = request.args.get('status')    # 'NEW', 'OPEN', 'DONE'
+        status = request.args.get('status')    # 'NEW', 'OPEN', 'DONE', 'ARCHIVED'
         search = request.args.get('search')    # Busca por nome ou mensagem
         
-        query = Thread.query.filter_by(user_id=user.id)
-        
-        if channel:
-            query = query.filter_by(channel=channel)
-        
-        if status:
-            query = query.filter_by(status=status)
-        
-        if search:
-            query = query.filter(
-                db.or_(
-                    Thread.contact_name.ilike(f'%{search}%'),
-                    Thread.contact_handle.ilike(f'%{search}%')
-                )
-            )
-        
-        threads = query.order_by(Thread.last_message_at.desc()).all()
-        
-        # Adiciona informações extras para cada thread
-        threads_data = []
-        for thread in threads:
-            thread_dict = thread.to_dict()
+        try:
+            limit, before, after = get_page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Versão do inbox: qualquer escrita em uma thread do usuário altera
+        # updated_at (ou a contagem, em remoções), mudando o ETag
+        count, updated_at, last_message_at = db.session.query(
+            db.func.count(Thread.id), db.func.max(Thread.updated_at), db.func.max(Thread.last_message_at)
+        ).filter(Thread.user_id == user_id).one()
+        etag = make_etag('threads', user_id, count, updated_at, last_message_at, sorted(request.args.items()))
+        
+        def build():
+            # Linhas projetadas: serializa direto das colunas, sem objetos ORM
+            query = db.session.query(*projected_columns(
+                Thread, Thread.last_message_id, Thread.last_message_preview, Thread.unread_in_count
+            )).filter(*thread_filters(user_id, channel, status, search))
             
-            # Última mensagem
-            last_message = Message.query.filter_by(thread_id=thread.id)\
-                                      .order_by(Message.sent_at.desc()).first()
-            if last_message:
-                thread_dict['last_message'] = last_message.body
-                thread_dict['last_message_time'] = last_message.sent_at.strftime('%H:%M')
+            # Mais recentes primeiro; `after` busca threads mais novas que o cursor
+            threads, has_more = paginate_keyset(query, [Thread.last_message_at, Thread.id], limit, before, after)
+            next_cursor = encode_cursor(threads[-1].last_message_at, threads[-1].id) if has_more else None
+            if after:
+                threads.reverse()
             
-            # Contagem de mensagens não lidas (mock)
-            unread_count = Message.query.filter_by(
-                thread_id=thread.id, 
-                direction='IN'
-            ).count()
-            thread_dict['unread_count'] = unread_count if unread_count > 0 else 0
-            thread_dict['unread'] = unread_count > 0
+            # Última mensagem e não lidas vêm dos contadores da própria thread
+            threads_data = []
+            for row in threads:
+                thread_dict = row._asdict()
+                last_message_id = thread_dict.pop('last_message_id')
+                preview = thread_dict.pop('last_message_preview')
+                unread_count = thread_dict.pop('unread_in_count')
+                
+                if last_message_id:
+                    thread_dict['last_message'] = preview
+                    thread_dict['last_message_time'] = row.last_message_at.strftime('%H:%M')
+                
+                thread_dict['unread_count'] = unread_count
+                thread_dict['unread'] = unread_count > 0
+                
+                threads_data.append(thread_dict)
             
-            threads_data.append(thread_dict)
+            return {'threads': threads_data, 'next_cursor': next_cursor}
         
-        return jsonify({'threads': threads_data}), 200
+        return conditional_json(etag, build)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @threads_bp.route('/threads/<thread_id>/messages', methods=['GET'])
+@login_required
 def get_messages(thread_id):
     """Lista mensagens de uma thread específica"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        user_id = g.user_id
         
         # Verifica se a thread pertence ao usuário
-        thread = Thread.query.filter_by(id=thread_id, user_id=user.id).first()
+        thread = Thread.query.filter_by(id=thread_id, user_id=user_id).first()
         if not thread:
             return jsonify({'error': 'Thread não encontrada'}), 404
         
-        messages = Message.query.filter_by(thread_id=thread_id)\
-                               .order_by(Message.sent_at.asc()).all()
-        
-        messages_data = [msg.to_dict() for msg in messages]
+        try:
+            limit, before, after = get_page_args()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Mudanças nas mensagens (novas, status, leitura) atualizam a thread,
+        # então a própria linha da thread serve de versão da conversa
+        etag = make_etag('messages', user_id, thread.id, thread.updated_at, thread.message_count,
+                         thread.last_message_id, sorted(request.args.items()))
+        
+        def build():
+            # Sem cursor retorna as mensagens mais recentes; `before` pagina o
+            # histórico para trás e `after` busca mensagens novas
+            rows, has_more = paginate_keyset(
+                db.session.query(*projected_columns(Message)).filter(Message.thread_id == thread_id),
+                [Message.sent_at, Message.id], limit, before, after
+            )
+            # Mensagens antigas podem estar no armazenamento frio
+            messages, has_more = with_archived(
+                thread_id, [row._asdict() for row in rows], has_more, limit, before, after
+            )
+            next_cursor = encode_cursor(*sort_key(messages[-1])) if has_more else None
+            if not after:
+                messages.reverse()
+            
+            return {
+                'thread': thread.to_dict(),
+                'messages': messages,
+                'next_cursor': next_cursor
+            }
         
-        return jsonify({
-            'thread': thread.to_dict(),
-            'messages': messages_data
-        }), 200
+        return conditional_json(etag, build)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @threads_bp.route('/threads/<thread_id>/messages', methods=['POST'])
+@login_required
 def send_message(thread_id):
     """Envia uma nova mensagem"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        user_id = g.user_id
         
         data = request.get_json()
         message_body = data.get('body')
+        media_id = data.get('media_id')
         
-        if not message_body:
+        if not message_body and not media_id:
             return jsonify({'error': 'Conteúdo da mensagem é obrigatório'}), 400
         
         # Verifica se a thread pertence ao usuário
-        thread = Thread.query.filter_by(id=thread_id, user_id=user.id).first()
+        thread = Thread.query.filter_by(id=thread_id, user_id=user_id).first()
         if not thread:
             return jsonify({'error': 'Thread não encontrada'}), 404
         
+        # Anexo enviado antes por POST /api/media
+        media_url = None
+        if media_id:
+            media = Media.query.filter_by(id=media_id, user_id=user_id).first()
+            if not media:
+                return jsonify({'error': 'Anexo não encontrado'}), 404
+            media_url = media.url
+        
         # Cria nova mensagem
-        message_id = str(uuid.uuid4())
+        message_id = new_id()
         message = Message(
             id=message_id,
             thread_id=thread_id,
             channel=thread.channel,
             direction='OUT',
-            body=message_body,
-            status='SENT'
+            body=message_body or '',
+            media_url=media_url,
+            sent_at=datetime.utcnow(),
+            status='QUEUED'
         )
         
         db.session.add(message)
         
-        # Atualiza timestamp da thread
-        thread.last_message_at = datetime.utcnow()
+        # Atualiza última mensagem e contadores da thread
+        thread.register_message(message)
         thread.status = 'OPEN'  # Marca como em andamento
         
-        db.session.commit()
+        # O rascunho vira a mensagem: removido na mesma transação, sem
+        # gravação do buffer no meio
+        drafts = get_draft_buffer()
+        with drafts.flushing():
+            drafts.discard(thread_id)
+            db.session.execute(
+                db.delete(Draft).where(Draft.thread_id == thread_id)
+                  .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
         
-        # Simula envio para API externa
-        print(f"[MOCK] Enviando mensagem via {thread.channel}: {message_body}")
+        publish_event(user_id, 'message-created', {
+            'thread': thread.to_dict(),
+            'message': message.to_dict()
+        })
+        
+        # Envio ao canal é feito pela fila; o status evolui para SENT/DELIVERED/FAILED
+        get_outbound_queue().enqueue(message.id, thread.channel)
         
         return jsonify({
-            'message': 'Mensagem enviada com sucesso',
+            'message': 'Mensagem enfileirada para envio',
             'data': message.to_dict()
         }), 201
         
@@ -166,27 +272,20 @@ def send_message(thread_id):
         return jsonify({'error': str(e)}), 500
 
 @threads_bp.route('/threads/<thread_id>/status', methods=['PUT'])
+@login_required
 def update_thread_status(thread_id):
     """Atualiza status da thread"""
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
-        
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        user_id = g.user_id
         
         data = request.get_json()
         new_status = data.get('status')
         
-        if new_status not in ['NEW', 'OPEN', 'DONE']:
+        if new_status not in THREAD_STATUSES:
             return jsonify({'error': 'Status inválido'}), 400
         
         # Verifica se a thread pertence ao usuário
-        thread = Thread.query.filter_by(id=thread_id, user_id=user.id).first()
+        thread = Thread.query.filter_by(id=thread_id, user_id=user_id).first()
         if not thread:
             return jsonify({'error': 'Thread não encontrada'}), 404
         
@@ -195,6 +294,8 @@ def update_thread_status(thread_id):
         
         db.session.commit()
         
+        publish_event(user_id, 'thread-status-changed', {'thread': thread.to_dict()})
+        
         return jsonify({
             'message': 'Status atualizado com sucesso',
             'thread': thread.to_dict()
@@ -204,26 +305,129 @@ def update_thread_status(thread_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@threads_bp.route('/threads/<thread_id>/draft', methods=['GET', 'POST', 'DELETE'])
-def manage_draft(thread_id):
-    """Gerencia rascunhos de mensagens"""
+@threads_bp.route('/threads/bulk', methods=['POST'])
+@login_required
+def bulk_update_threads():
+    """Aplica uma ação a várias threads de uma vez.
+    
+    Corpo: {"action": "status" | "archive" | "delete", "status": "DONE"} com
+    "ids": [...] ou "filters": {"channel", "status", "search"} (mesmos filtros
+    da listagem). Cada ação é um único UPDATE/DELETE restrito ao usuário.
+    """
     try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token de autorização necessário'}), 401
+        user_id = g.user_id
+        
+        data = request.get_json() or {}
+        action = data.get('action')
+        ids = data.get('ids')
+        filters = data.get('filters')
+        
+        if action == 'status':
+            new_status = data.get('status')
+            if new_status not in THREAD_STATUSES:
+                return jsonify({'error': 'Status inválido'}), 400
+        elif action == 'archive':
+            new_status = 'ARCHIVED'
+        elif action != 'delete':
+            return jsonify({'error': 'Ação inválida'}), 400
+        
+        if (ids is None) == (filters is None):
+            return jsonify({'error': 'Informe ids ou filters'}), 400
+        
+        if ids is not None:
+            if not isinstance(ids, list) or len(ids) > MAX_BULK_IDS:
+                return jsonify({'error': f'ids deve ser uma lista de até {MAX_BULK_IDS} threads'}), 400
+            criteria = [Thread.user_id == user_id, Thread.id.in_([str(thread_id) for thread_id in ids])]
+        else:
+            if not isinstance(filters, dict):
+                return jsonify({'error': 'filters inválido'}), 400
+            criteria = thread_filters(user_id, filters.get('channel'), filters.get('status'), filters.get('search'))
+        
+        if action == 'delete':
+            thread_ids = db.session.execute(db.select(Thread.id).where(*criteria)).scalars().all()
+            deleted = 0
+            for start in range(0, len(thread_ids), BULK_DELETE_CHUNK):
+                deleted += Thread.delete_many(thread_ids[start:start + BULK_DELETE_CHUNK])
+            db.session.commit()
+            
+            if thread_ids:
+                publish_event(user_id, 'threads-deleted', {'thread_ids': thread_ids})
+            
+            return jsonify({'action': action, 'deleted': deleted}), 200
+        
+        # Threads já no status de destino não são reescritas
+        thread_ids = db.session.execute(
+            db.update(Thread)
+              .where(*criteria, Thread.status != new_status)
+              .values(status=new_status, updated_at=datetime.utcnow())
+              .returning(Thread.id)
+              .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.session.commit()
+        
+        if thread_ids:
+            publish_event(user_id, 'threads-status-changed', {'thread_ids': thread_ids, 'status': new_status})
         
-        token = auth_header.split(' ')[1]
-        user = get_user_from_token(token)
+        return jsonify({'action': action, 'status': new_status, 'updated': len(thread_ids)}), 200
         
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@threads_bp.route('/threads/<thread_id>/read', methods=['POST'])
+@login_required
+def mark_thread_read(thread_id):
+    """Marca as mensagens recebidas da thread como lidas"""
+    try:
+        user_id = g.user_id
         
         # Verifica se a thread pertence ao usuário
-        thread = Thread.query.filter_by(id=thread_id, user_id=user.id).first()
+        thread = Thread.query.filter_by(id=thread_id, user_id=user_id).first()
         if not thread:
             return jsonify({'error': 'Thread não encontrada'}), 404
         
+        if thread.unread_in_count:
+            Message.query.filter(
+                Message.thread_id == thread_id,
+                Message.direction == 'IN',
+                Message.status != 'READ'
+            ).update({'status': 'READ'}, synchronize_session=False)
+            thread.unread_in_count = 0
+        
+        db.session.commit()
+        
+        publish_event(user_id, 'thread-read', {'thread': thread.to_dict()})
+        
+        return jsonify({
+            'message': 'Thread marcada como lida',
+            'thread': thread.to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@threads_bp.route('/threads/<thread_id>/draft', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def manage_draft(thread_id):
+    """Gerencia rascunhos de mensagens (gravação agrupada pelo buffer de rascunhos)"""
+    try:
+        user_id = g.user_id
+        drafts = get_draft_buffer()
+        
+        # Rascunho pendente no buffer já comprova que a thread é do usuário
+        buffered = drafts.get(user_id, thread_id)
+        if buffered is None:
+            # Verifica se a thread pertence ao usuário
+            thread = Thread.query.filter_by(id=thread_id, user_id=user_id).first()
+            if not thread:
+                return jsonify({'error': 'Thread não encontrada'}), 404
+        
         if request.method == 'GET':
+            # Versão pendente no buffer é a mais recente
+            if buffered is not None:
+                return jsonify({'draft': serialize_draft(buffered)}), 200
+            
             # Busca rascunho existente
             draft = Draft.query.filter_by(thread_id=thread_id).first()
             if draft:
@@ -232,38 +436,40 @@ def manage_draft(thread_id):
                 return jsonify({'draft': None}), 200
         
         elif request.method == 'POST':
-            # Salva ou atualiza rascunho
+            # Salva ou atualiza rascunho (gravado no banco pelo buffer)
             data = request.get_json()
             content = data.get('content', '')
             
-            draft = Draft.query.filter_by(thread_id=thread_id).first()
+            draft = serialize_draft(drafts.save(user_id, thread_id, content))
             
-            if draft:
-                draft.content = content
-                draft.updated_at = datetime.utcnow()
-            else:
-                draft_id = str(uuid.uuid4())
-                draft = Draft(
-                    id=draft_id,
-                    thread_id=thread_id,
-                    content=content
-                )
-                db.session.add(draft)
-            
-            db.session.commit()
+            publish_event(user_id, 'draft-updated', {'thread_id': thread_id, 'draft': draft})
             
             return jsonify({
                 'message': 'Rascunho salvo',
-                'draft': draft.to_dict()
+                'draft': draft
             }), 200
         
         elif request.method == 'DELETE':
-            # Remove rascunho
-            draft = Draft.query.filter_by(thread_id=thread_id).first()
-            if draft:
-                db.session.delete(draft)
+            # Remove rascunho; sob flushing() nenhuma gravação deste processo o recria
+            # depois do DELETE, e draft_deleted_at impede que o buffer de outro worker
+            # regrave uma versão salva antes da remoção
+            with drafts.flushing():
+                drafts.discard(thread_id)
+                deleted = db.session.execute(
+                    db.delete(Draft).where(Draft.thread_id == thread_id)
+                      .execution_options(synchronize_session=False)
+                ).rowcount
+                # updated_at mantido: o rascunho não faz parte da versão (ETag) da thread
+                db.session.execute(
+                    db.update(Thread).where(Thread.id == thread_id)
+                      .values(draft_deleted_at=datetime.utcnow(), updated_at=Thread.updated_at)
+                      .execution_options(synchronize_session=False)
+                )
                 db.session.commit()
             
+            if deleted or buffered is not None:
+                publish_event(user_id, 'draft-updated', {'thread_id': thread_id, 'draft': None})
+            
             return jsonify({'message': 'Rascunho removido'}), 200
         
     except Exception as e:
@@ -0,0 +1,93 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from flask import Blueprint, request, jsonify
+from sqlalchemy import event
+from src.models.thread import Connection
+from src.routes.connections import get_channel_name
+from src.services.ingestion import normalize_payload, accept_payload
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+# Cache curto (LRU) das conexões para não consultar o banco a cada webhook.
+# Ids inexistentes não são guardados: a rota não tem limite de requisições
+CONNECTION_CACHE_TTL = 60
+CONNECTION_CACHE_SIZE = 10000
+_connection_cache = OrderedDict()
+_connection_cache_lock = threading.Lock()
+
+def get_webhook_connection(connection_id):
+    """(user_id, type, status, webhook_secret) da conexão, com cache de CONNECTION_CACHE_TTL"""
+    now = time.monotonic()
+    with _connection_cache_lock:
+        cached = _connection_cache.get(connection_id)
+        if cached and cached[0] > now:
+            _connection_cache.move_to_end(connection_id)
+            return cached[1]
+    
+    connection = Connection.query.get(connection_id)
+    if connection is None:
+        return None
+    info = (connection.user_id, connection.type, connection.status, connection.webhook_secret)
+    
+    with _connection_cache_lock:
+        _connection_cache[connection_id] = (now + CONNECTION_CACHE_TTL, info)
+        _connection_cache.move_to_end(connection_id)
+        while len(_connection_cache) > CONNECTION_CACHE_SIZE:
+            _connection_cache.popitem(last=False)
+    return info
+
+@event.listens_for(Connection, 'after_update')
+@event.listens_for(Connection, 'after_delete')
+def invalidate_webhook_connection(mapper, connection, target):
+    # Outros processos só percebem após o TTL; o worker de ingestão confere de novo
+    with _connection_cache_lock:
+        _connection_cache.pop(target.id, None)
+
+def verify_signature(secret, body, signature):
+    """Confere a assinatura HMAC-SHA256 ('sha256=<hex>') do corpo enviado pelo provedor"""
+    if not signature:
+        return False
+    expected = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+@webhooks_bp.route('/webhooks/<connection_type>/<connection_id>', methods=['POST'])
+def receive_webhook(connection_type, connection_id):
+    """Recebe lotes de mensagens e recibos de entrega do provedor do canal"""
+    try:
+        if connection_type not in ['WA', 'TG', 'IG']:
+            return jsonify({'error': 'Tipo de conexão inválido'}), 400
+        
+        connection = get_webhook_connection(connection_id)
+        if not connection or connection[1] != connection_type:
+            return jsonify({'error': 'Conexão não encontrada'}), 404
+        
+        user_id, _, status, secret = connection
+        if status in ('INACTIVE', 'DELETING'):
+            return jsonify({'error': 'Conexão inativa'}), 409
+        
+        # Toda conexão tem segredo: requisições sem assinatura válida são recusadas
+        if not secret or not verify_signature(secret, request.get_data(), request.headers.get('X-Webhook-Signature')):
+            return jsonify({'error': 'Assinatura inválida'}), 401
+        
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Payload inválido'}), 400
+        
+        messages, statuses, rejected = normalize_payload(data)
+        if rejected and not messages and not statuses:
+            return jsonify({'error': 'Payload inválido', 'rejected': rejected}), 400
+        if messages or statuses:
+            accept_payload(user_id, get_channel_name(connection_type), messages, statuses,
+                           connection_id=connection_id)
+        
+        # Confirmação imediata: a persistência acontece no worker de ingestão
+        return jsonify({
+            'accepted': len(messages) + len(statuses),
+            'rejected': rejected
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
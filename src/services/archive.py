@@ -0,0 +1,188 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+from flask import current_app
+from src.models.user import db, User
+from src.models.ids import new_id
+from src.models.thread import Thread, Message, MessageArchive, projected_columns
+
+# Mensagens movidas por lote (cada lote é uma transação curta)
+DEFAULT_ARCHIVE_BATCH = 1000
+
+# Threads consultadas por página ao percorrer um plano
+ARCHIVE_THREAD_PAGE = 500
+
+# Mensagens ainda em envio ficam na tabela quente
+PENDING_STATUSES = ['QUEUED', 'SENDING']
+
+def message_key(message):
+    """Chave (sent_at, id) de uma mensagem arquivada (dicionário)"""
+    return datetime.fromisoformat(message['sent_at']), message['id']
+
+def encode_chunk(rows):
+    messages = []
+    for row in rows:
+        message = row._asdict()
+        for field in ('sent_at', 'created_at'):
+            if message[field] is not None:
+                message[field] = message[field].isoformat()
+        messages.append(message)
+    return zlib.compress(json.dumps(messages, separators=(',', ':')).encode())
+
+def decode_chunk(payload):
+    return json.loads(zlib.decompress(payload))
+
+def archive_thread_batch(thread_id, cutoff, batch_size=DEFAULT_ARCHIVE_BATCH, after=None):
+    """Move até batch_size mensagens da thread anteriores a `cutoff` (e posteriores ao cursor
+    `after`, uma chave (sent_at, id)) para um bloco comprimido em message_archives.
+    
+    Usa o índice (thread_id, sent_at, id): cada lote continua de onde o anterior
+    parou, sem revarrer mensagens puladas (ainda em envio). Não faz commit.
+    Retorna (mensagens arquivadas, cursor para o próximo lote).
+    """
+    query = db.session.query(*projected_columns(Message)).filter(
+        Message.thread_id == thread_id,
+        Message.sent_at < cutoff,
+        Message.status.notin_(PENDING_STATUSES)
+    )
+    if after:
+        query = query.filter(db.or_(
+            Message.sent_at > after[0], db.and_(Message.sent_at == after[0], Message.id > after[1])
+        ))
+    rows = query.order_by(Message.sent_at, Message.id).limit(batch_size).all()
+    if not rows:
+        return 0, after
+    
+    db.session.execute(db.insert(MessageArchive), [{
+        'id': new_id(),
+        'thread_id': thread_id,
+        'first_sent_at': rows[0].sent_at,
+        'first_id': rows[0].id,
+        'last_sent_at': rows[-1].sent_at,
+        'last_id': rows[-1].id,
+        'message_count': len(rows),
+        'payload': encode_chunk(rows),
+        'created_at': datetime.utcnow()
+    }])
+    db.session.execute(
+        db.delete(Message).where(Message.id.in_([row.id for row in rows]))
+          .execution_options(synchronize_session=False)
+    )
+    return len(rows), (rows[-1].sent_at, rows[-1].id)
+
+def plan_thread_ids(plan, after=None, limit=ARCHIVE_THREAD_PAGE):
+    """Página de ids de threads de usuários do plano, em ordem de id (keyset)"""
+    query = db.select(Thread.id).join(User, User.id == Thread.user_id)\
+        .where(db.func.coalesce(User.plan, 'TRIAL') == plan)
+    if after:
+        query = query.where(Thread.id > after)
+    return db.session.execute(query.order_by(Thread.id).limit(limit)).scalars().all()
+
+def archive_messages(batch_size=DEFAULT_ARCHIVE_BATCH, max_batches=None, now=None):
+    """Arquiva as mensagens fora do prazo de retenção de cada plano (ARCHIVE_RETENTION_DAYS).
+    
+    Percorre as threads de cada plano por keyset e, em cada thread, move as
+    mensagens antigas em blocos de até batch_size (um bloco por thread e
+    lote, o formato que archived_messages espera). Faz commit a cada lote,
+    então as tabelas nunca ficam travadas por muito tempo e a execução pode
+    ser interrompida e retomada. Retorna o total por plano.
+    """
+    now = now or datetime.utcnow()
+    retention = current_app.config['ARCHIVE_RETENTION_DAYS']
+    totals = {}
+    batches = 0
+    
+    for plan, days in sorted(retention.items(), key=lambda item: item[1]):
+        cutoff = now - timedelta(days=days)
+        totals[plan] = 0
+        thread_ids = plan_thread_ids(plan)
+        while thread_ids:
+            for thread_id in thread_ids:
+                cursor = None
+                while True:
+                    if max_batches is not None and batches >= max_batches:
+                        return totals
+                    archived, cursor = archive_thread_batch(thread_id, cutoff, batch_size, cursor)
+                    db.session.commit()
+                    if not archived:
+                        break
+                    totals[plan] += archived
+                    batches += 1
+                    if archived < batch_size:
+                        break
+            thread_ids = plan_thread_ids(plan, after=thread_ids[-1])
+    
+    return totals
+
+def archived_messages(thread_id, limit, before=None, after=None):
+    """Mensagens arquivadas da thread, como na paginação de get_messages.
+    
+    Sem `after` retorna até `limit` mensagens em ordem decrescente de
+    (sent_at, id), anteriores a `before` se informado; com `after`, em ordem
+    crescente a partir do cursor. Só descomprime os blocos necessários.
+    """
+    first_key = db.tuple_(MessageArchive.first_sent_at, MessageArchive.first_id)
+    last_key = db.tuple_(MessageArchive.last_sent_at, MessageArchive.last_id)
+    query = db.select(
+        MessageArchive.id, MessageArchive.first_sent_at, MessageArchive.first_id,
+        MessageArchive.last_sent_at, MessageArchive.last_id
+    ).where(MessageArchive.thread_id == thread_id)
+    
+    if after:
+        query = query.where(last_key > after).order_by(MessageArchive.first_sent_at, MessageArchive.first_id)
+    else:
+        if before:
+            query = query.where(first_key < before)
+        query = query.order_by(MessageArchive.last_sent_at.desc(), MessageArchive.last_id.desc())
+    
+    collected = []
+    for chunk in db.session.execute(query).all():
+        # Blocos podem se sobrepor (mensagens antigas recebidas depois); só
+        # para quando o próximo bloco não pode conter chaves da página
+        if len(collected) >= limit:
+            boundary = message_key(collected[limit - 1])
+            if after and (chunk.first_sent_at, chunk.first_id) > boundary:
+                break
+            if not after and (chunk.last_sent_at, chunk.last_id) < boundary:
+                break
+        
+        payload = db.session.execute(
+            db.select(MessageArchive.payload).where(MessageArchive.id == chunk.id)
+        ).scalar()
+        for message in decode_chunk(payload):
+            key = message_key(message)
+            if (after and key > after) or (not after and (before is None or key < before)):
+                collected.append(message)
+        collected.sort(key=message_key, reverse=not after)
+    
+    return collected[:limit]
+
+def sort_key(message):
+    """Chave (sent_at, id) de mensagens quentes (datetime) ou arquivadas (ISO 8601)"""
+    sent_at = message['sent_at']
+    if isinstance(sent_at, str):
+        sent_at = datetime.fromisoformat(sent_at)
+    return sent_at, message['id']
+
+def with_archived(thread_id, messages, has_more, limit, before=None, after=None):
+    """Completa uma página de mensagens quentes (dicionários) com o histórico arquivado.
+    
+    Sem `after` o armazenamento frio só é consultado quando a tabela quente
+    se esgota nessa direção; com `after`, mensagens arquivadas posteriores ao
+    cursor vêm antes das quentes. Retorna (mensagens, has_more) na ordem de
+    paginate_keyset.
+    """
+    if after:
+        cold = archived_messages(thread_id, limit + 1, after=after)
+        if not cold:
+            return messages, has_more
+        merged = sorted(cold + messages, key=sort_key)
+        return merged[:limit], has_more or len(merged) > limit
+    
+    if has_more:
+        return messages, has_more
+    
+    need = limit - len(messages)
+    boundary = sort_key(messages[-1]) if messages else before
+    cold = archived_messages(thread_id, need + 1, before=boundary)
+    return messages + cold[:need], len(cold) > need
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import event
+from src.models.user import db, User
+
+TOKEN_SALT = 'pingoo-auth-token'
+DEFAULT_TOKEN_MAX_AGE = 7 * 24 * 3600
+
+# Tickets de URL (?ticket=): para EventSource e <img>, que não enviam cabeçalhos.
+# Curtos e com salt próprio, não servem como token Bearer
+TICKET_SALT = 'pingoo-url-ticket'
+DEFAULT_TICKET_MAX_AGE = 60
+
+class UserCache:
+    """Cache LRU com TTL dos dados de usuário (por processo)"""
+    
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id):
+        """Dados do usuário (to_dict) ou None se não existir"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        
+        data = user.to_dict()
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, data)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return data
+    
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+
+def get_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+def issue_token(user_id):
+    """Gera um token assinado (HMAC com SECRET_KEY) para o usuário"""
+    return get_serializer().dumps({'uid': user_id})
+
+def verify_token(token):
+    """Retorna o user_id do token ou None se inválido/expirado (sem acessar o banco)"""
+    if not token:
+        return None
+    max_age = current_app.config.get('TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE)
+    try:
+        return get_serializer().loads(token, max_age=max_age).get('uid')
+    except (BadSignature, SignatureExpired, AttributeError):
+        return None
+
+def get_request_token():
+    """Token do cabeçalho Authorization"""
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
+def issue_ticket(user_id):
+    """Ticket de curta duração para autenticar uma URL (stream de eventos, anexos)"""
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TICKET_SALT).dumps({'uid': user_id})
+
+def verify_ticket(ticket):
+    """Retorna o user_id do ticket ou None se inválido/expirado"""
+    if not ticket:
+        return None
+    max_age = current_app.config.get('TICKET_MAX_AGE', DEFAULT_TICKET_MAX_AGE)
+    try:
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TICKET_SALT).loads(
+            ticket, max_age=max_age).get('uid')
+    except (BadSignature, SignatureExpired, AttributeError):
+        return None
+
+def authenticated_user_id(allow_ticket=False):
+    """user_id do token Bearer (ou do ?ticket= quando permitido); None se ausente ou inválido"""
+    token = get_request_token()
+    if token:
+        return verify_token(token)
+    if allow_ticket:
+        return verify_ticket(request.args.get('ticket'))
+    return None
+
+def request_identity():
+    """'user:<id>' para tokens válidos, senão 'ip:<endereço>' (calculado uma vez por requisição)"""
+    identity = g.get('_request_identity')
+    if identity is None:
+        user_id = authenticated_user_id(allow_ticket=True)
+        identity = g._request_identity = f'user:{user_id}' if user_id else f'ip:{request.remote_addr}'
+    return identity
+
+def login_required(view=None, allow_ticket=False):
+    """Autentica a requisição e define g.user_id (e g.user com os dados do usuário)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not get_request_token() and not (allow_ticket and request.args.get('ticket')):
+                return jsonify({'error': 'Token de autorização necessário'}), 401
+            
+            user_id = authenticated_user_id(allow_ticket=allow_ticket)
+            if not user_id:
+                return jsonify({'error': 'Token inválido ou expirado'}), 401
+            
+            user = user_cache.get(user_id)
+            if not user:
+                return jsonify({'error': 'Usuário não encontrado'}), 404
+            
+            g.user_id = user_id
+            g.user = user
+            return func(*args, **kwargs)
+        return wrapper
+    
+    return decorator(view) if view else decorator
@@ -0,0 +1,99 @@
+import random
+import threading
+import time
+import uuid
+from flask import current_app
+
+class DeliveryError(Exception):
+    """Falha ao entregar uma mensagem ao provedor do canal"""
+    
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+class RateLimited(DeliveryError):
+    """O provedor limitou a taxa de envio; tentar novamente após retry_after segundos"""
+    
+    def __init__(self, retry_after, message='Limite de taxa do provedor atingido'):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class ChannelAdapter:
+    """Interface de envio para um canal (WhatsApp, Telegram, Instagram)"""
+    
+    channel = None
+    
+    def send(self, message, thread):
+        """Envia uma mensagem. Retorna {'external_id': ..., 'status': 'SENT' | 'DELIVERED'}"""
+        raise NotImplementedError
+    
+    def send_batch(self, items):
+        """Envia um lote de (message, thread); retorna um resultado ou DeliveryError por item.
+        
+        Após um RateLimited os itens restantes não são tentados e recebem o mesmo erro.
+        """
+        results = []
+        for message, thread in items:
+            if results and isinstance(results[-1], RateLimited):
+                results.append(results[-1])
+                continue
+            try:
+                results.append(self.send(message, thread))
+            except DeliveryError as e:
+                results.append(e)
+            except Exception as e:
+                results.append(DeliveryError(str(e)))
+        return results
+
+class MockChannelAdapter(ChannelAdapter):
+    """Canal simulado para desenvolvimento e testes de carga offline.
+    
+    Latência, taxa de falhas e de limitação são configuráveis; o limite de taxa
+    também é aplicado de verdade (mensagens por segundo) quando rate_limit > 0.
+    """
+    
+    def __init__(self, channel, latency=0.0, failure_rate=0.0, rate_limit=0, seed=None):
+        self.channel = channel
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._lock = threading.Lock()
+    
+    def _check_rate_limit(self):
+        if not self.rate_limit:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            if self._window_count > self.rate_limit:
+                raise RateLimited(retry_after=1.0 - (now - self._window_start))
+    
+    def send(self, message, thread):
+        self._check_rate_limit()
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise DeliveryError(f'Falha simulada no envio via {self.channel}')
+        
+        print(f"[MOCK] Enviando mensagem via {self.channel}: {message.body}")
+        return {'external_id': f'mock_{uuid.uuid4().hex}', 'status': 'SENT'}
+
+def get_channel_adapter(channel, app=None):
+    """Adaptador registrado para o canal (por padrão, o canal simulado)"""
+    app = app or current_app
+    adapters = app.extensions.setdefault('channel_adapters', {})
+    adapter = adapters.get(channel)
+    if adapter is None:
+        adapter = adapters.setdefault(channel, MockChannelAdapter(
+            channel,
+            latency=app.config.get('MOCK_CHANNEL_LATENCY', 0.0),
+            failure_rate=app.config.get('MOCK_CHANNEL_FAILURE_RATE', 0.0),
+            rate_limit=app.config.get('MOCK_CHANNEL_RATE_LIMIT', 0)
+        ))
+    return adapter
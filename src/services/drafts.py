@@ -0,0 +1,154 @@
+import os
+import threading
+from datetime import datetime
+from flask import current_app
+from src.models.user import db
+from src.models.ids import new_id
+from src.models.thread import Draft, Message, Thread
+from src.services.sql import dialect_insert
+
+class DraftBuffer:
+    """Buffer write-behind de rascunhos (um por processo).
+    
+    Salvamentos em sequência da mesma thread são agrupados em memória e
+    gravados a cada DRAFT_FLUSH_INTERVAL segundos (ou quando o buffer enche,
+    ou no encerramento) com um único upsert. Um rascunho mais antigo que a
+    última mensagem enviada na thread, ou que a última remoção do rascunho
+    (Thread.draft_deleted_at), nunca é regravado, mesmo que o envio ou a
+    remoção tenham passado por outro worker.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('DRAFT_FLUSH_INTERVAL', 2.0)
+        self.max_pending = app.config.get('DRAFT_BUFFER_MAX', 10000)
+        self._pending = {}  # thread_id -> (user_id, rascunho no formato de to_dict)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+    
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._pending.clear()  # Cópia herdada do processo pai
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='drafts', daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+    
+    def save(self, user_id, thread_id, content):
+        """Registra o conteúdo mais recente do rascunho; retorna o rascunho (datas como datetime)"""
+        self.start()
+        with self._lock:
+            previous = self._pending.get(thread_id)
+            draft = {
+                'id': previous[1]['id'] if previous else new_id(),
+                'thread_id': thread_id,
+                'content': content,
+                'updated_at': datetime.utcnow()
+            }
+            self._pending[thread_id] = (user_id, draft)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+        return draft
+    
+    def get(self, user_id, thread_id):
+        """Rascunho ainda não gravado da thread do usuário neste processo, se houver"""
+        with self._lock:
+            pending = self._pending.get(thread_id)
+        if pending and pending[0] == user_id:
+            return pending[1]
+        return None
+    
+    def discard(self, thread_id):
+        with self._lock:
+            self._pending.pop(thread_id, None)
+    
+    def flushing(self):
+        """Lock que impede gravações do buffer (usado ao limpar rascunhos: envio, remoção e exclusão de threads)"""
+        return self._flush_lock
+    
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.exception('Falha ao gravar rascunhos: %s', e)
+    
+    def flush(self):
+        """Grava os rascunhos pendentes; retorna quantos foram gravados"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            
+            with self.app.app_context():
+                try:
+                    write_drafts([draft for _, draft in pending.values()])
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    # Threads removidas no meio tempo derrubam o lote: grava um a um
+                    for _, draft in pending.values():
+                        try:
+                            write_drafts([draft])
+                            db.session.commit()
+                        except Exception:
+                            db.session.rollback()
+                            self.app.logger.warning('Rascunho da thread %s descartado', draft['thread_id'])
+            return len(pending)
+
+def write_drafts(drafts):
+    """Upsert dos rascunhos em um único INSERT ... ON CONFLICT (thread_id). Não faz commit."""
+    insert = dialect_insert(Draft).values(drafts)
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=['thread_id'],
+        set_={'content': insert.excluded.content, 'updated_at': insert.excluded.updated_at},
+        where=Draft.updated_at < insert.excluded.updated_at
+    ))
+    
+    # Rascunhos salvos antes de um envio já foram consumidos pela mensagem, e os
+    # salvos antes de uma remoção (feita em qualquer worker) continuam removidos
+    db.session.execute(
+        db.delete(Draft).where(
+            Draft.thread_id.in_([draft['thread_id'] for draft in drafts]),
+            db.or_(
+                db.exists().where(
+                    Message.thread_id == Draft.thread_id,
+                    Message.direction == 'OUT',
+                    Message.sent_at >= Draft.updated_at
+                ),
+                db.exists().where(
+                    Thread.id == Draft.thread_id,
+                    Thread.draft_deleted_at >= Draft.updated_at
+                )
+            )
+        ).execution_options(synchronize_session=False)
+    )
+
+def serialize_draft(draft):
+    """Rascunho do buffer no formato de Draft.to_dict()"""
+    return {**draft, 'updated_at': draft['updated_at'].isoformat()}
+
+def get_draft_buffer(app=None):
+    """Buffer de rascunhos do app (criado sob demanda)"""
+    app = app or current_app._get_current_object()
+    buffer = app.extensions.get('draft_buffer')
+    if buffer is None:
+        buffer = app.extensions.setdefault('draft_buffer', DraftBuffer(app))
+    return buffer
@@ -0,0 +1,124 @@
+import json
+import queue
+import threading
+from datetime import datetime
+from flask import current_app
+from src.services.redis_store import get_redis
+
+# Eventos pendentes por assinante antes de descartar os mais antigos
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+class Subscription:
+    """Assinatura de eventos de um usuário em um barramento em processo"""
+    
+    def __init__(self, bus, user_id):
+        self.bus = bus
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                # Cliente lento: descarta o evento mais antigo
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def get(self, timeout=None):
+        """Próximo evento ou None se nada chegar dentro do timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def close(self):
+        self.bus.unsubscribe(self)
+
+class InProcessEventBus:
+    """Distribui eventos entre assinantes do mesmo processo (um único nó/worker)"""
+    
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+    
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+    
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+class RedisSubscription:
+    """Assinatura de um canal pub/sub por usuário"""
+    
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+    
+    def get(self, timeout=None):
+        message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout or 0.0)
+        if not message or message.get('type') != 'message':
+            return None
+        return json.loads(message['data'])
+    
+    def close(self):
+        self.pubsub.close()
+
+class RedisEventBus:
+    """Distribui eventos entre workers/nós via pub/sub Redis (ou o substituto local)"""
+    
+    def __init__(self, client, prefix='events:'):
+        self.client = client
+        self.prefix = prefix
+    
+    def publish(self, user_id, event):
+        self.client.publish(f'{self.prefix}{user_id}', json.dumps(event))
+    
+    def subscribe(self, user_id):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f'{self.prefix}{user_id}')
+        return RedisSubscription(pubsub)
+
+def get_event_bus(app=None):
+    """Barramento configurado em EVENT_BUS ('memory' ou 'redis')"""
+    app = app or current_app
+    bus = app.extensions.get('event_bus')
+    if bus is None:
+        if app.config.get('EVENT_BUS', 'memory') == 'redis':
+            bus = RedisEventBus(get_redis(app))
+        else:
+            bus = InProcessEventBus()
+        bus = app.extensions.setdefault('event_bus', bus)
+    return bus
+
+def publish_event(user_id, event_type, data):
+    """Publica um evento para as conexões em tempo real do usuário.
+    
+    Deve ser chamado após o commit, para que o evento só exista se a escrita existir.
+    """
+    event = {
+        'type': event_type,
+        'data': data,
+        'published_at': datetime.utcnow().isoformat()
+    }
+    try:
+        get_event_bus().publish(user_id, event)
+    except Exception as e:
+        # Falha na entrega em tempo real não deve desfazer a escrita já confirmada
+        current_app.logger.warning('Falha ao publicar evento %s: %s', event_type, e)
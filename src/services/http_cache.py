@@ -0,0 +1,101 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import current_app, request
+from src.services.redis_store import get_redis
+
+class MemoryResponseCache:
+    """Cache LRU de corpos de resposta, limitado em bytes (por processo)"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+    
+    def set(self, key, body, ttl=None):
+        if len(body) > self.max_bytes // 8:
+            return  # Respostas muito grandes não compensam ocupar o cache
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+class RedisResponseCache:
+    """Cache de corpos de resposta no Redis (compartilhado entre workers)"""
+    
+    def __init__(self, client, prefix='resp:'):
+        self.client = client
+        self.prefix = prefix
+    
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+    
+    def set(self, key, body, ttl=300):
+        self.client.set(self.prefix + key, body, ex=ttl)
+
+class NullResponseCache:
+    def get(self, key):
+        return None
+    
+    def set(self, key, body, ttl=None):
+        pass
+
+def get_response_cache(app=None):
+    """Cache configurado em RESPONSE_CACHE ('memory', 'redis' ou 'none')"""
+    app = app or current_app
+    cache = app.extensions.get('response_cache')
+    if cache is None:
+        backend = app.config.get('RESPONSE_CACHE', 'memory')
+        if backend == 'redis':
+            cache = RedisResponseCache(get_redis(app))
+        elif backend == 'none':
+            cache = NullResponseCache()
+        else:
+            cache = MemoryResponseCache(app.config.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        cache = app.extensions.setdefault('response_cache', cache)
+    return cache
+
+def make_etag(*parts):
+    """ETag a partir da versão dos dados (contagens, timestamps) e dos parâmetros da requisição"""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return digest[:32]
+
+def conditional_json(etag, build):
+    """Responde 304 se o cliente já tem a versão; senão serve do cache ou de build().
+    
+    O ETag deriva do estado dos dados, então qualquer escrita gera um ETag novo:
+    entradas do cache ficam órfãs (e saem por LRU/TTL) sem invalidação explícita.
+    build() só é chamado em cache miss e deve retornar o dicionário da resposta.
+    
+    Não há Last-Modified: o maior updated_at não muda quando um item é
+    removido, e If-Modified-Since devolveria 304 com a lista antiga. A
+    validação é só pelo ETag, que inclui a contagem.
+    """
+    if request.if_none_match and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        cache = get_response_cache()
+        cache_key = f'{request.path}?{request.query_string.decode()}:{etag}'
+        body = cache.get(cache_key)
+        if body is None:
+            body = current_app.json.dumps(build()).encode()
+            cache.set(cache_key, body, ttl=current_app.config.get('RESPONSE_CACHE_TTL', 300))
+        response = current_app.response_class(body, mimetype='application/json')
+    
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
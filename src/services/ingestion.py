@@ -0,0 +1,434 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import bindparam
+from src.models.user import db
+from src.models.ids import new_id
+from src.models.thread import Thread, Message, Connection, PREVIEW_LENGTH
+from src.services.events import publish_event
+from src.services.sql import dialect_insert
+
+# Ordem dos status de entrega: recibos nunca regridem o status
+STATUS_ORDER = ['QUEUED', 'SENDING', 'SENT', 'DELIVERED', 'READ']
+
+# Linhas por INSERT (mantém o número de parâmetros abaixo dos limites do SQLite)
+INSERT_CHUNK_SIZE = 500
+
+def chunked(items, size=INSERT_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def parse_timestamp(value):
+    """Aceita ISO 8601 ou epoch (segundos); retorna datetime UTC sem tzinfo"""
+    if value in (None, ''):
+        return datetime.utcnow()
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        try:
+            return datetime.fromtimestamp(float(value), tz=timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError):
+            raise ValueError(f'Timestamp fora do intervalo: {value}')
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def normalize_payload(payload):
+    """Valida o payload do provedor. Retorna (mensagens, recibos, rejeitados)"""
+    messages = []
+    statuses = []
+    rejected = 0
+    
+    for item in payload.get('messages') or []:
+        try:
+            if not item.get('id') or not item.get('thread_id') or not (item.get('body') or item.get('media_url')):
+                raise ValueError
+            messages.append({
+                'id': str(item['id']),
+                'thread_id': str(item['thread_id']),
+                'contact_name': item.get('contact_name') or str(item['thread_id']),
+                'contact_handle': item.get('contact_handle') or str(item['thread_id']),
+                'body': item.get('body') or '',
+                'media_url': item.get('media_url'),
+                'sent_at': parse_timestamp(item.get('timestamp')).isoformat()
+            })
+        except (AttributeError, TypeError, ValueError):
+            rejected += 1
+    
+    for item in payload.get('statuses') or []:
+        try:
+            if not item.get('id') or not item.get('thread_id') or item.get('status') not in ('DELIVERED', 'READ', 'FAILED'):
+                raise ValueError
+            statuses.append({
+                'id': str(item['id']),
+                'thread_id': str(item['thread_id']),
+                'status': item['status']
+            })
+        except (AttributeError, TypeError, ValueError):
+            rejected += 1
+    
+    return messages, statuses, rejected
+
+def ingest_batch(user_id, channel, messages, statuses):
+    """Persiste um lote de mensagens recebidas e recibos com comandos em conjunto.
+    
+    Threads são resolvidas por upsert em (user_id, channel, external_thread_id) e
+    mensagens inseridas com ON CONFLICT DO NOTHING em (thread_id,
+    external_message_id), o que torna a reentrega do provedor idempotente.
+    Não faz commit. Retorna as mensagens efetivamente inseridas.
+    """
+    now = datetime.utcnow()
+    inserted = []
+    
+    if messages:
+        # Threads: cria as que faltam e resolve os ids de todas
+        contacts = {}
+        for item in messages:
+            contacts.setdefault(item['thread_id'], item)
+        
+        thread_rows = [{
+            'id': new_id(),
+            'user_id': user_id,
+            'channel': channel,
+            'external_thread_id': external_id,
+            'contact_name': item['contact_name'],
+            'contact_handle': item['contact_handle'],
+            'status': 'NEW',
+            'last_message_at': parse_timestamp(item['sent_at']),
+            'unread_in_count': 0,
+            'message_count': 0,
+            'created_at': now,
+            'updated_at': now
+        } for external_id, item in contacts.items()]
+        for chunk in chunked(thread_rows):
+            db.session.execute(
+                dialect_insert(Thread).values(chunk).on_conflict_do_nothing(
+                    index_elements=['user_id', 'channel', 'external_thread_id']
+                )
+            )
+        
+        thread_ids = dict(db.session.query(Thread.external_thread_id, Thread.id).filter(
+            Thread.user_id == user_id,
+            Thread.channel == channel,
+            Thread.external_thread_id.in_(list(contacts))
+        ).all())
+        
+        # Mensagens: um único INSERT; duplicatas são ignoradas pelo índice único
+        rows = {}
+        for item in messages:
+            thread_id = thread_ids[item['thread_id']]
+            rows.setdefault((thread_id, item['id']), {
+                'id': new_id(),
+                'thread_id': thread_id,
+                'channel': channel,
+                'direction': 'IN',
+                'body': item['body'],
+                'media_url': item['media_url'],
+                'sent_at': parse_timestamp(item['sent_at']),
+                'status': 'DELIVERED',
+                'external_message_id': item['id'],
+                'created_at': now
+            })
+        
+        for chunk in chunked(list(rows.values())):
+            inserted.extend(db.session.execute(
+                # Sem alvo explícito: com messages particionada o índice único
+                # de idempotência também inclui sent_at
+                dialect_insert(Message).values(chunk).on_conflict_do_nothing()
+                  .returning(Message.id, Message.thread_id, Message.body, Message.sent_at)
+            ).all())
+        
+        update_thread_counters(inserted, now)
+    
+    if statuses:
+        apply_receipts(user_id, channel, statuses)
+    
+    return inserted
+
+def update_thread_counters(inserted, now):
+    """Equivalente em lote de Thread.register_message para mensagens recebidas"""
+    per_thread = {}
+    for message_id, thread_id, body, sent_at in inserted:
+        entry = per_thread.setdefault(thread_id, {'count': 0, 'last': None})
+        entry['count'] += 1
+        if entry['last'] is None or (sent_at, message_id) > entry['last'][:2]:
+            entry['last'] = (sent_at, message_id, body)
+    
+    if not per_thread:
+        return
+    
+    threads = Thread.__table__
+    is_newer = db.or_(
+        threads.c.last_message_id.is_(None),
+        threads.c.last_message_at.is_(None),
+        threads.c.last_message_at <= bindparam('b_sent_at')
+    )
+    statement = threads.update().where(threads.c.id == bindparam('b_thread_id')).values(
+        message_count=threads.c.message_count + bindparam('b_count'),
+        unread_in_count=threads.c.unread_in_count + bindparam('b_count'),
+        last_message_id=db.case((is_newer, bindparam('b_message_id')), else_=threads.c.last_message_id),
+        last_message_preview=db.case((is_newer, bindparam('b_preview')), else_=threads.c.last_message_preview),
+        last_message_at=db.case((is_newer, bindparam('b_sent_at')), else_=threads.c.last_message_at),
+        updated_at=now
+    )
+    db.session.execute(statement, [{
+        'b_thread_id': thread_id,
+        'b_count': entry['count'],
+        'b_sent_at': entry['last'][0],
+        'b_message_id': entry['last'][1],
+        'b_preview': entry['last'][2][:PREVIEW_LENGTH]
+    } for thread_id, entry in per_thread.items()])
+
+def apply_receipts(user_id, channel, statuses):
+    """Atualiza status de entrega das mensagens enviadas a partir dos recibos do provedor"""
+    threads = dict(db.session.query(Thread.external_thread_id, Thread.id).filter(
+        Thread.user_id == user_id,
+        Thread.channel == channel,
+        Thread.external_thread_id.in_({item['thread_id'] for item in statuses})
+    ).all())
+    
+    messages = Message.__table__
+    touched = set()
+    for status in ('DELIVERED', 'READ', 'FAILED'):
+        params = [
+            {'b_thread_id': threads[item['thread_id']], 'b_external_id': item['id']}
+            for item in statuses
+            if item['status'] == status and item['thread_id'] in threads
+        ]
+        if not params:
+            continue
+        
+        if status == 'FAILED':
+            allowed = ['QUEUED', 'SENDING', 'SENT']
+        else:
+            allowed = STATUS_ORDER[:STATUS_ORDER.index(status)]
+        
+        db.session.execute(
+            messages.update().where(
+                messages.c.thread_id == bindparam('b_thread_id'),
+                messages.c.external_message_id == bindparam('b_external_id'),
+                messages.c.status.in_(allowed)
+            ).values(status=status),
+            params
+        )
+        touched.update(param['b_thread_id'] for param in params)
+    
+    Thread.touch(touched)
+
+def publish_ingested(user_id, inserted):
+    """Publica message-created para as mensagens inseridas (após o commit)"""
+    if not inserted:
+        return
+    message_ids = [row[0] for row in inserted]
+    rows = db.session.query(Message, Thread).join(Thread, Thread.id == Message.thread_id)\
+                                          .filter(Message.id.in_(message_ids)).all()
+    for message, thread in rows:
+        publish_event(user_id, 'message-created', {
+            'thread': thread.to_dict(),
+            'message': message.to_dict()
+        })
+
+class IngestionSpool:
+    """Fila de gravação antecipada (write-ahead) em diretório.
+    
+    Cada payload aceito vira um arquivo em ready/, gravado de forma atômica
+    (arquivo temporário + fsync + rename) antes da resposta ao provedor. Workers
+    de qualquer processo reivindicam arquivos movendo-os para processing/, o que
+    é atômico no mesmo sistema de arquivos.
+    """
+    
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.fsync = fsync
+        self.ready_dir = os.path.join(directory, 'ready')
+        self.processing_dir = os.path.join(directory, 'processing')
+        self.failed_dir = os.path.join(directory, 'failed')
+        for path in (self.ready_dir, self.processing_dir, self.failed_dir):
+            os.makedirs(path, exist_ok=True)
+    
+    def append(self, record):
+        name = f'{time.time_ns():020d}-{uuid.uuid4().hex}.json'
+        tmp_path = os.path.join(self.directory, f'.{name}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.ready_dir, name))
+        return name
+    
+    def claim(self, max_messages):
+        """Reivindica arquivos prontos (mais antigos primeiro) até max_messages"""
+        claimed = []
+        total = 0
+        for name in sorted(os.listdir(self.ready_dir)):
+            target = os.path.join(self.processing_dir, f'{name}.{os.getpid()}')
+            try:
+                os.rename(os.path.join(self.ready_dir, name), target)
+            except FileNotFoundError:
+                continue  # Outro processo reivindicou antes
+            # mtime passa a marcar a reivindicação (recover_stale compara com ele)
+            os.utime(target)
+            try:
+                with open(target) as f:
+                    record = json.load(f)
+            except ValueError:
+                os.replace(target, os.path.join(self.failed_dir, name))
+                continue
+            claimed.append((target, record))
+            total += len(record.get('messages', [])) + len(record.get('statuses', []))
+            if total >= max_messages:
+                break
+        return claimed
+    
+    def done(self, path):
+        os.remove(path)
+    
+    def fail(self, path):
+        os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+    
+    def recover_stale(self, max_age):
+        """Devolve a ready/ arquivos abandonados em processing/ (processo morto)"""
+        now = time.time()
+        for name in os.listdir(self.processing_dir):
+            path = os.path.join(self.processing_dir, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.replace(path, os.path.join(self.ready_dir, name.rsplit('.', 1)[0]))
+            except FileNotFoundError:
+                pass
+
+class IngestionWorker:
+    """Persiste, em lotes, os payloads gravados no spool (um thread por processo)"""
+    
+    def __init__(self, app, spool):
+        self.app = app
+        self.spool = spool
+        self.batch_size = app.config.get('INGEST_BATCH_SIZE', 1000)
+        self.poll_interval = app.config.get('INGEST_POLL_INTERVAL', 1.0)
+        self.stale_after = app.config.get('INGEST_STALE_AFTER', 300)
+        self.recover_interval = app.config.get('INGEST_RECOVER_INTERVAL', 60.0)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='ingestion', daemon=True)
+            self._thread.start()
+    
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+    
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def _run(self):
+        recovered_at = None
+        while not self._stopping.is_set():
+            try:
+                # Arquivos presos em processing/ por um processo que morreu voltam a ready/
+                if recovered_at is None or time.monotonic() - recovered_at >= self.recover_interval:
+                    recovered_at = time.monotonic()
+                    self.spool.recover_stale(self.stale_after)
+                processed = self.process_once()
+            except Exception as e:
+                self.app.logger.exception('Falha na ingestão: %s', e)
+                processed = 0
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+    
+    def process_once(self):
+        """Processa um lote do spool; retorna quantos arquivos foram consumidos"""
+        claimed = self.spool.claim(self.batch_size)
+        if not claimed:
+            return 0
+        
+        with self.app.app_context():
+            try:
+                self._persist(claimed)
+                for path, _ in claimed:
+                    self.spool.done(path)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning('Lote de ingestão falhou (%s); reprocessando arquivo a arquivo', e)
+                for item in claimed:
+                    try:
+                        self._persist([item])
+                        self.spool.done(item[0])
+                    except Exception:
+                        db.session.rollback()
+                        self.app.logger.exception('Payload de ingestão descartado para failed/: %s', item[0])
+                        self.spool.fail(item[0])
+        return len(claimed)
+    
+    def _persist(self, claimed):
+        # Conexões removidas (ou em remoção) depois do aceite: o payload é descartado
+        connection_ids = {record['connection_id'] for _, record in claimed if record.get('connection_id')}
+        active = set()
+        if connection_ids:
+            active = set(db.session.execute(
+                db.select(Connection.id).where(Connection.id.in_(connection_ids),
+                                               Connection.status.notin_(('INACTIVE', 'DELETING')))
+            ).scalars())
+        
+        groups = {}
+        for path, record in claimed:
+            if record.get('connection_id') and record['connection_id'] not in active:
+                self.app.logger.info('Payload de conexão inativa descartado: %s', path)
+                continue
+            group = groups.setdefault((record['user_id'], record['channel']), {'messages': [], 'statuses': []})
+            group['messages'].extend(record.get('messages', []))
+            group['statuses'].extend(record.get('statuses', []))
+        
+        results = []
+        for (user_id, channel), group in groups.items():
+            results.append((user_id, ingest_batch(user_id, channel, group['messages'], group['statuses'])))
+        db.session.commit()
+        
+        for user_id, inserted in results:
+            publish_ingested(user_id, inserted)
+
+def get_ingestion_worker(app=None):
+    """Worker de ingestão do app (criado sob demanda)"""
+    app = app or current_app._get_current_object()
+    worker = app.extensions.get('ingestion_worker')
+    if worker is None:
+        spool = IngestionSpool(app.config['INGEST_SPOOL_DIR'], fsync=app.config.get('INGEST_FSYNC', True))
+        worker = app.extensions.setdefault('ingestion_worker', IngestionWorker(app, spool))
+    return worker
+
+def accept_payload(user_id, channel, messages, statuses, connection_id=None):
+    """Grava o payload no spool (modo async) ou persiste na hora (modo sync)"""
+    app = current_app._get_current_object()
+    
+    if app.config.get('INGEST_MODE', 'async') == 'sync':
+        inserted = ingest_batch(user_id, channel, messages, statuses)
+        db.session.commit()
+        publish_ingested(user_id, inserted)
+        return
+    
+    worker = get_ingestion_worker(app)
+    worker.spool.append({
+        'user_id': user_id,
+        'connection_id': connection_id,
+        'channel': channel,
+        'messages': messages,
+        'statuses': statuses,
+        'received_at': datetime.utcnow().isoformat()
+    })
+    worker.notify()
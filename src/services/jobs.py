@@ -0,0 +1,145 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from src.models.user import db
+from src.models.ids import new_id
+from src.models.job import Job
+
+# Funções que executam cada tipo de job: tipo -> função(job, progress)
+JOB_HANDLERS = {}
+
+class JobInterrupted(Exception):
+    """O worker está encerrando; o job volta para PENDING e é retomado depois"""
+
+def job_handler(job_type):
+    """Registra a função que executa os jobs de um tipo.
+    
+    A função recebe o Job e `progress(count)`, que soma `count` ao progresso,
+    faz commit do lote e serve de heartbeat. Handlers devem ser idempotentes:
+    um job interrompido é executado de novo e continua de onde parou.
+    """
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+def create_job(user_id, job_type, params=None, total=0):
+    """Adiciona um job pendente à sessão (o chamador faz commit e chama notify())"""
+    job = Job(id=new_id(), user_id=user_id, type=job_type, params=params or {}, total=total)
+    db.session.add(job)
+    return job
+
+class JobRunner:
+    """Executa jobs pendentes do banco, um por vez (um thread por processo).
+    
+    Jobs são reivindicados com UPDATE ... RETURNING, então vários processos
+    podem rodar o runner. Um job RUNNING sem heartbeat há JOB_STALE_AFTER
+    segundos (worker morto) é reivindicado de novo.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 5.0)
+        self.stale_after = app.config.get('JOB_STALE_AFTER', 120)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='jobs', daemon=True)
+            self._thread.start()
+    
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+    
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                ran = self.run_once()
+            except Exception as e:
+                self.app.logger.exception('Falha no runner de jobs: %s', e)
+                ran = False
+            if not ran:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+    
+    def run_once(self):
+        """Reivindica e executa um job; retorna se havia job a executar"""
+        with self.app.app_context():
+            job = self._claim()
+            if job is None:
+                return False
+            self._execute(job)
+            return True
+    
+    def _claimable(self):
+        stale = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        return db.or_(Job.status == 'PENDING', db.and_(Job.status == 'RUNNING', Job.updated_at < stale))
+    
+    def _claim(self):
+        job_id = db.session.execute(
+            db.select(Job.id).where(self._claimable()).order_by(Job.created_at).limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+        
+        claimed = db.session.execute(
+            db.update(Job)
+              .where(Job.id == job_id, self._claimable())
+              .values(status='RUNNING', updated_at=datetime.utcnow())
+              .returning(Job.id)
+              .execution_options(synchronize_session=False)
+        ).scalar()
+        db.session.commit()
+        return db.session.get(Job, claimed) if claimed else None
+    
+    def _execute(self, job):
+        def progress(count):
+            job.processed = (job.processed or 0) + count
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+            if self._stopping.is_set():
+                raise JobInterrupted()
+        
+        try:
+            handler = JOB_HANDLERS.get(job.type)
+            if handler is None:
+                raise ValueError(f'Tipo de job desconhecido: {job.type}')
+            handler(job, progress)
+            job.status = 'DONE'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except JobInterrupted:
+            db.session.rollback()
+            job.status = 'PENDING'
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.exception('Job %s falhou', job.id)
+            job.status = 'FAILED'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+def get_job_runner(app=None):
+    """Runner de jobs do app (criado sob demanda)"""
+    app = app or current_app._get_current_object()
+    runner = app.extensions.get('job_runner')
+    if runner is None:
+        runner = app.extensions.setdefault('job_runner', JobRunner(app))
+    return runner
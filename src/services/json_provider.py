@@ -0,0 +1,49 @@
+import time
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+from src.services.metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem ele usa o encoder da biblioteca padrão
+    orjson = None
+
+def _default(o):
+    # Datas no mesmo formato de to_dict() (isoformat), não no formato HTTP do Flask
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Provider JSON do app: orjson quando instalado, stdlib caso contrário.
+    
+    Datetimes são serializados nativamente em ISO 8601, igual a to_dict(), o
+    que permite responder direto de linhas projetadas sem converter campo a
+    campo. A ordem das chaves é a de inserção (sem sort_keys).
+    """
+    
+    default = staticmethod(_default)
+    sort_keys = False
+    
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        if orjson is None or kwargs:
+            result = super().dumps(obj, **kwargs)
+        else:
+            result = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+        record_serialization(time.perf_counter() - started)
+        return result
+    
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        started = time.perf_counter()
+        body = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        record_serialization(time.perf_counter() - started)
+        return self._app.response_class(body, mimetype=self.mimetype)
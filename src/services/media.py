@@ -0,0 +1,149 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+# Leitura/gravação em blocos: a memória do worker não cresce com o tamanho do arquivo
+CHUNK_SIZE = 256 * 1024
+
+# Lados (px) aceitos para miniaturas; poucos tamanhos mantêm o cache útil
+THUMBNAIL_SIZES = (128, 256, 512)
+
+class MediaTooLarge(Exception):
+    pass
+
+class ThumbnailUnavailable(Exception):
+    pass
+
+class LocalMediaStore:
+    """Object store endereçado por conteúdo no sistema de arquivos.
+    
+    Cada objeto fica em objects/ab/cd/<sha256>: o mesmo conteúdo enviado
+    várias vezes (por qualquer usuário) ocupa o disco uma vez só. O upload
+    é gravado em um arquivo temporário no mesmo volume enquanto o hash é
+    calculado e só então movido para o destino (os.replace é atômico).
+    """
+    
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+    
+    def path(self, sha256):
+        return os.path.join(self.root, 'objects', sha256[:2], sha256[2:4], sha256)
+    
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+    
+    def put(self, stream, max_bytes=None):
+        """Grava o conteúdo de stream e retorna (sha256, tamanho); MediaTooLarge acima de max_bytes"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise MediaTooLarge(f'Arquivo maior que o limite de {max_bytes} bytes')
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            
+            sha256 = digest.hexdigest()
+            target = self.path(sha256)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+class ThumbnailCache:
+    """Miniaturas JPEG geradas sob demanda, em disco, limitadas a max_bytes (LRU por worker).
+    
+    Requer Pillow; sem ele (ou para arquivos que não são imagem) levanta
+    ThumbnailUnavailable. Uma miniatura removida por outro worker é
+    simplesmente gerada de novo.
+    """
+    
+    def __init__(self, store, max_bytes):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.root = os.path.join(store.root, 'thumbnails')
+        os.makedirs(self.root, exist_ok=True)
+        self._entries = OrderedDict()  # caminho -> bytes
+        self._size = 0
+        self._lock = threading.Lock()
+        for name in sorted(os.listdir(self.root), key=lambda n: os.path.getmtime(os.path.join(self.root, n))):
+            path = os.path.join(self.root, name)
+            self._entries[path] = os.path.getsize(path)
+            self._size += self._entries[path]
+    
+    def get(self, sha256, size):
+        """Caminho da miniatura de sha256 com o lado maior de size px"""
+        path = os.path.join(self.root, f'{sha256}-{size}.jpg')
+        with self._lock:
+            if path in self._entries and os.path.exists(path):
+                self._entries.move_to_end(path)
+                return path
+        
+        self._render(self.store.path(sha256), path, size)
+        with self._lock:
+            self._size -= self._entries.pop(path, 0)
+            self._entries[path] = os.path.getsize(path)
+            self._size += self._entries[path]
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_path, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    pass
+        return path
+    
+    def _render(self, source, target, size):
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ThumbnailUnavailable('Miniaturas indisponíveis (Pillow não instalado)')
+        
+        try:
+            with Image.open(source) as image:
+                # Em JPEG, decodifica já reduzido em vez da imagem inteira
+                image.draft('RGB', (size, size))
+                image.thumbnail((size, size))
+                fd, tmp_path = tempfile.mkstemp(dir=self.store.tmp_dir)
+                with os.fdopen(fd, 'wb') as tmp:
+                    image.convert('RGB').save(tmp, 'JPEG', quality=80)
+                os.replace(tmp_path, target)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise ThumbnailUnavailable(f'Não foi possível gerar a miniatura: {e}')
+
+def get_media_store(app=None):
+    """Object store configurado em MEDIA_STORE (por enquanto só 'local', em MEDIA_DIR)"""
+    app = app or current_app
+    store = app.extensions.get('media_store')
+    if store is None:
+        backend = app.config.get('MEDIA_STORE', 'local')
+        if backend != 'local':
+            raise RuntimeError(f'MEDIA_STORE desconhecido: {backend}')
+        store = app.extensions.setdefault('media_store', LocalMediaStore(app.config['MEDIA_DIR']))
+    return store
+
+def get_thumbnail_cache(app=None):
+    """Cache de miniaturas do app (MEDIA_THUMBNAIL_CACHE_BYTES)"""
+    app = app or current_app
+    cache = app.extensions.get('thumbnail_cache')
+    if cache is None:
+        cache = ThumbnailCache(get_media_store(app), app.config.get('MEDIA_THUMBNAIL_CACHE_BYTES', 256 * 1024 * 1024))
+        cache = app.extensions.setdefault('thumbnail_cache', cache)
+    return cache
@@ -0,0 +1,286 @@
+import bisect
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Limites dos histogramas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class Histogram:
+    """Histograma com limites fixos, por combinação de rótulos (formato Prometheus)"""
+    
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self._series = {}  # rótulos -> [contagens por faixa..., soma, total]
+        self._lock = threading.Lock()
+    
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(series)] for labels, series in self._series.items()]
+    
+    def merge(self, items):
+        with self._lock:
+            for labels, values in items:
+                series = self._series.setdefault(tuple(labels), [0] * (len(self.buckets) + 3))
+                for i, value in enumerate(values):
+                    series[i] += value
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in sorted(self._series.items())]
+        for labels, series in items:
+            label_sql = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_sql},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_sql}}} {series[-2]}')
+            lines.append(f'{self.name}_count{{{label_sql}}} {series[-1]}')
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+    
+    def merge(self, items):
+        with self._lock:
+            for labels, value in items:
+                labels = tuple(labels)
+                self._values[labels] = self._values.get(labels, 0) + value
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            label_sql = ','.join(f'{name}="{escape_label(v)}"' for name, v in zip(self.label_names, labels))
+            lines.append(f'{self.name}{{{label_sql}}} {value}')
+        return lines
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    """Métricas do processo (somadas às dos outros workers via MetricsSnapshots)"""
+    
+    def __init__(self):
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Tempo de resposta por endpoint',
+            LATENCY_BUCKETS, ('endpoint', 'method', 'status'))
+        self.db_queries = Histogram(
+            'http_request_db_queries', 'Consultas SQL por requisição', QUERY_COUNT_BUCKETS, ('endpoint',))
+        self.db_time = Histogram(
+            'http_request_db_seconds', 'Tempo em consultas SQL por requisição', LATENCY_BUCKETS, ('endpoint',))
+        self.serialize_time = Histogram(
+            'http_request_serialize_seconds', 'Tempo de serialização JSON por requisição',
+            LATENCY_BUCKETS, ('endpoint',))
+        self.response_size = Histogram(
+            'http_response_size_bytes', 'Tamanho do corpo da resposta', SIZE_BUCKETS, ('endpoint',))
+        self.slow_queries = Counter('db_slow_queries_total', 'Consultas acima de SLOW_QUERY_MS', ('endpoint',))
+    
+    def all(self):
+        return (self.request_duration, self.db_queries, self.db_time,
+                self.serialize_time, self.response_size, self.slow_queries)
+    
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.all()}
+    
+    def merge(self, snapshot):
+        for metric in self.all():
+            metric.merge(snapshot.get(metric.name, []))
+    
+    def render(self):
+        lines = []
+        for metric in self.all():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class MetricsSnapshots:
+    """Agrega as métricas dos workers do gunicorn por um diretório compartilhado.
+    
+    Cada processo grava em METRICS_DIR/<pid>.json o acumulado das suas
+    métricas (no máximo a cada `interval` segundos, no scrape e ao encerrar);
+    /metrics soma os arquivos de todos. Arquivos de workers já reciclados
+    continuam somando, então os contadores não voltam a zero. O diretório é
+    limpo pelo master do gunicorn ao iniciar.
+    """
+    
+    def __init__(self, metrics, directory, interval=5.0):
+        self.metrics = metrics
+        self.directory = directory
+        self.interval = interval
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+    
+    def write(self):
+        with self._lock:
+            self._written_at = time.monotonic()
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.metrics.snapshot(), f)
+            os.replace(tmp_path, path)
+    
+    def maybe_write(self):
+        if time.monotonic() - self._written_at >= self.interval:
+            self.write()
+    
+    def combined(self):
+        """Métricas de todos os processos, incluindo o atual"""
+        self.write()
+        combined = Metrics()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    combined.merge(json.load(f))
+            except (OSError, ValueError):
+                continue  # Removido ou corrompido: fica de fora deste scrape
+        return combined
+    
+    def stop(self, timeout=None):
+        self.write()
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time', 'serialize_time')
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+def current_request_metrics():
+    if has_request_context():
+        return g.get('_request_metrics')
+    return None
+
+def record_serialization(elapsed):
+    """Soma tempo de serialização à requisição atual (chamado pelo provider JSON)"""
+    metrics = current_request_metrics()
+    if metrics is not None:
+        metrics.serialize_time += elapsed
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return threading.current_thread().name  # Workers em segundo plano
+
+def instrument_engine(engine, metrics, slow_query_seconds):
+    """Mede cada consulta do engine; consultas lentas vão para o log"""
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+    
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        request_metrics = current_request_metrics()
+        if request_metrics is not None:
+            request_metrics.queries += 1
+            request_metrics.db_time += elapsed
+        if elapsed >= slow_query_seconds:
+            endpoint = current_endpoint()
+            metrics.slow_queries.inc(endpoint)
+            logger.warning('Consulta lenta (%.1fms) em %s: %s', elapsed * 1000, endpoint,
+                           ' '.join(statement.split())[:2000])
+
+def init_metrics(app):
+    """Instrumenta requisições e consultas e expõe /metrics (formato de texto do Prometheus)"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    
+    from src.models.user import db
+    
+    metrics = app.extensions['metrics'] = Metrics()
+    snapshots = None
+    if app.config.get('METRICS_DIR'):
+        snapshots = app.extensions['metrics_snapshots'] = MetricsSnapshots(
+            metrics, app.config['METRICS_DIR'], app.config.get('METRICS_WRITE_INTERVAL', 5.0))
+    slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine, metrics, slow_query_seconds)
+    
+    @app.before_request
+    def start_request_metrics():
+        g._request_metrics = RequestMetrics()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        request_metrics = g.pop('_request_metrics', None)
+        if request_metrics is None:
+            return response
+        
+        elapsed = time.perf_counter() - request_metrics.started
+        endpoint = request.endpoint or 'unmatched'
+        metrics.request_duration.observe(elapsed, endpoint, request.method, response.status_code)
+        metrics.db_queries.observe(request_metrics.queries, endpoint)
+        metrics.db_time.observe(request_metrics.db_time, endpoint)
+        metrics.serialize_time.observe(request_metrics.serialize_time, endpoint)
+        if not response.is_streamed:
+            metrics.response_size.observe(response.calculate_content_length() or 0, endpoint)
+        if snapshots is not None:
+            try:
+                snapshots.maybe_write()
+            except OSError as e:
+                logger.warning('Falha ao gravar as métricas em %s: %s', snapshots.directory, e)
+        
+        if app.config.get('METRICS_SERVER_TIMING'):
+            response.headers['Server-Timing'] = (
+                f'db;dur={request_metrics.db_time * 1000:.2f};desc="{request_metrics.queries} queries", '
+                f'serialize;dur={request_metrics.serialize_time * 1000:.2f}, '
+                f'app;dur={elapsed * 1000:.2f}'
+            )
+        return response
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        # Sem METRICS_TOKEN o endpoint só existe se METRICS_PUBLIC for explícito
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            if not app.config.get('METRICS_PUBLIC'):
+                return Response('Not found\n', status=404, mimetype='text/plain')
+        elif not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return Response('Não autorizado\n', status=401, mimetype='text/plain')
+        
+        body = (snapshots.combined() if snapshots is not None else metrics).render()
+        return Response(body, mimetype='text/plain; version=0.0.4')
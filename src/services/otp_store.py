@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from src.services.redis_store import get_redis
+
+class MemoryOTPStore:
+    """Armazena códigos OTP no processo, com expiração e limite de tamanho.
+    
+    Entradas vencidas são varridas de forma preguiçosa (no máximo a cada
+    sweep_interval segundos, durante as escritas); acima de max_entries as mais
+    antigas são descartadas. Não é compartilhado entre workers.
+    """
+    
+    def __init__(self, max_entries=10000, sweep_interval=30):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._codes = OrderedDict()     # phone -> (expira_em, dados)
+        self._counters = OrderedDict()  # chave -> (expira_em, contagem)
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _sweep(self, now):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        for entries in (self._codes, self._counters):
+            for key in [key for key, (expires_at, _) in entries.items() if expires_at <= now]:
+                del entries[key]
+    
+    def save(self, phone, data, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            self._codes[phone] = (now + ttl, data)
+            self._codes.move_to_end(phone)
+            while len(self._codes) > self.max_entries:
+                self._codes.popitem(last=False)
+    
+    def get(self, phone):
+        with self._lock:
+            entry = self._codes.get(phone)
+            if not entry:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._codes[phone]
+                return None
+            return entry[1]
+    
+    def delete(self, phone):
+        with self._lock:
+            self._codes.pop(phone, None)
+    
+    def hit(self, key, limit, window):
+        """Conta uma tentativa na janela; retorna (permitido, segundos até liberar)"""
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            expires_at, count = self._counters.get(key, (now + window, 0))
+            if expires_at <= now:
+                expires_at, count = now + window, 0
+            count += 1
+            self._counters[key] = (expires_at, count)
+            while len(self._counters) > self.max_entries:
+                self._counters.popitem(last=False)
+            return count <= limit, max(0, int(expires_at - now))
+
+class RedisOTPStore:
+    """Armazena códigos OTP no Redis (compartilhado entre workers, TTL nativo)"""
+    
+    def __init__(self, client, prefix='otp:'):
+        self.client = client
+        self.prefix = prefix
+    
+    def save(self, phone, data, ttl):
+        self.client.set(f'{self.prefix}code:{phone}', json.dumps(data), ex=ttl)
+    
+    def get(self, phone):
+        value = self.client.get(f'{self.prefix}code:{phone}')
+        return json.loads(value) if value else None
+    
+    def delete(self, phone):
+        self.client.delete(f'{self.prefix}code:{phone}')
+    
+    def hit(self, key, limit, window):
+        counter_key = f'{self.prefix}rate:{key}'
+        count = self.client.incr(counter_key)
+        if count == 1:
+            self.client.expire(counter_key, window)
+        ttl = self.client.ttl(counter_key)
+        if ttl is None or ttl < 0:
+            # Contador sem expiração (falha entre INCR e EXPIRE): corrige
+            self.client.expire(counter_key, window)
+            ttl = window
+        return count <= limit, ttl
+
+def get_otp_store(app=None):
+    """Armazenamento de OTP configurado em OTP_STORE ('memory' ou 'redis')"""
+    app = app or current_app
+    store = app.extensions.get('otp_store')
+    if store is None:
+        if app.config.get('OTP_STORE', 'memory') == 'redis':
+            store = RedisOTPStore(get_redis(app))
+        else:
+            store = MemoryOTPStore(max_entries=app.config.get('OTP_MAX_ENTRIES', 10000))
+        store = app.extensions.setdefault('otp_store', store)
+    return store
@@ -0,0 +1,272 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from src.models.user import db
+from src.models.thread import Thread, Message
+from src.services.channels import get_channel_adapter, RateLimited
+from src.services.events import publish_event
+
+class OutboundQueue:
+    """Fila de envio de mensagens com pool de workers por processo.
+    
+    As mensagens ficam com status QUEUED no banco até serem reivindicadas
+    (SENDING, com lease em claimed_at) por um worker, o que evita envio
+    duplicado entre processos. Cada canal tem limite próprio de lotes
+    simultâneos, retentativas com backoff exponencial (next_attempt_at, que
+    vale para todos os processos) e pausa quando o provedor sinaliza limite
+    de taxa. A cada OUTBOUND_RECOVER_INTERVAL segundos o processo recupera do
+    banco as mensagens QUEUED vencidas e as SENDING com lease expirado
+    (worker que morreu no meio do envio).
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config.get('OUTBOUND_WORKERS', 4)
+        self.channel_concurrency = app.config.get('OUTBOUND_CHANNEL_CONCURRENCY', 2)
+        self.batch_size = app.config.get('OUTBOUND_BATCH_SIZE', 20)
+        self.max_attempts = app.config.get('OUTBOUND_MAX_ATTEMPTS', 5)
+        self.base_delay = app.config.get('OUTBOUND_RETRY_BASE_DELAY', 1.0)
+        self.max_delay = app.config.get('OUTBOUND_RETRY_MAX_DELAY', 300.0)
+        self.recover_interval = app.config.get('OUTBOUND_RECOVER_INTERVAL', 30.0)
+        self.claim_timeout = app.config.get('OUTBOUND_CLAIM_TIMEOUT', 300)
+        self.recover_limit = app.config.get('OUTBOUND_RECOVER_LIMIT', 1000)
+        
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+        self._pending = {}        # canal -> heap de (due, seq, message_id, attempts)
+        self._active = {}         # canal -> lotes em andamento
+        self._paused_until = {}   # canal -> instante (monotonic) liberado pelo provedor
+        self._recover_wakeup = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._stopping = False
+    
+    def start(self):
+        """Inicia os workers neste processo (idempotente e seguro após fork)"""
+        with self._condition:
+            if self._pid == os.getpid() and not self._stopping:
+                return
+            # Threads do processo pai não existem após o fork: recomeça do banco
+            self._pid = os.getpid()
+            self._stopping = False
+            self._pending = {}
+            self._active = {}
+            self._paused_until = {}
+            self._recover_wakeup.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'outbound-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(target=self._recover_loop, name='outbound-recover', daemon=True))
+            for thread in self._threads:
+                thread.start()
+    
+    def stop(self, timeout=10.0):
+        """Para os workers após concluírem os lotes em andamento"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._recover_wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+    
+    def recover(self):
+        """Devolve à fila SENDING com lease expirado e enfileira QUEUED cujo backoff venceu"""
+        now = datetime.utcnow()
+        with self.app.app_context():
+            db.session.execute(
+                db.update(Message)
+                  .where(Message.status == 'SENDING',
+                         Message.claimed_at < now - timedelta(seconds=self.claim_timeout))
+                  .values(status='QUEUED', claimed_at=None)
+                  .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            rows = db.session.query(Message.id, Message.channel, Message.attempts).filter(
+                Message.status == 'QUEUED',
+                Message.direction == 'OUT',
+                db.or_(Message.next_attempt_at.is_(None), Message.next_attempt_at <= now)
+            ).limit(self.recover_limit).all()
+        
+        with self._condition:
+            queued = {item[2] for heap in self._pending.values() for item in heap}
+        for message_id, channel, attempts in rows:
+            if message_id not in queued:
+                self._push(channel, message_id, attempts or 0, time.monotonic())
+    
+    def _recover_loop(self):
+        while not self._stopping:
+            try:
+                self.recover()
+            except Exception as e:
+                self.app.logger.exception('Falha ao recuperar a fila de envio: %s', e)
+            self._recover_wakeup.wait(self.recover_interval)
+    
+    def enqueue(self, message_id, channel):
+        self.start()
+        self._push(channel, message_id, 0, time.monotonic())
+    
+    def pending_count(self):
+        with self._condition:
+            return sum(len(heap) for heap in self._pending.values())
+    
+    def _push(self, channel, message_id, attempts, due):
+        with self._condition:
+            heap = self._pending.setdefault(channel, [])
+            heapq.heappush(heap, (due, next(self._counter), message_id, attempts))
+            self._condition.notify()
+    
+    def _backoff(self, attempts):
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.5)
+    
+    def _next_batch(self):
+        """Bloqueia até haver um lote pronto em um canal com capacidade livre"""
+        with self._condition:
+            while not self._stopping:
+                now = time.monotonic()
+                ready_channel = None
+                wait = None
+                
+                for channel, heap in self._pending.items():
+                    if not heap or self._active.get(channel, 0) >= self.channel_concurrency:
+                        continue
+                    ready_at = max(heap[0][0], self._paused_until.get(channel, 0))
+                    if ready_at <= now:
+                        if ready_channel is None or heap[0][0] < self._pending[ready_channel][0][0]:
+                            ready_channel = channel
+                    else:
+                        wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                
+                if ready_channel:
+                    heap = self._pending[ready_channel]
+                    batch = []
+                    while heap and heap[0][0] <= now and len(batch) < self.batch_size:
+                        _, _, message_id, attempts = heapq.heappop(heap)
+                        batch.append((message_id, attempts))
+                    self._active[ready_channel] = self._active.get(ready_channel, 0) + 1
+                    return ready_channel, batch
+                
+                self._condition.wait(wait)
+        return None, None
+    
+    def _run(self):
+        while True:
+            channel, batch = self._next_batch()
+            if channel is None:
+                return
+            try:
+                with self.app.app_context():
+                    self._deliver(channel, batch)
+            except Exception as e:
+                self.app.logger.exception('Falha no lote de envio via %s: %s', channel, e)
+                self._release(channel, batch)
+            finally:
+                with self._condition:
+                    self._active[channel] -= 1
+                    self._condition.notify_all()
+    
+    def _release(self, channel, batch):
+        """Devolve um lote à fila após erro inesperado"""
+        delay = self._backoff(max(attempts for _, attempts in batch) + 1)
+        try:
+            with self.app.app_context():
+                db.session.rollback()
+                Message.query.filter(
+                    Message.id.in_([message_id for message_id, _ in batch]),
+                    Message.status == 'SENDING'
+                ).update({'status': 'QUEUED', 'claimed_at': None,
+                          'next_attempt_at': datetime.utcnow() + timedelta(seconds=delay)},
+                         synchronize_session=False)
+                db.session.commit()
+        except Exception:
+            self.app.logger.exception('Falha ao devolver lote à fila')
+        for message_id, attempts in batch:
+            self._push(channel, message_id, attempts + 1, time.monotonic() + delay)
+    
+    def _deliver(self, channel, batch):
+        attempts_by_id = dict(batch)
+        
+        # Reivindica as mensagens: só quem mudar QUEUED -> SENDING as envia, e só
+        # depois do backoff (que outro processo pode ter definido)
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            db.update(Message)
+              .where(Message.id.in_(list(attempts_by_id)), Message.status == 'QUEUED',
+                     db.or_(Message.next_attempt_at.is_(None), Message.next_attempt_at <= now))
+              .values(status='SENDING', claimed_at=now)
+              .returning(Message.id)
+              .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.session.commit()
+        if not claimed:
+            return
+        
+        rows = db.session.query(Message, Thread).join(Thread, Thread.id == Message.thread_id)\
+                                              .filter(Message.id.in_(claimed)).all()
+        # Chamada externa fora de transação: as linhas (já carregadas) saem da sessão
+        # e a conexão volta ao pool enquanto o provedor responde
+        db.session.expunge_all()
+        db.session.commit()
+        
+        results = get_channel_adapter(channel, self.app).send_batch(rows)
+        for message, thread in rows:
+            db.session.add(message)
+            db.session.add(thread)
+        
+        retries = []
+        finished = []
+        rate_limited = None
+        for (message, thread), result in zip(rows, results):
+            attempts = max(attempts_by_id[message.id], message.attempts or 0) + 1
+            message.claimed_at = None
+            
+            if isinstance(result, RateLimited):
+                # Limite do provedor não conta como tentativa
+                rate_limited = result
+                message.status = 'QUEUED'
+                message.next_attempt_at = datetime.utcnow() + timedelta(seconds=result.retry_after)
+                retries.append((message.id, attempts - 1, result.retry_after))
+            elif isinstance(result, Exception):
+                message.attempts = attempts
+                if result.permanent or attempts >= self.max_attempts:
+                    message.status = 'FAILED'
+                    finished.append((message, thread))
+                else:
+                    delay = self._backoff(attempts)
+                    message.status = 'QUEUED'
+                    message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    retries.append((message.id, attempts, delay))
+            else:
+                message.attempts = attempts
+                message.status = result.get('status', 'SENT')
+                message.external_message_id = result.get('external_id')
+                finished.append((message, thread))
+        
+        # Status das mensagens faz parte da versão (ETag) da conversa
+        Thread.touch(thread.id for _, thread in rows)
+        db.session.commit()
+        
+        now = time.monotonic()
+        if rate_limited is not None:
+            with self._condition:
+                self._paused_until[channel] = now + rate_limited.retry_after
+        for message_id, attempts, delay in retries:
+            self._push(channel, message_id, attempts, now + delay)
+        
+        for message, thread in finished:
+            publish_event(thread.user_id, 'message-status-changed', {'message': message.to_dict()})
+
+def get_outbound_queue(app=None):
+    """Fila de envio do app (criada sob demanda)"""
+    app = app or current_app._get_current_object()
+    queue = app.extensions.get('outbound_queue')
+    if queue is None:
+        queue = app.extensions.setdefault('outbound_queue', OutboundQueue(app))
+    return queue
@@ -0,0 +1,56 @@
+import os
+import threading
+from flask import current_app
+from src.models.user import db
+from src.models.partitions import ensure_message_partitions
+
+class PartitionMaintainer:
+    """Mantém criadas as partições futuras de messages (um thread por processo).
+    
+    Sem isso, passado o último mês criado no deploy, as mensagens novas
+    caem em messages_default. A verificação é idempotente e serializada no
+    banco (advisory lock), então pode rodar em todos os workers.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config.get('PARTITION_CHECK_INTERVAL', 3600)
+        self.months_ahead = app.config.get('PARTITION_MONTHS_AHEAD', 3)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='partitions', daemon=True)
+            self._thread.start()
+    
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.app.logger.exception('Falha na manutenção das partições: %s', e)
+            self._stopping.wait(self.interval)
+    
+    def run_once(self):
+        with self.app.app_context():
+            return ensure_message_partitions(db.engine, self.months_ahead)
+
+def get_partition_maintainer(app=None):
+    """Manutenção de partições do app (criada sob demanda)"""
+    app = app or current_app._get_current_object()
+    maintainer = app.extensions.get('partition_maintainer')
+    if maintainer is None:
+        maintainer = app.extensions.setdefault('partition_maintainer', PartitionMaintainer(app))
+    return maintainer
@@ -0,0 +1,139 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, jsonify, request
+from src.services.redis_store import get_redis
+from src.services.auth import request_identity
+
+# Token bucket atômico no Redis: KEYS[1] = bucket; ARGV = capacidade, tokens/s, agora (s), custo.
+# Retorna {permitido (0/1), segundos até haver tokens suficientes (x1000)}
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, math.ceil(wait * 1000)}
+"""
+
+def parse_limit(value):
+    """'120/60' -> (capacidade 120, reposição de 120 tokens a cada 60 s)"""
+    capacity, period = str(value).split('/')
+    return int(capacity), float(period)
+
+class MemoryRateLimiter:
+    """Token buckets no processo (um conjunto por worker).
+    
+    Buckets cheios há tempo suficiente equivalem a buckets novos e são
+    descartados na varredura preguiçosa; acima de max_entries saem os mais
+    antigos.
+    """
+    
+    def __init__(self, max_entries=100000, sweep_interval=60):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._buckets = OrderedDict()  # chave -> (tokens, atualizado_em, momento em que enche)
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _sweep(self, now):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+    
+    def take(self, key, capacity, period, cost=1):
+        """Consome `cost` tokens; retorna (permitido, segundos até poder tentar de novo)"""
+        rate = capacity / period
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (cost - tokens) / rate
+
+class RedisRateLimiter:
+    """Token buckets no Redis, compartilhados entre workers (um script Lua por requisição)"""
+    
+    def __init__(self, client, prefix='ratelimit:'):
+        self.prefix = prefix
+        self.script = client.register_script(TOKEN_BUCKET_LUA)
+    
+    def take(self, key, capacity, period, cost=1):
+        allowed, wait_ms = self.script(
+            keys=[self.prefix + key], args=[capacity, capacity / period, time.time(), cost]
+        )
+        return bool(allowed), wait_ms / 1000
+
+def get_rate_limiter(app=None):
+    """Limitador configurado em RATE_LIMIT_STORE ('memory' ou 'redis')"""
+    app = app or current_app
+    limiter = app.extensions.get('rate_limiter')
+    if limiter is None:
+        if app.config.get('RATE_LIMIT_STORE', 'memory') == 'redis' and app.config.get('REDIS_URL'):
+            limiter = RedisRateLimiter(get_redis(app))
+        else:
+            limiter = MemoryRateLimiter()
+        limiter = app.extensions.setdefault('rate_limiter', limiter)
+    return limiter
+
+def route_group(endpoint, method):
+    """Grupo de limite da requisição: 'otp', 'read', 'write' ou None (sem limite)"""
+    if not endpoint or '.' not in endpoint:
+        return None  # Arquivos do frontend
+    blueprint, view = endpoint.split('.', 1)
+    if blueprint == 'webhooks':
+        return None  # Tráfego dos provedores, validado por conexão
+    if blueprint == 'auth' and view in ('send_otp', 'verify_otp'):
+        return 'otp'
+    return 'read' if method in ('GET', 'HEAD') else 'write'
+
+def rate_limit_key(group):
+    """Usuário do token quando válido; senão o IP do cliente (OTP sempre por IP)"""
+    if group == 'otp':
+        return f'{group}:ip:{request.remote_addr}'
+    return f'{group}:{request_identity()}'
+
+def init_rate_limiting(app):
+    """Registra o limite de requisições por grupo de rotas (RATE_LIMITS)"""
+    limits = {group: parse_limit(value) for group, value in app.config.get('RATE_LIMITS', {}).items()}
+    
+    @app.before_request
+    def check_rate_limit():
+        if not app.config.get('RATE_LIMIT_ENABLED', True) or request.method == 'OPTIONS':
+            return None
+        group = route_group(request.endpoint, request.method)
+        if group not in limits:
+            return None
+        
+        capacity, period = limits[group]
+        allowed, retry_after = get_rate_limiter(app).take(rate_limit_key(group), capacity, period)
+        if allowed:
+            return None
+        
+        response = jsonify({'error': 'Muitas requisições. Tente novamente em instantes.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
@@ -0,0 +1,149 @@
+import fnmatch
+import queue
+import threading
+import time
+from flask import current_app
+
+class LocalRedis:
+    """Substituto em memória de um cliente Redis (subconjunto de comandos usados pelo app).
+    
+    Serve para desenvolvimento local e testes (REDIS_URL=memory://): os dados
+    ficam no processo atual, portanto não são compartilhados entre workers.
+    """
+    
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._channels = {}
+        self._lock = threading.RLock()
+    
+    def _alive(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+    
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key) if self._alive(key) else None
+    
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self._lock:
+            if nx and self._alive(key):
+                return None
+            self._data[key] = value if isinstance(value, bytes) else str(value).encode()
+            self._expires.pop(key, None)
+            if ex is not None or px is not None:
+                self._expires[key] = time.monotonic() + (ex if ex is not None else px / 1000.0)
+            return True
+    
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+    
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = int(self._data[key]) + amount if self._alive(key) else amount
+            self._data[key] = str(value).encode()
+            return value
+    
+    def expire(self, key, seconds):
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+    
+    def ttl(self, key):
+        with self._lock:
+            if not self._alive(key):
+                return -2
+            expires_at = self._expires.get(key)
+            return -1 if expires_at is None else max(0, int(expires_at - time.monotonic()))
+    
+    def keys(self, pattern='*'):
+        with self._lock:
+            return [key.encode() for key in list(self._data) if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+    
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        payload = message if isinstance(message, bytes) else str(message).encode()
+        for subscriber in subscribers:
+            subscriber._deliver(channel, payload)
+        return len(subscribers)
+    
+    def pubsub(self, ignore_subscribe_messages=True):
+        return LocalPubSub(self)
+
+class LocalPubSub:
+    """PubSub do LocalRedis: mensagens entregues por fila em memória"""
+    
+    def __init__(self, client):
+        self._client = client
+        self._queue = queue.Queue()
+        self._channels = set()
+    
+    def _deliver(self, channel, payload):
+        self._queue.put({'type': 'message', 'channel': channel.encode(), 'data': payload})
+    
+    def subscribe(self, *channels):
+        with self._client._lock:
+            for channel in channels:
+                self._client._channels.setdefault(channel, set()).add(self)
+                self._channels.add(channel)
+    
+    def unsubscribe(self, *channels):
+        with self._client._lock:
+            for channel in channels or list(self._channels):
+                self._client._channels.get(channel, set()).discard(self)
+                self._channels.discard(channel)
+    
+    def get_message(self, ignore_subscribe_messages=True, timeout=0.0):
+        try:
+            return self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+    
+    def close(self):
+        self.unsubscribe()
+
+# REDIS_URL que seleciona explicitamente o LocalRedis (testes e desenvolvimento com um processo)
+LOCAL_REDIS_URL = 'memory://'
+
+# Configurações que, com o valor 'redis', dependem de REDIS_URL
+REDIS_BACKED_SETTINGS = ('EVENT_BUS', 'OTP_STORE', 'RATE_LIMIT_STORE', 'RESPONSE_CACHE')
+
+def check_redis_settings(app):
+    """Falha na inicialização se algum store compartilhado usa Redis sem REDIS_URL"""
+    configured = [name for name in REDIS_BACKED_SETTINGS if app.config.get(name) == 'redis']
+    if configured and not app.config.get('REDIS_URL'):
+        raise RuntimeError(
+            f"{', '.join(configured)}=redis exige REDIS_URL (use {LOCAL_REDIS_URL} apenas em testes)"
+        )
+
+def get_redis(app=None):
+    """Cliente Redis compartilhado do app (REDIS_URL); LocalRedis só com REDIS_URL=memory://"""
+    app = app or current_app
+    client = app.extensions.get('redis')
+    if client is None:
+        url = app.config.get('REDIS_URL')
+        if not url:
+            raise RuntimeError('REDIS_URL não configurado')
+        if url == LOCAL_REDIS_URL:
+            client = LocalRedis()
+        else:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('REDIS_URL configurado, mas o pacote redis não está instalado')
+            client = redis.Redis.from_url(url)
+        client = app.extensions.setdefault('redis', client)
+    return client
@@ -0,0 +1,109 @@
+import logging
+import math
+import threading
+import time
+from flask import request
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import text
+from src.models.user import db
+from src.models.routing import REPLICA_BIND
+from src.services.auth import request_identity
+
+logger = logging.getLogger(__name__)
+
+# Atraso de replicação em segundos (0 se a réplica está em dia ou não é uma réplica)
+REPLICATION_LAG_SQL = (
+    'SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+READ_METHODS = ('GET', 'HEAD')
+
+# Marca "escreveu há pouco" devolvida ao cliente: cookie (mesma origem) e
+# cabeçalho, que clientes de outra origem reenviam na requisição seguinte
+STICKY_COOKIE = 'replica_sticky'
+STICKY_HEADER = 'X-Replica-Sticky'
+STICKY_SALT = 'pingoo-replica-sticky'
+
+class ReplicaMonitor:
+    """Acompanha o atraso da réplica; acima de REPLICA_MAX_LAG (ou com erro) as leituras voltam ao primário.
+    
+    A medição roda no máximo a cada `interval` segundos, na própria requisição
+    que encontrar o valor vencido; as demais usam o último resultado.
+    """
+    
+    def __init__(self, engine, max_lag=2.0, interval=5.0):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag = 0.0
+        self._healthy = True
+        self._checked_at = None
+        self._lock = threading.Lock()
+    
+    def healthy(self):
+        now = time.monotonic()
+        if (self._checked_at is None or now - self._checked_at >= self.interval) and self._lock.acquire(blocking=False):
+            try:
+                self._checked_at = now
+                self.lag = self.measure_lag()
+                self._healthy = self.lag <= self.max_lag
+                if not self._healthy:
+                    logger.warning('Réplica atrasada %.1fs; leituras no primário', self.lag)
+            except Exception as e:
+                self._healthy = False
+                logger.warning('Réplica indisponível (%s); leituras no primário', e)
+            finally:
+                self._lock.release()
+        return self._healthy
+    
+    def measure_lag(self):
+        if self.engine.dialect.name != 'postgresql':
+            return 0.0
+        with self.engine.connect() as conn:
+            return float(conn.execute(text(REPLICATION_LAG_SQL)).scalar() or 0.0)
+
+def init_replica_routing(app):
+    """Envia GET/HEAD à réplica (bind 'replica'), exceto logo após uma escrita do mesmo usuário.
+    
+    A marca de escrita recente viaja com o cliente (assinada e com validade de
+    REPLICA_STICKY_SECONDS), então vale em qualquer worker ou instância.
+    """
+    with app.app_context():
+        replica = db.engines.get(REPLICA_BIND)
+    if replica is None:
+        return
+    
+    monitor = app.extensions['replica_monitor'] = ReplicaMonitor(
+        replica, app.config.get('REPLICA_MAX_LAG', 2.0), app.config.get('REPLICA_LAG_CHECK_INTERVAL', 5.0))
+    sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+    serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=STICKY_SALT)
+    
+    def wrote_recently():
+        token = request.headers.get(STICKY_HEADER) or request.cookies.get(STICKY_COOKIE)
+        if not token:
+            return False
+        try:
+            return serializer.loads(token, max_age=sticky_seconds) == request_identity()
+        except BadSignature:
+            return False
+    
+    @app.before_request
+    def route_reads_to_replica():
+        if request.method not in READ_METHODS or not request.endpoint:
+            return None
+        # Leia o que escreveu: após uma escrita o usuário fica no primário por alguns segundos
+        if wrote_recently():
+            return None
+        if monitor.healthy():
+            db.session.info['use_replica'] = True
+        return None
+    
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if request.method not in READ_METHODS and request.method != 'OPTIONS' and response.status_code < 400:
+            token = serializer.dumps(request_identity())
+            response.set_cookie(STICKY_COOKIE, token, max_age=max(1, math.ceil(sticky_seconds)),
+                                httponly=True, samesite='Lax', secure=request.is_secure)
+            response.headers[STICKY_HEADER] = token
+        return response
@@ -0,0 +1,210 @@
+import re
+from markupsafe import escape
+from sqlalchemy import text
+from src.models.user import db
+from src.models.thread import Thread, Message
+
+# PostgreSQL: documentos indexados por GIN (as expressões precisam ser idênticas
+# às dos índices criados na migração para que o planner os utilize)
+THREAD_DOCUMENT_SQL = "to_tsvector('simple'::regconfig, coalesce(contact_name, '') || ' ' || coalesce(contact_handle, ''))"
+MESSAGE_DOCUMENT_SQL = "to_tsvector('simple'::regconfig, body)"
+
+MAX_TOKENS = 8
+SNIPPETS_PER_THREAD = 3
+
+# Marcadores de destaque usados pelo banco; o trecho é escapado antes de virarem <b></b>
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+
+# Cache por engine da existência das tabelas FTS5 (SQLite)
+_fts_ready = {}
+
+def search_tokens(term):
+    """Quebra o termo de busca em palavras (prefixos) seguras para o índice"""
+    return re.findall(r'\w+', term or '', re.UNICODE)[:MAX_TOKENS]
+
+def get_backend():
+    """Retorna 'postgresql', 'fts5' ou 'like' conforme o banco em uso"""
+    bind = db.session.get_bind()
+    if bind.dialect.name == 'postgresql':
+        return 'postgresql'
+    
+    if bind.dialect.name == 'sqlite':
+        # Só o resultado positivo é guardado: o índice pode ser criado depois do boot
+        if not _fts_ready.get(bind.url):
+            _fts_ready[bind.url] = db.session.execute(text(
+                "SELECT count(*) FROM sqlite_master WHERE name IN ('threads_fts', 'messages_fts')"
+            )).scalar() == 2
+        if _fts_ready[bind.url]:
+            return 'fts5'
+    
+    return 'like'
+
+def highlight_snippet(raw):
+    """Trecho seguro para HTML: o corpo (vindo de webhooks) é escapado e só os marcadores viram <b>"""
+    if raw is None:
+        return None
+    return str(escape(raw)).replace(HIGHLIGHT_START, '<b>').replace(HIGHLIGHT_STOP, '</b>')
+
+def like_pattern(term):
+    """Padrão LIKE que casa o termo literalmente (% e _ digitados não são curingas)"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+def ts_query(tokens):
+    return db.func.to_tsquery(db.literal_column("'simple'::regconfig"), ' & '.join(f'{t}:*' for t in tokens))
+
+def fts5_query(tokens):
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+def matching_thread_ids(user_id, term):
+    """Select com os ids das threads do usuário cujo contato ou mensagens casam com o termo"""
+    tokens = search_tokens(term)
+    if not tokens:
+        return db.select(Thread.id).where(db.false())
+    
+    backend = get_backend()
+    
+    if backend == 'postgresql':
+        query = ts_query(tokens)
+        by_contact = db.select(Thread.id).where(
+            Thread.user_id == user_id,
+            db.literal_column(THREAD_DOCUMENT_SQL).op('@@')(query)
+        )
+        by_message = db.select(Message.thread_id).join(Thread, Thread.id == Message.thread_id).where(
+            Thread.user_id == user_id,
+            db.literal_column(MESSAGE_DOCUMENT_SQL).op('@@')(query)
+        )
+        return db.union(by_contact, by_message)
+    
+    if backend == 'fts5':
+        return text(
+            'SELECT t.id FROM threads_fts JOIN threads t ON t.rowid = threads_fts.rowid '
+            'WHERE threads_fts MATCH :q AND t.user_id = :user_id '
+            'UNION '
+            'SELECT m.thread_id FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid '
+            'JOIN threads t ON t.id = m.thread_id '
+            'WHERE messages_fts MATCH :q AND t.user_id = :user_id'
+        ).bindparams(q=fts5_query(tokens), user_id=user_id).columns(id=db.String)
+    
+    # Sem índice de texto: varredura com LIKE (apenas para bancos não migrados)
+    pattern = like_pattern(term)
+    by_contact = db.select(Thread.id).where(
+        Thread.user_id == user_id,
+        db.or_(Thread.contact_name.ilike(pattern, escape='\\'),
+               Thread.contact_handle.ilike(pattern, escape='\\'))
+    )
+    by_message = db.select(Message.thread_id).join(Thread, Thread.id == Message.thread_id).where(
+        Thread.user_id == user_id,
+        Message.body.ilike(pattern, escape='\\')
+    )
+    return db.union(by_contact, by_message)
+
+def contact_matches(user_id, tokens, term, limit):
+    """[(thread_id, rank)] das threads cujo contato casa com a busca"""
+    backend = get_backend()
+    
+    if backend == 'postgresql':
+        query = ts_query(tokens)
+        document = db.literal_column(THREAD_DOCUMENT_SQL)
+        rank = db.func.ts_rank(document, query)
+        rows = db.session.execute(
+            db.select(Thread.id, rank.label('rank'))
+              .where(Thread.user_id == user_id, document.op('@@')(query))
+              .order_by(rank.desc()).limit(limit)
+        )
+    elif backend == 'fts5':
+        rows = db.session.execute(text(
+            'SELECT t.id, -bm25(threads_fts) AS rank FROM threads_fts '
+            'JOIN threads t ON t.rowid = threads_fts.rowid '
+            'WHERE threads_fts MATCH :q AND t.user_id = :user_id '
+            'ORDER BY rank DESC LIMIT :limit'
+        ), {'q': fts5_query(tokens), 'user_id': user_id, 'limit': limit})
+    else:
+        pattern = like_pattern(term)
+        rows = db.session.execute(
+            db.select(Thread.id, db.literal(1.0))
+              .where(Thread.user_id == user_id,
+                     db.or_(Thread.contact_name.ilike(pattern, escape='\\'),
+                            Thread.contact_handle.ilike(pattern, escape='\\')))
+              .limit(limit)
+        )
+    
+    return [(row[0], float(row[1] or 0)) for row in rows]
+
+def message_matches(user_id, tokens, term, limit):
+    """[(thread_id, message_id, sent_at, rank, snippet)] das mensagens que casam com a busca"""
+    backend = get_backend()
+    
+    if backend == 'postgresql':
+        query = ts_query(tokens)
+        document = db.literal_column(MESSAGE_DOCUMENT_SQL)
+        rank = db.func.ts_rank(document, query)
+        snippet = db.func.ts_headline(
+            db.literal_column("'simple'::regconfig"), Message.body, query,
+            f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords=20, MinWords=5'
+        )
+        rows = db.session.execute(
+            db.select(Message.thread_id, Message.id, Message.sent_at, rank.label('rank'), snippet)
+              .join(Thread, Thread.id == Message.thread_id)
+              .where(Thread.user_id == user_id, document.op('@@')(query))
+              .order_by(rank.desc()).limit(limit)
+        )
+    elif backend == 'fts5':
+        rows = db.session.execute(text(
+            "SELECT m.thread_id, m.id, m.sent_at, -bm25(messages_fts) AS rank, "
+            "snippet(messages_fts, 0, char(2), char(3), '…', 12) "
+            'FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid '
+            'JOIN threads t ON t.id = m.thread_id '
+            'WHERE messages_fts MATCH :q AND t.user_id = :user_id '
+            'ORDER BY rank DESC LIMIT :limit'
+        ).columns(
+            db.column('thread_id'), db.column('id'), db.column('sent_at', db.DateTime),
+            db.column('rank'), db.column('snippet')
+        ), {'q': fts5_query(tokens), 'user_id': user_id, 'limit': limit})
+    else:
+        pattern = like_pattern(term)
+        rows = db.session.execute(
+            db.select(Message.thread_id, Message.id, Message.sent_at, db.literal(1.0), Message.body)
+              .join(Thread, Thread.id == Message.thread_id)
+              .where(Thread.user_id == user_id, Message.body.ilike(pattern, escape='\\'))
+              .order_by(Message.sent_at.desc()).limit(limit)
+        )
+    
+    return [(row[0], row[1], row[2], float(row[3] or 0), highlight_snippet(row[4])) for row in rows]
+
+def search_threads(user_id, term, limit=20):
+    """Busca threads por contato e corpo das mensagens, ordenadas por relevância.
+    
+    Retorna [(thread, rank, matches)], onde matches são até SNIPPETS_PER_THREAD
+    mensagens com trecho destacado.
+    """
+    tokens = search_tokens(term)
+    if not tokens:
+        return []
+    
+    scores = {}
+    matches = {}
+    
+    for thread_id, rank in contact_matches(user_id, tokens, term, limit):
+        scores[thread_id] = max(scores.get(thread_id, 0), rank)
+    
+    for thread_id, message_id, sent_at, rank, snippet in message_matches(user_id, tokens, term, limit * 5):
+        scores[thread_id] = max(scores.get(thread_id, 0), rank)
+        thread_matches = matches.setdefault(thread_id, [])
+        if len(thread_matches) < SNIPPETS_PER_THREAD:
+            thread_matches.append({
+                'message_id': message_id,
+                'snippet': snippet,
+                'sent_at': sent_at.isoformat() if sent_at else None
+            })
+    
+    ranked_ids = sorted(scores, key=scores.get, reverse=True)[:limit]
+    if not ranked_ids:
+        return []
+    
+    threads = {thread.id: thread for thread in Thread.query.filter(Thread.id.in_(ranked_ids))}
+    return [
+        (threads[thread_id], scores[thread_id], matches.get(thread_id, []))
+        for thread_id in ranked_ids if thread_id in threads
+    ]
@@ -0,0 +1,9 @@
+from src.models.user import db
+
+def dialect_insert(model):
+    """INSERT com suporte a ON CONFLICT para o banco em uso (PostgreSQL ou SQLite)"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
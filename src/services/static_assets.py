@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensões que valem a pena comprimir (imagens e fontes woff2 já são comprimidas)
+COMPRESSIBLE_EXTENSIONS = {'.html', '.js', '.mjs', '.css', '.json', '.map', '.svg', '.txt', '.xml', '.wasm', '.ico'}
+MIN_COMPRESS_SIZE = 1024
+
+# Nomes com hash de conteúdo gerados pelo bundler: o conteúdo de uma URL nunca muda.
+# Vite: assets/index-DiwrgTda.js (8 caracteres base64url depois do último hífen);
+# CRA: static/js/main.8a9b7c6d.js (hex). O hash precisa ter dígito ou maiúscula
+# (no Vite, fora da primeira posição), para nomes como assets/inter-semibold.woff2
+# ou assets/icon-Settings.svg não serem servidos como imutáveis
+HASHED_NAME = re.compile(
+    r'(^|/)assets/.+-[A-Za-z0-9_-](?=[A-Za-z0-9_-]{0,6}[0-9A-Z_-])[A-Za-z0-9_-]{7}(\.\w+)+$'
+    r'|\.(?=[0-9a-f]{0,31}[0-9])[0-9a-f]{8,32}(\.chunk)?(\.\w+)+$'
+)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Variantes pré-comprimidas, na ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def compress_file(path):
+    """Grava path.gz (e path.br, se o pacote brotli existir) quando ausentes ou mais antigos; retorna os criados"""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+        return []
+    
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    
+    created = []
+    data = None
+    mtime = os.path.getmtime(path)
+    for suffix, compress in compressors:
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            continue
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, target)
+        created.append(target)
+    return created
+
+def precompress(root):
+    """Comprime os arquivos estáticos de root (usado no build e na primeira requisição)"""
+    created = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if not name.endswith(('.gz', '.br', '.tmp')):
+                created.extend(compress_file(os.path.join(directory, name)))
+    return created
+
+class StaticAsset:
+    def __init__(self, path, etag, variants):
+        self.path = path
+        self.etag = etag
+        self.variants = variants  # encoding -> caminho do arquivo comprimido
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.immutable = False
+
+class StaticAssets:
+    """Manifesto em memória dos arquivos do frontend (SPA).
+    
+    O diretório é percorrido uma vez por worker (na primeira requisição): a
+    partir daí, decidir entre arquivo e fallback para index.html não toca o
+    disco. index.html e suas versões comprimidas ficam em memória. Um novo
+    build do frontend exige reiniciar os workers (em debug o manifesto é
+    refeito a cada requisição).
+    """
+    
+    def __init__(self, root, compress=True):
+        self.root = root
+        self.compress = compress
+        self.files = None
+        self.index = None  # (etag, {encoding: bytes}) de index.html
+        self._lock = threading.Lock()
+    
+    def load(self):
+        with self._lock:
+            if self.files is None:
+                self.files, self.index = self._scan()
+        return self.files
+    
+    def reload(self):
+        with self._lock:
+            self.files, self.index = self._scan()
+    
+    def _scan(self):
+        files = {}
+        index = None
+        if not self.root or not os.path.isdir(self.root):
+            return files, index
+        if self.compress:
+            precompress(self.root)
+        
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                stat = os.stat(path)
+                variants = {
+                    encoding: path + suffix for encoding, suffix in ENCODINGS
+                    if os.path.exists(path + suffix)
+                }
+                asset = StaticAsset(path, f'{stat.st_mtime_ns:x}-{stat.st_size:x}', variants)
+                asset.immutable = bool(HASHED_NAME.search(key))
+                files[key] = asset
+        
+        index_path = os.path.join(self.root, 'index.html')
+        if os.path.isfile(index_path):
+            with open(index_path, 'rb') as f:
+                body = f.read()
+            bodies = {'identity': body, 'gzip': gzip.compress(body, mtime=0)}
+            if brotli is not None:
+                bodies['br'] = brotli.compress(body)
+            index = (hashlib.sha1(body).hexdigest()[:32], bodies)
+        return files, index
+    
+    def serve(self, path):
+        """Resposta para path: o arquivo (na melhor codificação aceita) ou index.html (rotas da SPA)"""
+        files = self.load()
+        asset = files.get(path) if path else None
+        
+        if asset is None or path == 'index.html':
+            # Bundle com hash inexistente: 404 em vez de HTML que o navegador guardaria como script
+            if path and HASHED_NAME.search(path):
+                return 'Not found', 404
+            return self.serve_index()
+        
+        encoding = negotiate_encoding(asset.variants)
+        response = send_file(
+            asset.variants.get(encoding, asset.path), mimetype=asset.mimetype, conditional=True,
+            etag=f'{asset.etag}-{encoding}' if encoding else asset.etag,
+            max_age=IMMUTABLE_MAX_AGE if asset.immutable else None
+        )
+        if encoding:
+            response.content_encoding = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        if asset.immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+        return response
+    
+    def serve_index(self):
+        if self.index is None:
+            return 'index.html not found', 404
+        
+        etag, bodies = self.index
+        encoding = negotiate_encoding(bodies)
+        response = current_app.response_class(bodies[encoding or 'identity'], mimetype='text/html')
+        response.set_etag(f'{etag}-{encoding}' if encoding else etag)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        # Sempre revalidado: aponta para os bundles da versão atual
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+def negotiate_encoding(available):
+    """Melhor codificação de available aceita pelo cliente (Accept-Encoding), ou None"""
+    accepted = request.accept_encodings
+    for encoding, _ in ENCODINGS:
+        if encoding in available and accepted[encoding] > 0:
+            return encoding
+    return None
+
+def get_static_assets(app=None):
+    """Manifesto do frontend em app.static_folder (STATIC_PRECOMPRESS comprime na primeira requisição)"""
+    app = app or current_app
+    assets = app.extensions.get('static_assets')
+    if assets is None:
+        assets = StaticAssets(app.static_folder, app.config.get('STATIC_PRECOMPRESS', True))
+        assets = app.extensions.setdefault('static_assets', assets)
+    return assets
@@ -0,0 +1,31 @@
+import pytest
+from src.main import create_app, shutdown_app
+from src.models.user import db, User
+from src.models.migrations import upgrade_database
+from src.services.auth import issue_token
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'RATE_LIMIT_ENABLED': False,
+        'RESPONSE_CACHE': 'none',
+        'MEDIA_DIR': str(tmp_path / 'media'),
+        'INGEST_SPOOL_DIR': str(tmp_path / 'ingest'),
+        'INGEST_FSYNC': False,
+        'SHUTDOWN_TIMEOUT': 5,
+    })
+    with app.app_context():
+        upgrade_database()
+        db.session.add(User(id='u1', phone='1'))
+        db.session.commit()
+    yield app
+    shutdown_app(app)
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        token = issue_token('u1')
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
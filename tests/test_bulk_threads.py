@@ -0,0 +1,52 @@
+from datetime import datetime
+import pytest
+from src.models.user import db, User
+from src.models.thread import Thread, Message, Draft
+
+@pytest.fixture
+def threads(app):
+    with app.app_context():
+        db.session.add(User(id='u2', phone='2'))
+        for thread_id, user_id, channel in (('t1', 'u1', 'whatsapp'), ('t2', 'u1', 'telegram'),
+                                            ('t3', 'u1', 'whatsapp'), ('other', 'u2', 'whatsapp')):
+            db.session.add(Thread(id=thread_id, user_id=user_id, channel=channel, external_thread_id=thread_id,
+                                  contact_name='Contato', contact_handle='@contato', status='OPEN'))
+            db.session.add(Message(id=f'{thread_id}-m', thread_id=thread_id, channel=channel, direction='IN',
+                                   body='oi', sent_at=datetime(2024, 1, 1)))
+        db.session.add(Draft(thread_id='t1', content='rascunho'))
+        db.session.commit()
+
+def statuses(app):
+    with app.app_context():
+        return dict(db.session.query(Thread.id, Thread.status).all())
+
+def test_bulk_status_by_ids_only_touches_own_threads(app, client, threads):
+    response = client.post('/api/threads/bulk', json={'action': 'status', 'status': 'DONE', 'ids': ['t1', 'other']})
+    assert response.get_json()['updated'] == 1
+    assert statuses(app) == {'t1': 'DONE', 't2': 'OPEN', 't3': 'OPEN', 'other': 'OPEN'}
+    
+    # Threads já no status de destino não são reescritas
+    response = client.post('/api/threads/bulk', json={'action': 'status', 'status': 'DONE', 'ids': ['t1']})
+    assert response.get_json()['updated'] == 0
+
+def test_bulk_archive_by_filters(app, client, threads):
+    response = client.post('/api/threads/bulk', json={'action': 'archive', 'filters': {'channel': 'whatsapp'}})
+    assert response.get_json() == {'action': 'archive', 'status': 'ARCHIVED', 'updated': 2}
+    assert statuses(app) == {'t1': 'ARCHIVED', 't2': 'OPEN', 't3': 'ARCHIVED', 'other': 'OPEN'}
+
+def test_bulk_delete_removes_messages_and_drafts(app, client, threads):
+    response = client.post('/api/threads/bulk', json={'action': 'delete', 'ids': ['t1', 't2', 'other']})
+    assert response.get_json() == {'action': 'delete', 'deleted': 2}
+    with app.app_context():
+        assert {thread.id for thread in Thread.query} == {'t3', 'other'}
+        assert {message.thread_id for message in Message.query} == {'t3', 'other'}
+        assert Draft.query.count() == 0
+
+@pytest.mark.parametrize('body', [
+    {'action': 'status', 'status': 'NOPE', 'ids': ['t1']},
+    {'action': 'explode', 'ids': ['t1']},
+    {'action': 'archive'},
+    {'action': 'archive', 'ids': ['t1'], 'filters': {}},
+])
+def test_bulk_rejects_invalid_requests(client, threads, body):
+    assert client.post('/api/threads/bulk', json=body).status_code == 400
@@ -0,0 +1,70 @@
+from datetime import datetime
+import pytest
+from src.models.user import db
+from src.models.job import Job
+from src.models.thread import Thread, Message, Connection
+from src.routes import connections
+from src.services.jobs import JobRunner, get_job_runner
+
+@pytest.fixture(autouse=True)
+def manual_jobs(monkeypatch):
+    # Jobs rodam quando o teste chama run_once(), não no thread do runner
+    monkeypatch.setattr(JobRunner, 'notify', lambda self: None)
+
+@pytest.fixture
+def connection(app):
+    with app.app_context():
+        db.session.add(Connection(id='c1', user_id='u1', type='WA', status='ACTIVE', token_ref='encrypted_x'))
+        for thread_id, count in (('t1', 5), ('t2', 2)):
+            db.session.add(Thread(id=thread_id, user_id='u1', channel='whatsapp', external_thread_id=thread_id,
+                                  contact_name='Contato', contact_handle='@contato', message_count=count))
+            db.session.add_all([
+                Message(id=f'{thread_id}-{n}', thread_id=thread_id, channel='whatsapp', direction='IN',
+                        body='oi', sent_at=datetime(2024, 1, 1, 0, n))
+                for n in range(count)
+            ])
+        db.session.commit()
+    return 'c1'
+
+def test_large_delete_runs_as_job_in_message_chunks(app, client, connection, monkeypatch):
+    app.config['CONNECTION_DELETE_SYNC_LIMIT'] = 0
+    monkeypatch.setattr(connections, 'CONNECTION_DELETE_MESSAGE_BATCH', 3)
+    chunks = []
+    delete_messages = Thread.delete_messages.__func__
+    
+    def recording_delete(cls, thread_ids, limit):
+        deleted = delete_messages(cls, thread_ids, limit)
+        chunks.append(deleted)
+        return deleted
+    
+    monkeypatch.setattr(Thread, 'delete_messages', classmethod(recording_delete))
+    
+    response = client.delete(f'/api/connections/{connection}')
+    assert response.status_code == 202
+    assert client.delete(f'/api/connections/{connection}').status_code == 409
+    
+    assert get_job_runner(app).run_once()
+    assert chunks == [3, 3, 1, 0]
+    with app.app_context():
+        job = db.session.get(Job, response.get_json()['job']['id'])
+        assert (job.status, job.processed) == ('DONE', 2)
+        assert db.session.get(Connection, connection) is None
+        assert Message.query.count() == 0 and Thread.query.count() == 0
+
+def test_failed_delete_job_can_be_retried(app, client, connection):
+    app.config['CONNECTION_DELETE_SYNC_LIMIT'] = 0
+    job_id = client.delete(f'/api/connections/{connection}').get_json()['job']['id']
+    with app.app_context():
+        db.session.get(Job, job_id).status = 'FAILED'
+        db.session.commit()
+    
+    assert client.delete(f'/api/connections/{connection}').status_code == 202
+
+def test_connection_being_deleted_cannot_be_reactivated(app, client, connection):
+    app.config['CONNECTION_DELETE_SYNC_LIMIT'] = 0
+    client.delete(f'/api/connections/{connection}')
+    
+    response = client.post(f'/api/connections/{connection}/test')
+    assert response.status_code == 409
+    with app.app_context():
+        assert db.session.get(Connection, connection).status == 'DELETING'
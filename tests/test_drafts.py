@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+import pytest
+from src.models.user import db
+from src.models.thread import Thread, Message, Draft
+from src.services.drafts import DraftBuffer, get_draft_buffer
+
+@pytest.fixture
+def thread(app):
+    with app.app_context():
+        db.session.add(Thread(id='t1', user_id='u1', channel='whatsapp', external_thread_id='e1',
+                              contact_name='Contato', contact_handle='@contato'))
+        db.session.commit()
+    return 't1'
+
+def stored_draft(app, thread_id):
+    with app.app_context():
+        draft = Draft.query.filter_by(thread_id=thread_id).first()
+        return draft.content if draft else None
+
+def test_flush_writes_latest_buffered_draft(app, client, thread):
+    client.post(f'/api/threads/{thread}/draft', json={'content': 'um'})
+    client.post(f'/api/threads/{thread}/draft', json={'content': 'dois'})
+    
+    assert get_draft_buffer(app).flush() == 1
+    assert stored_draft(app, thread) == 'dois'
+
+def test_flush_skips_draft_older_than_sent_message(app, thread):
+    other_worker = DraftBuffer(app)
+    other_worker.save('u1', thread, 'antes do envio')
+    with app.app_context():
+        db.session.add(Message(id='m1', thread_id=thread, channel='whatsapp', direction='OUT',
+                               body='enviada', sent_at=datetime.utcnow() + timedelta(seconds=1)))
+        db.session.commit()
+    
+    other_worker.flush()
+    assert stored_draft(app, thread) is None
+
+def test_delete_is_not_undone_by_another_workers_buffer(app, client, thread):
+    # Autosave pendente em outro processo, feito antes da remoção
+    other_worker = DraftBuffer(app)
+    other_worker.save('u1', thread, 'rascunho antigo')
+    client.post(f'/api/threads/{thread}/draft', json={'content': 'rascunho antigo'})
+    get_draft_buffer(app).flush()
+    
+    assert client.delete(f'/api/threads/{thread}/draft').status_code == 200
+    other_worker.flush()
+    assert stored_draft(app, thread) is None
+    
+    # Um salvamento posterior à remoção volta a ser gravado
+    other_worker.save('u1', thread, 'novo')
+    other_worker.flush()
+    assert stored_draft(app, thread) == 'novo'
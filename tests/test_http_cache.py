@@ -0,0 +1,42 @@
+from src.models.user import db
+from src.models.thread import Thread
+
+def add_thread(app, thread_id):
+    with app.app_context():
+        db.session.add(Thread(id=thread_id, user_id='u1', channel='whatsapp', external_thread_id=thread_id,
+                              contact_name='Contato', contact_handle='@contato'))
+        db.session.commit()
+
+def test_threads_revalidate_with_etag(app, client):
+    add_thread(app, 't1')
+    response = client.get('/api/threads')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
+    
+    not_modified = client.get('/api/threads', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers['ETag'] == etag
+    
+    # Outros parâmetros são outra representação
+    assert client.get('/api/threads?channel=telegram', headers={'If-None-Match': etag}).status_code == 200
+
+def test_delete_changes_etag(app, client):
+    add_thread(app, 't1')
+    add_thread(app, 't2')
+    etag = client.get('/api/threads').headers['ETag']
+    
+    client.post('/api/threads/bulk', json={'action': 'delete', 'ids': ['t1']})
+    
+    response = client.get('/api/threads', headers={'If-None-Match': etag,
+                                                   'If-Modified-Since': 'Mon, 01 Jan 2099 00:00:00 GMT'})
+    assert response.status_code == 200
+    assert [thread['id'] for thread in response.get_json()['threads']] == ['t2']
+
+def test_messages_etag_changes_with_new_message(app, client):
+    add_thread(app, 't1')
+    etag = client.get('/api/threads/t1/messages').headers['ETag']
+    assert client.get('/api/threads/t1/messages', headers={'If-None-Match': etag}).status_code == 304
+    
+    assert client.post('/api/threads/t1/messages', json={'body': 'oi'}).status_code == 201
+    assert client.get('/api/threads/t1/messages', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,40 @@
+import os
+import time
+from src.main import start_background_services
+from src.models.thread import Message
+from src.services.ingestion import IngestionSpool, get_ingestion_worker
+
+def record(message_id='ext-1'):
+    return {
+        'user_id': 'u1',
+        'connection_id': None,
+        'channel': 'whatsapp',
+        'messages': [{
+            'id': message_id, 'thread_id': 'contato-1', 'contact_name': 'Contato', 'contact_handle': '@contato',
+            'body': 'olá', 'media_url': None, 'sent_at': '2024-01-01T00:00:00'
+        }],
+        'statuses': [],
+    }
+
+def test_recover_stale_returns_abandoned_files_to_ready(tmp_path):
+    spool = IngestionSpool(str(tmp_path), fsync=False)
+    name = spool.append(record())
+    [(path, _)] = spool.claim(100)
+    
+    spool.recover_stale(300)
+    assert os.listdir(spool.ready_dir) == []
+    
+    os.utime(path, (0, 0))
+    spool.recover_stale(300)
+    assert os.listdir(spool.ready_dir) == [name]
+    assert os.listdir(spool.processing_dir) == []
+
+def test_background_services_drain_spool_at_boot(app):
+    get_ingestion_worker(app).spool.append(record())
+    start_background_services(app)
+    
+    deadline = time.monotonic() + 5
+    with app.app_context():
+        while Message.query.count() == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert Message.query.filter_by(external_message_id='ext-1').count() == 1
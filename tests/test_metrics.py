@@ -0,0 +1,18 @@
+import pytest
+
+@pytest.fixture
+def metrics_client(app):
+    app.config['METRICS_TOKEN'] = 'segredo'
+    return app.test_client()
+
+def test_metrics_requires_token(app):
+    assert app.test_client().get('/metrics').status_code == 404
+
+@pytest.mark.parametrize('authorization', ['Bearer errado', 'Bearer caf\xe9', ''])
+def test_metrics_rejects_wrong_token(metrics_client, authorization):
+    assert metrics_client.get('/metrics', headers={'Authorization': authorization}).status_code == 401
+
+def test_metrics_accepts_token(metrics_client):
+    response = metrics_client.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+    assert response.status_code == 200
+    assert b'# TYPE http_request_duration_seconds histogram' in response.data
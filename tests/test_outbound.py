@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import pytest
+from src.models.user import db
+from src.models.thread import Thread, Message
+from src.services.channels import ChannelAdapter, DeliveryError
+from src.services.outbound import OutboundQueue
+
+class RecordingAdapter(ChannelAdapter):
+    channel = 'whatsapp'
+    
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.in_transaction = []
+    
+    def send(self, message, thread):
+        self.in_transaction.append(db.session().in_transaction())
+        if self.fail:
+            raise DeliveryError('indisponível')
+        return {'external_id': f'ext-{message.id}', 'status': 'SENT'}
+
+@pytest.fixture
+def queue(app):
+    with app.app_context():
+        db.session.add(Thread(id='t1', user_id='u1', channel='whatsapp', external_thread_id='e1',
+                              contact_name='Contato', contact_handle='@contato'))
+        db.session.commit()
+    return OutboundQueue(app)
+
+def add_message(app, message_id, **values):
+    with app.app_context():
+        db.session.add(Message(id=message_id, thread_id='t1', channel='whatsapp', direction='OUT',
+                               body='oi', sent_at=datetime.utcnow(), **values))
+        db.session.commit()
+
+def message_state(app, message_id):
+    with app.app_context():
+        message = db.session.get(Message, message_id)
+        return message.status, message.attempts, message.next_attempt_at, message.claimed_at
+
+def use_adapter(app, adapter):
+    app.extensions.setdefault('channel_adapters', {})['whatsapp'] = adapter
+
+def test_deliver_sends_outside_a_transaction(app, queue):
+    adapter = RecordingAdapter()
+    use_adapter(app, adapter)
+    add_message(app, 'm1', status='QUEUED')
+    
+    with app.app_context():
+        queue._deliver('whatsapp', [('m1', 0)])
+    
+    assert adapter.in_transaction == [False]
+    status, attempts, _, claimed_at = message_state(app, 'm1')
+    assert (status, attempts, claimed_at) == ('SENT', 1, None)
+
+def test_deliver_skips_messages_in_backoff(app, queue):
+    adapter = RecordingAdapter()
+    use_adapter(app, adapter)
+    add_message(app, 'm1', status='QUEUED', next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+    
+    with app.app_context():
+        queue._deliver('whatsapp', [('m1', 0)])
+    
+    assert adapter.in_transaction == []
+    assert message_state(app, 'm1')[0] == 'QUEUED'
+
+def test_failed_send_persists_backoff(app, queue):
+    use_adapter(app, RecordingAdapter(fail=True))
+    add_message(app, 'm1', status='QUEUED')
+    
+    with app.app_context():
+        queue._deliver('whatsapp', [('m1', 0)])
+    
+    status, attempts, next_attempt_at, claimed_at = message_state(app, 'm1')
+    assert (status, attempts, claimed_at) == ('QUEUED', 1, None)
+    assert next_attempt_at > datetime.utcnow()
+    assert queue.pending_count() == 1
+
+def test_recover_requeues_expired_leases(app, queue):
+    add_message(app, 'stale', status='SENDING', claimed_at=datetime.utcnow() - timedelta(hours=1))
+    add_message(app, 'fresh', status='SENDING', claimed_at=datetime.utcnow())
+    
+    queue.recover()
+    
+    assert message_state(app, 'stale')[0] == 'QUEUED'
+    assert message_state(app, 'fresh')[0] == 'SENDING'
+    assert queue.pending_count() == 1
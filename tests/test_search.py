@@ -0,0 +1,44 @@
+from datetime import datetime
+import pytest
+from src.main import create_app
+from src.models.user import db, User
+from src.models.thread import Thread, Message
+from src.models.migrations import upgrade_database
+from src.services.auth import issue_token
+
+@pytest.fixture
+def client(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'RATE_LIMIT_ENABLED': False,
+        'MEDIA_DIR': str(tmp_path / 'media'),
+    })
+    with app.app_context():
+        upgrade_database()
+        db.session.add(User(id='u1', phone='1'))
+        db.session.add(Thread(id='t1', user_id='u1', channel='whatsapp', external_thread_id='e1',
+                              contact_name='Contato', contact_handle='@contato'))
+        db.session.add(Message(id='m1', thread_id='t1', channel='whatsapp', direction='IN',
+                               body='hello <script>x</script> world', sent_at=datetime(2024, 1, 1)))
+        db.session.commit()
+        token = issue_token('u1')
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+def test_snippet_escapes_message_body(client):
+    response = client.get('/api/search?q=hello')
+    assert response.status_code == 200
+    
+    snippet = response.get_json()['results'][0]['matches'][0]['snippet']
+    assert '<script>' not in snippet
+    assert '&lt;script&gt;' in snippet
+    assert '<b>hello</b>' in snippet
+
+def test_like_fallback_matches_wildcards_literally(client, monkeypatch):
+    from src.services import search
+    monkeypatch.setattr(search, 'get_backend', lambda: 'like')
+    
+    assert client.get('/api/search?q=%25').get_json()['results'] == []
+    assert client.get('/api/search?q=_').get_json()['results'] == []
+    assert len(client.get('/api/search?q=script').get_json()['results']) == 1
@@ -0,0 +1,22 @@
+import pytest
+from src.services.static_assets import HASHED_NAME
+
+@pytest.mark.parametrize('name', [
+    'assets/index-DiwrgTda.js',
+    'assets/vendor-a1b2c3d4.js',
+    'assets/index-DiwrgTda.js.map',
+    'static/js/main.8a9b7c6d.js',
+    'static/js/2.1234abcd.chunk.js',
+])
+def test_hashed_names_are_immutable(name):
+    assert HASHED_NAME.search(name)
+
+@pytest.mark.parametrize('name', [
+    'assets/hero-background.png',
+    'assets/company-logo-horizontal.svg',
+    'assets/fonts/inter-semibold.woff2',
+    'assets/icon-Settings.svg',
+    'favicon.ico',
+])
+def test_plain_names_are_not_immutable(name):
+    assert not HASHED_NAME.search(name)
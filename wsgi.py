@@ -0,0 +1,4 @@
+from src.main import create_app
+
+# Ponto de entrada WSGI para o gunicorn (ver gunicorn.conf.py)
+app = create_app()